@@ -0,0 +1,95 @@
+"""Serial geolocate() + matching_courts vs. the asyncio match_addresses() API.
+
+Uses a local stub geocoder that sleeps for --latency seconds per request. That is the
+shape of a real geocoding API, without sending anything over the network. Each run starts
+with an empty in-memory geocode cache. The async results are checked against the serial
+ones.
+
+    python benchmarks/bench_async_matching.py --addresses 200 --latency 0.1 --concurrency 16
+"""
+import argparse, asyncio, json, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from docassemble.base.util import Address
+from docassemble.MACourts import macourts
+from docassemble.MACourts.async_matching import match_addresses, match_addresses_all
+from docassemble.MACourts.geocode_cache import GeocodeCache
+
+MUNICIPALITIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'docassemble', 'MACourts', 'data', 'sources', 'ma_municipalities.json')
+
+def make_addresses(count, seed=0):
+    with open(MUNICIPALITIES) as municipalities_file:
+        towns = [(town, county) for county, names in json.load(municipalities_file).items() for town in names]
+    rng = random.Random(seed)
+    rows = list()
+    for i in range(count):
+        if rng.random() < 0.3:
+            rows.append(('%d Main St' % i, 'Boston', 'Suffolk County', rng.uniform(42.23, 42.40), rng.uniform(-71.19, -70.99)))
+        else:
+            town, county = rng.choice(towns)
+            rows.append(('%d Main St' % i, town, county, 42.0, -71.5))
+    return rows
+
+def build(rows):
+    addresses = list()
+    for street, city, county, latitude, longitude in rows:
+        address = Address()
+        address.address, address.city, address.county, address.state = street, city, county, 'MA'
+        address.stub_location = (latitude, longitude)
+        addresses.append(address)
+    return addresses
+
+def stub_geocoder(latency):
+    def geocode(address):
+        time.sleep(latency)
+        latitude, longitude = address.stub_location
+        return {'success': True, 'latitude': latitude, 'longitude': longitude, 'description': '',
+                'norm': {'address': address.address, 'city': address.city, 'county': address.county, 'state': 'MA'}, 'norm_long': {}}
+    return geocode
+
+def names(result):
+    return sorted(str(court) for court in result)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--addresses', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per stub geocoder request')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--rate', type=float, default=None, help='geocoder requests per second')
+    args = parser.parse_args()
+    macourts.warm_up(freeze=False)
+    courts = macourts.MACourtList('courts')
+    courts.load_courts(courts=macourts.ALL_COURT_SOURCES)
+    rows = make_addresses(args.addresses)
+    geocoder = stub_geocoder(args.latency)
+
+    cache = GeocodeCache(geocoder=geocoder)
+    started = time.time()
+    serial = list()
+    for address in build(rows):
+        cache.geolocate(address)
+        serial.append(names(courts.matching_courts_single_address(address, macourts.ALL_DEPARTMENTS)))
+    serial_elapsed = time.time() - started
+    print('serial   %5d addresses in %7.2fs' % (len(rows), serial_elapsed))
+
+    async def stream():
+        first = None
+        started = time.time()
+        async for result in match_addresses(courts, build(rows), geocoder=geocoder, cache=GeocodeCache(), concurrency=args.concurrency, rate=args.rate):
+            if first is None:
+                first = time.time() - started
+        return first
+
+    print('streamed first result after %.3fs' % asyncio.run(stream()))
+    started = time.time()
+    results = asyncio.run(match_addresses_all(courts, build(rows), geocoder=geocoder, cache=GeocodeCache(), concurrency=args.concurrency, rate=args.rate))
+    async_elapsed = time.time() - started
+    errors = [result.error for result in results if result.error is not None]
+    mismatches = sum(1 for result, expected in zip(results, serial) if result.error is None and names(result.courts) != expected)
+    print('async    %5d addresses in %7.2fs (concurrency %d%s): %.1fx faster | errors %d, mismatches %d' % (
+        len(rows), async_elapsed, args.concurrency, ', %g req/s' % args.rate if args.rate else '', serial_elapsed / async_elapsed, len(errors), mismatches))
+    sys.exit(1 if errors or mismatches else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Reader throughput of the court catalogue, with and without concurrent reloads.
+
+Copies the packaged data files to a temporary directory, starts reader threads that
+look courts up in the current snapshot, and measures lookups per second first on a quiet
+catalogue and then while a writer keeps rewriting district_courts.json and reloading.
+Readers also check that every snapshot they get is internally consistent.
+
+    python benchmarks/bench_catalogue_reload.py --readers 8 --duration 5
+"""
+import argparse, hashlib, json, os, shutil, sys, tempfile, threading, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from docassemble.MACourts.catalogue import CatalogueManager
+
+SOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'docassemble', 'MACourts', 'data', 'sources')
+
+def run_readers(manager, count, duration, expected_sizes, stop_writer=None):
+    totals = [0] * count
+    errors = []
+    deadline = time.time() + duration
+
+    def reader(slot):
+        operations = 0
+        while time.time() < deadline:
+            catalogue = manager.current()
+            courts = catalogue.court_records('district_courts')
+            # the record count must always match the file version the snapshot was built from
+            if expected_sizes.get(catalogue.hashes['district_courts.json']) != len(courts):
+                errors.append(catalogue.version)
+            matrix = catalogue.table('routing_matrix')
+            if matrix is not None:
+                matrix.court_names('cambridge|middlesex county|', 'District Court')
+            operations += 1
+        totals[slot] = operations
+
+    threads = [threading.Thread(target=reader, args=(slot,)) for slot in range(count)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+    if stop_writer is not None:
+        stop_writer.set()
+    return sum(totals) / elapsed, errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        for filename in os.listdir(SOURCES):
+            shutil.copy(os.path.join(SOURCES, filename), directory)
+        district_path = os.path.join(directory, 'district_courts.json')
+        with open(district_path, 'rb') as district_file:
+            original = district_file.read()
+        courts = json.loads(original.decode('utf-8'))
+        extra = dict(courts[0], name='Benchmark District Court')
+        modified = json.dumps(courts + [extra]).encode('utf-8')
+
+        expected_sizes = {hashlib.sha1(original).hexdigest(): len(courts), hashlib.sha1(modified).hexdigest(): len(courts) + 1}
+
+        manager = CatalogueManager(lambda filename: os.path.join(directory, filename) if os.path.exists(os.path.join(directory, filename)) else None, check_interval=None)
+        started = time.time()
+        manager.current()
+        print('initial load: %.3fs' % (time.time() - started))
+
+        quiet, quiet_errors = run_readers(manager, args.readers, args.duration, expected_sizes)
+        print('quiet:     %10.0f lookups/s' % quiet)
+
+        stop = threading.Event()
+        reload_times = []
+
+        def writer():
+            version = 0
+            while not stop.is_set():
+                version += 1
+                temporary = district_path + '.tmp'
+                with open(temporary, 'wb') as district_file:
+                    district_file.write(modified if version % 2 else original)
+                os.replace(temporary, district_path)
+                started = time.time()
+                manager.reload()
+                reload_times.append(time.time() - started)
+
+        writer_thread = threading.Thread(target=writer)
+        writer_thread.start()
+        busy, busy_errors = run_readers(manager, args.readers, args.duration, expected_sizes, stop_writer=stop)
+        writer_thread.join()
+        print('reloading: %10.0f lookups/s (%d reloads, mean %.3fs each)' % (busy, len(reload_times), sum(reload_times) / max(1, len(reload_times))))
+        print('throughput during reloads: %.1f%% of quiet' % (100.0 * busy / quiet))
+        print('inconsistent snapshots seen: %d' % (len(quiet_errors) + len(busy_errors)))
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
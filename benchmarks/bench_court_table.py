@@ -0,0 +1,65 @@
+"""Analytics queries over every court: Python loops over MACourt objects vs. the columnar CourtTable.
+
+Runs each query both ways and reports the time per query and whether both found the same
+courts; tests/test_court_table.py checks it. Query points are random locations in Massachusetts.
+
+    python benchmarks/bench_court_table.py --queries 2000
+"""
+import argparse, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from docassemble.MACourts import macourts
+from docassemble.MACourts.spatial_index import haversine_km
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--km', type=float, default=20.0)
+    args = parser.parse_args()
+    courts = macourts.MACourtList('courts')
+    courts.load_courts(courts=macourts.ALL_COURT_SOURCES)
+    table = macourts.get_court_table()
+    rng = random.Random(0)
+    points = [(rng.uniform(41.5, 42.8), rng.uniform(-73.3, -70.0)) for i in range(args.queries)]
+
+    def loop_po_box(i):
+        return [court.name for court in courts.elements if court.address.county == 'Middlesex County' and court.has_po_box]
+
+    def table_po_box(i):
+        return table.filter(county='Middlesex County', has_po_box=True).names()
+
+    def loop_within(i):
+        latitude, longitude = points[i]
+        found = [(float(haversine_km(latitude, longitude, court.location.latitude, court.location.longitude)), court.name) for court in courts.elements]
+        return [name for distance, name in sorted(found, key=lambda item: item[0]) if distance <= args.km]
+
+    def table_within(i):
+        latitude, longitude = points[i]
+        return table.within(latitude, longitude, args.km).names()
+
+    def loop_department_county(i):
+        return [court.name for court in courts.filter_courts(['District Court', 'Housing Court']) if court.address.county in ('Worcester County', 'Hampden County')]
+
+    def table_department_county(i):
+        return table.filter(department=['District Court', 'Housing Court'], county=['Worcester County', 'Hampden County']).names()
+
+    for label, loop, vectorised in [
+            ('Middlesex County with a PO box', loop_po_box, table_po_box),
+            ('within %g km of a point' % args.km, loop_within, table_within),
+            ('District/Housing in two counties', loop_department_county, table_department_county)]:
+        timings = list()
+        results = list()
+        for function in (loop, vectorised):
+            started = time.time()
+            results.append([function(i) for i in range(args.queries)])
+            timings.append((time.time() - started) / args.queries)
+        same = results[0] == results[1]
+        print('%-34s loop %8.1f us | table %8.1f us | %5.1fx | %s' % (label, 1e6 * timings[0], 1e6 * timings[1], timings[0] / timings[1], 'same courts' if same else 'DIFFERENT'))
+
+    started = time.time()
+    hydrated = table.filter(county='Middlesex County').hydrate()
+    print('hydrate %d Middlesex County courts into MACourt: %.2f ms' % (len(hydrated), 1000 * (time.time() - started)))
+
+if __name__ == '__main__':
+    main()
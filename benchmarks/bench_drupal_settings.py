@@ -0,0 +1,110 @@
+"""Fast scan vs. BeautifulSoup for extracting the Drupal settings JSON from Mass.gov location pages.
+
+Reads the seven court location pages saved in --fixtures (one <court source>.html each),
+by default the trimmed pages committed in tests/fixtures/massgov, which tests/test_drupal_settings.py
+uses to check that both paths give the same courts. For full-size pages, run once with --fetch to
+download them from Mass.gov, or with --synthesize to write offline stand-ins: pages of Mass.gov-like
+markup around the settings JSON, rebuilt from the packaged court files. These are written to
+benchmarks/fixtures/massgov, which is not committed, unless --fixtures says otherwise.
+
+    python benchmarks/bench_drupal_settings.py --repeat 20
+    python benchmarks/bench_drupal_settings.py --fetch
+    python benchmarks/bench_drupal_settings.py --fixtures benchmarks/fixtures/massgov --repeat 20
+"""
+import argparse, json, os, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from docassemble.MACourts import macourts
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCES = os.path.join(HERE, '..', 'docassemble', 'MACourts', 'data', 'sources')
+COMMITTED_FIXTURES = os.path.join(HERE, '..', 'tests', 'fixtures', 'massgov')
+DOWNLOADED_FIXTURES = os.path.join(HERE, 'fixtures', 'massgov')
+
+PAGES = {
+    'district_courts': 'https://www.mass.gov/orgs/district-court/locations',
+    'housing_courts': 'https://www.mass.gov/orgs/housing-court/locations',
+    'bmc': 'https://www.mass.gov/orgs/boston-municipal-court/locations',
+    'superior_courts': 'https://www.mass.gov/orgs/superior-court/locations',
+    'land_court': 'https://www.mass.gov/orgs/land-court/locations',
+    'juvenile_courts': 'https://www.mass.gov/orgs/juvenile-court/locations',
+    'probate_and_family_courts': 'https://www.mass.gov/orgs/probate-and-family-court/locations',
+}
+
+def fetch(directory):
+    import requests
+    for name, url in PAGES.items():
+        with open(os.path.join(directory, name + '.html'), 'w', encoding='utf-8') as page:
+            page.write(requests.get(url).text)
+
+def synthesize(directory, filler_items=2000):
+    for name in PAGES:
+        with open(os.path.join(SOURCES, name + '.json')) as courts_file:
+            courts = json.load(courts_file)
+        settings = {
+            'path': {'baseUrl': '/', 'currentPath': 'orgs/' + name},
+            'locations': {
+                'googleMap': {'markers': [{'position': {'lat': court['location']['latitude'], 'lng': court['location']['longitude']},
+                                           'infoWindow': {'name': court['name'], 'address': court['address'].get('orig_address') or court['address']['address'],
+                                                          'phone': court['phone'], 'fax': court['fax']}} for court in courts]},
+                'imagePromos': {'items': [{'title': {'text': court['name']},
+                                           'description': {'richText': {'rteElements': [{'data': {'rawHtml': {'content': {'#context': {'value': court.get('description') or ''}}}}}]}}}
+                                          for court in courts]},
+            },
+        }
+        # Mass.gov pages are mostly navigation, promos and other scripts around the one element we need
+        filler = ''.join('<div class="ma__org-nav-item"><a href="/info-details/item-%d" data-label="Item %d">Item %d &amp; more</a>'
+                         '<script>window.dataLayer.push({"event": "item-%d", "html": "<span>\\u003c/script\\u003e</span>"});</script></div>\n' % (i, i, i, i)
+                         for i in range(filler_items))
+        html = ('<!DOCTYPE html><html lang="en"><head><title>Locations | Mass.gov</title></head><body>\n' + filler +
+                '<script type="application/json" data-drupal-selector="drupal-settings-json">' + json.dumps(settings).replace('/', '\\/') + '</script>\n' +
+                filler + '</body></html>')
+        with open(os.path.join(directory, name + '.html'), 'w', encoding='utf-8') as page:
+            page.write(html)
+
+def court_list(settings):
+    return [(marker['infoWindow']['name'], marker['infoWindow']['address']) for marker in settings['locations']['googleMap']['markers']]
+
+def measure(function, html, repeat):
+    started = time.time()
+    for i in range(repeat):
+        result = function(html)
+    elapsed = (time.time() - started) / repeat
+    # tracing slows allocation down a lot, so memory is measured on a separate, untimed run
+    tracemalloc.start()
+    function(html)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--fixtures', help='directory of saved pages (default: %s, or %s with --fetch or --synthesize)' % (
+        os.path.relpath(COMMITTED_FIXTURES), os.path.relpath(DOWNLOADED_FIXTURES)))
+    parser.add_argument('--fetch', action='store_true', help='download the pages from Mass.gov first')
+    parser.add_argument('--synthesize', action='store_true', help='write offline stand-in pages first')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    if args.fixtures is None:
+        # Full-size pages never overwrite the committed, trimmed ones
+        args.fixtures = DOWNLOADED_FIXTURES if args.fetch or args.synthesize else COMMITTED_FIXTURES
+    if args.fetch or args.synthesize:
+        if not os.path.isdir(args.fixtures):
+            os.makedirs(args.fixtures)
+        (fetch if args.fetch else synthesize)(args.fixtures)
+    for name in PAGES:
+        path = os.path.join(args.fixtures, name + '.html')
+        if not os.path.exists(path):
+            sys.exit('Missing %s; run with --fetch (or --synthesize when Mass.gov is unreachable)' % path)
+        with open(path, encoding='utf-8') as page:
+            html = page.read()
+        fast, fast_time, fast_peak = measure(lambda html: json.loads(macourts.drupal_settings_json_fast(html)), html, args.repeat)
+        soup, soup_time, soup_peak = measure(lambda html: json.loads(macourts.drupal_settings_json_soup(html)), html, args.repeat)
+        same = fast == soup and court_list(fast) == court_list(soup)
+        print('%-26s %7.0f KB, %3d courts | fast %8.2f ms, peak %8.0f KB | soup %8.2f ms, peak %8.0f KB | %5.0fx | %s' % (
+            name, len(html) / 1024.0, len(court_list(soup)), 1000 * fast_time, fast_peak / 1024.0, 1000 * soup_time, soup_peak / 1024.0,
+            soup_time / fast_time, 'same courts' if same else 'DIFFERENT'))
+
+if __name__ == '__main__':
+    main()
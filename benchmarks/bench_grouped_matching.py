@@ -0,0 +1,78 @@
+"""Case files with several parties at one address: matching_courts per address vs. matching_courts_grouped.
+
+Each case has a few parties living in the same household or building: the same town and
+county, with the capitalisation varying and coordinates a few metres apart. Cases are spread
+over every municipality, with extra Boston cases so the BMC ward lookup is exercised. For every
+case, whether grouped matching gave each party the same courts as routing that party on its own,
+and the same union as matching_courts (less the None that matching_courts can include when a
+town has no court of some type), is reported; tests/test_grouped_matching.py checks it.
+
+    python benchmarks/bench_grouped_matching.py --cases 2000
+    python benchmarks/bench_grouped_matching.py --no-matrix
+"""
+import argparse, json, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from docassemble.MACourts import macourts
+from docassemble.MACourts.routing_tables import RoutingAddress
+
+MUNICIPALITIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'docassemble', 'MACourts', 'data', 'sources', 'ma_municipalities.json')
+
+def make_cases(count, parties, rng):
+    with open(MUNICIPALITIES) as municipalities_file:
+        towns = [(town, county) for county, names in json.load(municipalities_file).items() for town in names]
+    cases = list()
+    for i in range(count):
+        if i % 3 == 0:
+            town, county, latitude, longitude = 'Boston', 'Suffolk County', rng.uniform(42.23, 42.40), rng.uniform(-71.19, -70.99)
+        else:
+            (town, county), latitude, longitude = rng.choice(towns), rng.uniform(41.5, 42.8), rng.uniform(-73.3, -70.0)
+        household = list()
+        for party in range(rng.randint(1, parties)):
+            spelling = rng.choice([town, town.upper(), town.lower()])
+            household.append(RoutingAddress(spelling, county, latitude + rng.uniform(-1e-5, 1e-5), longitude + rng.uniform(-1e-5, 1e-5)))
+        cases.append(household)
+    return cases
+
+def names(courts):
+    return sorted(str(court) for court in macourts.GroupedMatches([(None, courts)], 1).courts)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--cases', type=int, default=1000)
+    parser.add_argument('--parties', type=int, default=6, help='most parties at one address')
+    parser.add_argument('--no-matrix', action='store_true', help='route with the if/elif chains only')
+    args = parser.parse_args()
+    if args.no_matrix:
+        macourts.get_routing_matrix = lambda: None
+    cases = make_cases(args.cases, args.parties, random.Random(0))
+    addresses = sum(len(case) for case in cases)
+    courts = macourts.MACourtList('courts')
+    courts.load_courts(courts=macourts.ALL_COURT_SOURCES)
+    # Route one case first, so neither timing includes loading the wards and the matrix
+    courts.matching_courts(cases[0], macourts.ALL_DEPARTMENTS)
+
+    started = time.time()
+    per_address = [[names(courts.matching_courts_single_address(address, macourts.ALL_DEPARTMENTS)) for address in case] for case in cases]
+    single_time = time.time() - started
+    started = time.time()
+    unions = [sorted(str(court) for court in courts.matching_courts(case, macourts.ALL_DEPARTMENTS) if court is not None) for case in cases]
+    union_time = time.time() - started
+    started = time.time()
+    grouped = [courts.matching_courts_grouped(case, macourts.ALL_DEPARTMENTS) for case in cases]
+    grouped_time = time.time() - started
+
+    different = 0
+    for case, expected, union, result in zip(cases, per_address, unions, grouped):
+        same = [names(found) for address, found in result.by_address()] == expected and sorted(str(court) for court in result.courts) == union
+        different += not same
+    routed = sum(result.routed for result in grouped)
+    print('%d cases, %d addresses, %d routed after grouping (%.1f addresses per lookup)' % (len(cases), addresses, routed, addresses / float(routed)))
+    print('per address        %8.3f ms per case' % (1000 * single_time / len(cases)))
+    print('matching_courts    %8.3f ms per case (union only)' % (1000 * union_time / len(cases)))
+    print('grouped            %8.3f ms per case | %4.1fx | %s' % (1000 * grouped_time / len(cases), union_time / grouped_time,
+                                                                  'same courts' if not different else '%d CASES DIFFER' % different))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Concurrent load test for MACourtList, from thread pools and process pools.
+
+Each task does what an interview does: construct an MACourtList, load every court source,
+and route one address to every court department. Tasks run from a pool of threads (sharing
+the module's cached state) or a pool of forked processes. Addresses come from one of two
+mixes: "statewide" picks towns at random, "boston" sends most requests to random points in
+Boston, which go through the ward lookup.
+
+Every result is compared with a single-threaded reference run, so the benchmark doubles as
+a thread-safety test for the shared catalogue, routing tables and indexes: any mismatch or
+exception is reported and makes the script exit non-zero.
+
+    python benchmarks/bench_load.py --workers 1,8,32 --tasks 2000
+    python benchmarks/bench_load.py --pool process --mix boston --chains
+"""
+import argparse, json, os, random, resource, sys, time, traceback
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from docassemble.MACourts import macourts
+from docassemble.MACourts.routing_tables import RoutingAddress
+
+MUNICIPALITIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'docassemble', 'MACourts', 'data', 'sources', 'ma_municipalities.json')
+
+ADDRESSES = []
+
+def make_addresses(mix, count, seed=0):
+    with open(MUNICIPALITIES) as municipalities_file:
+        towns = [(town, county) for county, names in json.load(municipalities_file).items() for town in names]
+    boston_share = 0.8 if mix == 'boston' else 0.1
+    rng = random.Random(seed)
+    addresses = list()
+    for i in range(count):
+        if rng.random() < boston_share:
+            addresses.append(('Boston', 'Suffolk County', rng.uniform(42.23, 42.40), rng.uniform(-71.19, -70.99)))
+        else:
+            town, county = rng.choice(towns)
+            addresses.append((town, county, None, None))
+    return addresses
+
+def route(index):
+    """One interview-sized task. Returns (index, court names or error, latency in seconds)"""
+    started = time.time()
+    try:
+        courts = macourts.MACourtList('courts')
+        courts.load_courts(courts=macourts.ALL_COURT_SOURCES)
+        result = courts.matching_courts_single_address(RoutingAddress(*ADDRESSES[index]), macourts.ALL_DEPARTMENTS)
+        names = sorted(str(court) for court in result)
+    except Exception:
+        names = 'error: ' + traceback.format_exc().strip().splitlines()[-1]
+    return index, names, time.time() - started
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(who).ru_maxrss / 1024.0
+
+def _worker_peak_rss(_):
+    time.sleep(0.05)
+    return os.getpid(), _peak_rss_mb()
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+def run(pool_kind, workers, indices):
+    started = time.time()
+    worker_rss = dict()
+    if pool_kind == 'thread':
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(route, indices))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            results = list(pool.map(route, indices, chunksize=max(1, len(indices) // (4 * workers))))
+            worker_rss = dict(pool.map(_worker_peak_rss, range(4 * workers)))
+    return results, time.time() - started, worker_rss
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--pool', choices=['thread', 'process', 'both'], default='both')
+    parser.add_argument('--workers', default='1,8,32', help='comma-separated pool sizes')
+    parser.add_argument('--tasks', type=int, default=1000)
+    parser.add_argument('--mix', choices=['statewide', 'boston', 'both'], default='both')
+    parser.add_argument('--chains', action='store_true', help='route with the if/elif chains instead of the precomputed routing matrix')
+    parser.add_argument('--cold', action='store_true', help="don't call warm_up() before starting the pools")
+    args = parser.parse_args()
+    if args.chains:
+        macourts.get_routing_matrix = lambda: None
+    if not args.cold:
+        macourts.warm_up(freeze=False)
+    failures = 0
+    for mix in (['statewide', 'boston'] if args.mix == 'both' else [args.mix]):
+        ADDRESSES[:] = make_addresses(mix, args.tasks)
+        indices = list(range(len(ADDRESSES)))
+        reference = {index: names for index, names, latency in map(route, indices)}
+        for pool_kind in (['thread', 'process'] if args.pool == 'both' else [args.pool]):
+            for workers in [int(value) for value in args.workers.split(',')]:
+                results, elapsed, worker_rss = run(pool_kind, workers, indices)
+                latencies = [latency for index, names, latency in results]
+                errors = [names for index, names, latency in results if isinstance(names, str)]
+                mismatches = sum(1 for index, names, latency in results if not isinstance(names, str) and names != reference[index])
+                failures += len(errors) + mismatches
+                if pool_kind == 'thread':
+                    rss = 'peak RSS %7.1f MB' % _peak_rss_mb()
+                else:
+                    rss = 'peak RSS %7.1f MB/worker (max), %7.1f MB total' % (max(worker_rss.values()), sum(worker_rss.values()))
+                print('%-9s %-7s x%-3d %6d tasks in %6.2fs: %8.1f tasks/s | p50 %7.2f ms p99 %7.2f ms | %s | errors %d, mismatches %d' % (
+                    mix, pool_kind, workers, len(results), elapsed, len(results) / elapsed,
+                    1000 * percentile(latencies, 0.5), 1000 * percentile(latencies, 0.99), rss, len(errors), mismatches))
+                for error in sorted(set(errors))[:5]:
+                    print('    ' + error)
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
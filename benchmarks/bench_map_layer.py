@@ -0,0 +1,51 @@
+"""Cost of building the markers for a map of every court.
+
+Compares the first render (grouping by location and formatting every address), a redraw
+from a fresh list of the same courts (grouping again, with the marker text cached), and
+the memoised all_courts_map_layer(). tests/test_map_layer.py checks that the markers are the
+same as the uncached code's.
+
+    python benchmarks/bench_map_layer.py --repeat 50
+"""
+import argparse, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from docassemble.MACourts import macourts
+
+def markers(courts):
+    return [marker for place in macourts.combined_locations(courts.elements) for marker in place._map_info()]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    macourts.warm_up(freeze=False)
+
+    def fresh_courts():
+        courts = macourts.MACourtList('courts')
+        courts.load_courts(courts=macourts.ALL_COURT_SOURCES)
+        return courts
+
+    courts = fresh_courts()
+    started = time.time()
+    first = markers(courts)
+    print('first render          %8.3f ms (%d markers)' % (1000 * (time.time() - started), len(first)))
+
+    elapsed = 0.0
+    for i in range(args.repeat):
+        courts = fresh_courts()
+        started = time.time()
+        again = markers(courts)
+        elapsed += time.time() - started
+    print('redraw, cached text   %8.3f ms' % (1000 * elapsed / args.repeat))
+
+    macourts.all_courts_map_layer()._map_info()
+    started = time.time()
+    for i in range(args.repeat):
+        layer = macourts.all_courts_map_layer()._map_info()
+    print('all_courts_map_layer  %8.3f ms' % (1000 * (time.time() - started) / args.repeat))
+    print('markers %s' % ('the same' if first == again == layer else 'DIFFER'))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Load test for the court routing HTTP service.
+
+Starts the service on a local port (or targets --url), then sends single and batch routing
+requests from a pool of client threads and reports throughput and latency percentiles, both
+as seen by the client and from the service's Server-Timing header.
+
+    python benchmarks/bench_service.py --clients 16 --requests 2000
+"""
+import argparse, json, os, random, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+ADDRESSES = [
+    {'city': 'Boston', 'county': 'Suffolk County', 'latitude': 42.3126, 'longitude': -71.0640},
+    {'city': 'Boston', 'county': 'Suffolk County', 'latitude': 42.3601, 'longitude': -71.0589},
+    {'city': 'Boston', 'county': 'Suffolk County', 'latitude': 42.2870, 'longitude': -71.1280},
+    {'city': 'Cambridge', 'county': 'Middlesex County'},
+    {'city': 'Worcester', 'county': 'Worcester County'},
+    {'city': 'Springfield', 'county': 'Hampden County'},
+    {'city': 'Fall River', 'county': 'Bristol County'},
+    {'city': 'Lowell', 'county': 'Middlesex County'},
+]
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+def start_local_service():
+    from wsgiref.simple_server import make_server
+    from docassemble.MACourts.service import application, _ThreadingWSGIServer, _QuietHandler
+    from docassemble.MACourts.macourts import warm_up
+    warm_up(freeze=False)
+    application.courts()
+    server = make_server('127.0.0.1', 0, application, server_class=_ThreadingWSGIServer, handler_class=_QuietHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return 'http://127.0.0.1:%d' % server.server_port
+
+def request(url, path, payload):
+    started = time.time()
+    data = json.dumps(payload).encode('utf-8')
+    with urlopen(Request(url + path, data=data, headers={'Content-Type': 'application/json'})) as response:
+        response.read()
+        timing = response.headers.get('Server-Timing', 'route;dur=0')
+    return time.time() - started, float(timing.split('dur=')[1]) / 1000.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', help='service to test; default starts one in this process')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=50)
+    args = parser.parse_args()
+    url = args.url or start_local_service()
+    random.seed(0)
+    for label, path, make_payload, count in [
+            ('single', '/route', lambda: random.choice(ADDRESSES), args.requests),
+            ('batch', '/route/batch', lambda: {'addresses': [random.choice(ADDRESSES) for i in range(args.batch_size)]}, max(1, args.requests // args.batch_size))]:
+        payloads = [make_payload() for i in range(count)]
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            results = list(pool.map(lambda payload: request(url, path, payload), payloads))
+        elapsed = time.time() - started
+        client = [result[0] for result in results]
+        server = [result[1] for result in results]
+        print('%-6s %6d requests in %.2fs: %8.1f req/s | client p50 %6.2f ms p99 %6.2f ms | server p50 %6.2f ms p99 %6.2f ms' % (
+            label, count, elapsed, count / elapsed,
+            1000 * percentile(client, 0.5), 1000 * percentile(client, 0.99),
+            1000 * percentile(server, 0.5), 1000 * percentile(server, 0.99)))
+
+if __name__ == '__main__':
+    main()
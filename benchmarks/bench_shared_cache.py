@@ -0,0 +1,62 @@
+"""Shared routing cache: cold worker vs. a second worker reading from Redis vs. Redis down.
+
+Routes every municipality and a set of random Boston points through the if/elif chains
+(the routing matrix is bypassed, since it already answers most addresses without the
+cache). Each "worker" gets its own SharedRoutingCache, so its in-process LRU starts empty,
+and all of them share one Redis: a real server with --redis-url, otherwise a fakeredis
+server in this process. The last run points at a closed port to check that routing still
+works, uncached, when Redis is unreachable. tests/test_shared_cache.py covers the cache's
+behaviour; this script reports timings and hit counts.
+
+    python benchmarks/bench_shared_cache.py --boston 500 --redis-url redis://localhost:6379/15
+"""
+import argparse, json, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from docassemble.MACourts import macourts
+from docassemble.MACourts.routing_tables import RoutingAddress
+from docassemble.MACourts.shared_cache import SharedRoutingCache, redis_client_from_url
+
+MUNICIPALITIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'docassemble', 'MACourts', 'data', 'sources', 'ma_municipalities.json')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--boston', type=int, default=300, help='number of random Boston points')
+    parser.add_argument('--redis-url', help='default: an in-process fakeredis server')
+    args = parser.parse_args()
+    with open(MUNICIPALITIES) as municipalities_file:
+        addresses = [RoutingAddress(town, county) for county, names in json.load(municipalities_file).items() for town in names]
+    rng = random.Random(0)
+    addresses += [RoutingAddress('Boston', 'Suffolk County', rng.uniform(42.23, 42.40), rng.uniform(-71.19, -70.99)) for i in range(args.boston)]
+    macourts.get_routing_matrix = lambda: None
+    courts = macourts.MACourtList('courts')
+    courts.load_courts(courts=macourts.ALL_COURT_SOURCES)
+
+    if args.redis_url:
+        def client():
+            return redis_client_from_url(args.redis_url)
+        client().flushdb()
+    else:
+        import fakeredis
+        server = fakeredis.FakeServer()
+        def client():
+            return fakeredis.FakeRedis(server=server)
+
+    reference = None
+    for label, redis_client in [('worker 1 (cold)', client()), ('worker 2', client()), ('worker 2, hot', None), ('redis down', redis_client_from_url('redis://127.0.0.1:1'))]:
+        if redis_client is not None or macourts._shared_routing_cache is None:
+            macourts._shared_routing_cache = SharedRoutingCache(client=redis_client, version=macourts._shared_routing_cache_version)
+        cache = macourts.get_shared_routing_cache()
+        cache.reset_stats()
+        started = time.time()
+        results = [sorted(str(court) for court in courts.matching_courts_single_address(address, macourts.ALL_DEPARTMENTS)) for address in addresses]
+        elapsed = time.time() - started
+        reference = reference or results
+        stats = cache.stats()
+        print('%-16s %5d addresses in %6.2fs (%6.3f ms each) | LRU hits %6d, Redis hits %6d, misses %6d, Redis errors %d | %s' % (
+            label, len(addresses), elapsed, 1000 * elapsed / len(addresses), stats['local_hits'], stats['redis_hits'], stats['misses'],
+            stats['redis_errors'], 'same courts' if results == reference else 'DIFFERENT COURTS'))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Ward assignment for a frame of points: assign_boston_wards() vs. get_boston_ward_number per address.
+
+Generates random points over Boston (and a margin around it, so some fall outside every
+ward and use the nearest-ward fallback) and assigns wards to all of them with one spatial
+join. The per-address path is timed on a sample of --sample points, uncached, and scaled
+up to the full size, since a million individual lookups would take hours. Whether the
+sample's wards are the same both ways is reported; tests/test_ward_frames.py checks it.
+
+    python benchmarks/bench_ward_frames.py --sizes 10000,1000000
+"""
+import argparse, os, sys, time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from docassemble.MACourts import macourts
+from docassemble.MACourts.routing_tables import RoutingAddress
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default='10000,1000000')
+    parser.add_argument('--sample', type=int, default=1000)
+    args = parser.parse_args()
+    macourts.warm_up(freeze=False)
+    courts = macourts.MACourtList('courts')
+    courts.load_courts(courts=['bmc'])
+    rng = np.random.default_rng(0)
+    for size in [int(value) for value in args.sizes.split(',')]:
+        frame = pd.DataFrame({'latitude': rng.uniform(42.22, 42.41, size), 'longitude': rng.uniform(-71.20, -70.98, size)})
+        started = time.time()
+        assigned = macourts.assign_boston_wards(frame)
+        frame_time = time.time() - started
+
+        sample = assigned.iloc[:min(args.sample, size)]
+        started = time.time()
+        expected = [courts._find_boston_ward(RoutingAddress('Boston', 'Suffolk County', row.latitude, row.longitude)) for row in sample.itertuples()]
+        per_address = (time.time() - started) / len(sample)
+        same = [(str(ward), courthouse) for ward, courthouse in expected] == list(zip(sample['ward_number'].astype(str), sample['bmc_courthouse']))
+        print('%8d points: frame %8.2fs (%6.2f us/point) | per address %8.3f ms/point, ~%9.1fs for all | %6.0fx | sample %s' % (
+            size, frame_time, 1e6 * frame_time / size, 1000 * per_address, per_address * size, per_address * size / frame_time,
+            'same wards' if same else 'DIFFERENT WARDS'))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Boston ward lookups with and without the precomputed ward grid.
+
+Draws random points three ways: anywhere in the wards' bounding box (harbour and
+neighbouring towns included), anywhere inside a ward, and within about 10 m of a ward
+boundary, where the grid has to fall back most often. Every point is looked up with the
+grid and with the exact polygon test alone. Reports the fraction of lookups the grid
+answered without geometry, and the time per lookup; tests/test_ward_grid.py checks that
+the answers are the same.
+
+    python benchmarks/bench_ward_grid.py --points 5000 --seed 1
+"""
+import argparse, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import shapely
+from docassemble.MACourts import macourts
+from docassemble.MACourts.routing_tables import RoutingAddress
+
+def random_points(wards, count, rng):
+    geometries = np.asarray(wards.geometry.values, dtype=object)
+    minx, miny, maxx, maxy = shapely.total_bounds(geometries)
+    anywhere = [(rng.uniform(miny, maxy), rng.uniform(minx, maxx)) for i in range(count)]
+    union = shapely.union_all(geometries)
+    shapely.prepare(union)
+    inside = list()
+    while len(inside) < count:
+        latitude, longitude = rng.uniform(miny, maxy), rng.uniform(minx, maxx)
+        if shapely.contains_xy(union, longitude, latitude):
+            inside.append((latitude, longitude))
+    vertices = shapely.get_coordinates(shapely.boundary(geometries))
+    near_boundary = list()
+    for i in range(count):
+        longitude, latitude = vertices[rng.randrange(len(vertices))]
+        near_boundary.append((latitude + rng.uniform(-1e-4, 1e-4), longitude + rng.uniform(-1e-4, 1e-4)))
+    return [('anywhere in bounding box', anywhere), ('inside a ward', inside), ('within ~10 m of a boundary', near_boundary)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--points', type=int, default=2000, help='points of each kind')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    courts = macourts.MACourtList('courts')
+    courts.load_courts(courts=macourts.ALL_COURT_SOURCES)
+    grid = macourts.get_ward_grid()
+    if grid is None:
+        sys.exit('ward_grid.json is missing or was built from different wards; rebuild it with save_ward_grid_to_file()')
+    wards = courts.load_boston_wards_from_file(json_path='boston_wards')
+    print('grid: %d cells, precision %d to %d' % (len(grid), grid.min_precision, grid.max_precision))
+    with_grid = macourts.get_ward_grid
+    for label, points in random_points(wards, args.points, random.Random(args.seed)):
+        addresses = [RoutingAddress('Boston', 'Suffolk County', latitude, longitude) for latitude, longitude in points]
+        macourts.get_ward_grid = lambda *args, **kwargs: None
+        started = time.time()
+        exact = [courts._find_boston_ward(address) for address in addresses]
+        exact_time = (time.time() - started) / len(addresses)
+        macourts.get_ward_grid = with_grid
+        grid.reset_stats()
+        started = time.time()
+        gridded = [courts._find_boston_ward(address) for address in addresses]
+        grid_time = (time.time() - started) / len(addresses)
+        stats = grid.stats()
+        mismatches = sum(tuple(a) != tuple(b) for a, b in zip(exact, gridded))
+        print('%-28s %5.1f%% without geometry | exact %8.1f us | grid %8.1f us | %6.1fx | %s' % (
+            label, 100 * stats['hit_rate'], 1e6 * exact_time, 1e6 * grid_time, exact_time / grid_time,
+            'same wards' if not mismatches else '%d DIFFERENT' % mismatches))
+    started = time.time()
+    for latitude, longitude in points:
+        grid.ward_index(latitude, longitude)
+    print('WardGrid.ward_index alone: %.2f us' % (1e6 * (time.time() - started) / len(points)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Per-worker memory and first-request latency, with and without a pre-fork warm_up().
+
+Starts a fresh master process for each mode. The master imports the module, optionally
+calls warm_up(), then forks workers the way uwsgi or celery would. Each worker serves one
+routing request and reports its latency and its memory from /proc/self/smaps_rollup:
+RSS counts shared pages in full, PSS splits them between the processes sharing them, and
+private memory is what the worker could not share with the master.
+
+    python benchmarks/bench_warm_up.py --workers 8
+"""
+import argparse, json, os, subprocess, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+def memory():
+    values = dict()
+    with open('/proc/self/smaps_rollup') as smaps:
+        for line in smaps:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss_mb': values.get('Rss', 0) / 1024.0,
+        'pss_mb': values.get('Pss', 0) / 1024.0,
+        'private_mb': (values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)) / 1024.0,
+    }
+
+def master(warm, workers):
+    from docassemble.MACourts import macourts
+    from docassemble.MACourts.routing_tables import RoutingAddress
+    timings = macourts.warm_up() if warm else {}
+    master_memory = memory()
+    read_end, write_end = os.pipe()
+    children = list()
+    for worker in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_end)
+            started = time.time()
+            courts = macourts.MACourtList('courts')
+            courts.load_courts(courts=macourts.ALL_COURT_SOURCES)
+            courts.matching_courts_single_address(RoutingAddress('Boston', 'Suffolk County', 42.3126, -71.0640), macourts.ALL_DEPARTMENTS)
+            result = dict(memory(), latency=time.time() - started)
+            os.write(write_end, (json.dumps(result) + '\n').encode('utf-8'))
+            # stay alive until every worker has measured, so shared pages are really shared
+            time.sleep(2)
+            os._exit(0)
+        children.append(pid)
+    os.close(write_end)
+    with os.fdopen(read_end) as results:
+        lines = [json.loads(line) for line in results]
+    for pid in children:
+        os.waitpid(pid, 0)
+    print(json.dumps({'master': master_memory, 'warm_up': timings, 'workers': lines}))
+
+def summarize(label, report):
+    workers = report['workers']
+    def mean(key):
+        return sum(worker[key] for worker in workers) / len(workers)
+    print('%-10s master RSS %6.1f MB | per worker: RSS %6.1f MB, PSS %6.1f MB, private %6.1f MB, first request %7.1f ms' % (
+        label, report['master']['rss_mb'], mean('rss_mb'), mean('pss_mb'), mean('private_mb'), 1000 * mean('latency')))
+    if report['warm_up']:
+        print('%-10s warm_up steps: %s' % ('', ', '.join('%s %.3fs' % item for item in sorted(report['warm_up'].items()))))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--master', choices=['cold', 'warm'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.master:
+        master(args.master == 'warm', args.workers)
+        return
+    for mode in ('cold', 'warm'):
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--master', mode, '--workers', str(args.workers)])
+        summarize(mode, json.loads(output.decode('utf-8').strip().splitlines()[-1]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""Shared pytest fixtures. Being at the repository root, this file also puts the repository on sys.path,
+so plain `pytest` finds the docassemble.MACourts package without installing it."""
+import pytest
+
+class Clock(object):
+    """Stand-in for the time module, for code that only calls time.time()"""
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self):
+        return self.now
+
+class _Location(object):
+    pass
+
+class FakeAddress(object):
+    """Just enough of a docassemble Address for the geocode cache to apply a payload to"""
+    def __init__(self, address, city='Boston', state='MA', zip='02108'):
+        self.address = address
+        self.city = city
+        self.state = state
+        self.zip = zip
+        self.location = _Location()
+
+    def initializeAttribute(self, name, object_type):
+        setattr(self, name, _Location())
+
+@pytest.fixture
+def make_address():
+    return FakeAddress
+
+@pytest.fixture
+def fake_clock():
+    return Clock()
+
+@pytest.fixture
+def all_courts():
+    """A fresh MACourtList with every court department loaded"""
+    pytest.importorskip('docassemble.base.util')
+    from docassemble.MACourts import macourts
+    courts = macourts.MACourtList('courts')
+    courts.load_courts(courts=macourts.ALL_COURT_SOURCES)
+    return courts
@@ -0,0 +1,137 @@
+"""Geocode and route many addresses concurrently with asyncio.
+
+Geocoding is network-bound, so a background action that routes a list of addresses spends
+almost all of its time waiting on the geocoder. match_addresses() geocodes up to
+`concurrency` addresses at once, never starts more than `rate` geocoder requests per
+second, and yields each address's courts as soon as they are known, in completion order.
+
+Geocoding goes through the process-wide geocode cache, so a repeated address is only sent
+to the geocoder once. The geocoder is any callable with the GeocodeCache contract: it
+accepts an Address and returns a payload (see address_to_payload). It may be a plain
+function, which runs in a worker thread, or a coroutine function.
+
+From synchronous code, such as a background action:
+
+    results = match_addresses_sync(courts, addresses, court_types=['Housing Court'])
+"""
+import asyncio, functools, time
+from concurrent.futures import ThreadPoolExecutor
+from .geocode_cache import normalize_address_key, apply_payload_to_address, default_geocoder
+
+__all__ = ['match_addresses', 'match_addresses_all', 'match_addresses_sync', 'AsyncRateLimiter', 'MatchResult']
+
+class AsyncRateLimiter(object):
+    """Spaces out calls so that at most `rate` start in any `per` seconds, with no bursts"""
+    def __init__(self, rate, per=1.0):
+        self.interval = float(per) / rate
+        self._next = 0.0
+        self._lock = None
+
+    async def wait(self):
+        # Created on first use, so the limiter can be built outside a running event loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class MatchResult(object):
+    """Courts serving one address. index is the address's position in the input list.
+    error is the exception raised while geocoding or routing it, or None."""
+    def __init__(self, index, address, courts, geolocated, error=None):
+        self.index = index
+        self.address = address
+        self.courts = courts
+        self.geolocated = geolocated
+        self.error = error
+
+    def __repr__(self):
+        return 'MatchResult(%d, %r, geolocated=%r, error=%r)' % (self.index, self.courts, self.geolocated, self.error)
+
+async def _call_geocoder(geocoder, address, executor):
+    if asyncio.iscoroutinefunction(geocoder):
+        return await geocoder(address)
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(geocoder, address))
+
+async def _geolocate(address, cache, geocoder, semaphore, limiter, executor, in_flight):
+    if getattr(address, 'geolocated', False):
+        return bool(getattr(address, 'geolocate_success', False))
+    key = normalize_address_key(address)
+    if not key:
+        return False
+    payload = cache.get(key) if cache is not None else None
+    if payload is None:
+        # Identical addresses in the same batch share one geocoder request
+        pending = in_flight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(_geocode_uncached(address, key, cache, geocoder, semaphore, limiter, executor))
+            in_flight[key] = pending
+        payload = await asyncio.shield(pending)
+    return apply_payload_to_address(address, payload)
+
+async def _geocode_uncached(address, key, cache, geocoder, semaphore, limiter, executor):
+    async with semaphore:
+        if limiter is not None:
+            await limiter.wait()
+        payload = await _call_geocoder(geocoder, address, executor)
+    if cache is not None:
+        cache.set(key, payload)
+    return payload
+
+async def match_addresses(courts, addresses, court_types=None, geocoder=None, concurrency=8, rate=None, cache=True):
+    """Async generator yielding a MatchResult for each address as soon as its courts are known.
+
+    courts is an MACourtList; court_types is passed to matching_courts_single_address.
+    concurrency bounds the number of geocoder requests in progress; rate (requests per second)
+    optionally limits how fast they start. cache=False skips the shared geocode cache; a
+    GeocodeCache may also be passed in. geocoder defaults to the cache's geocoder."""
+    if cache is True:
+        from .macourts import get_geocode_cache
+        cache = get_geocode_cache()
+    elif cache is False:
+        cache = None
+    if geocoder is None:
+        geocoder = cache.geocoder if cache is not None else default_geocoder
+    if court_types is None:
+        from .macourts import ALL_DEPARTMENTS
+        court_types = ALL_DEPARTMENTS
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = AsyncRateLimiter(rate) if rate else None
+    in_flight = dict()
+    # The loop's default executor may have fewer threads than `concurrency` on a small machine
+    executor = None if asyncio.iscoroutinefunction(geocoder) else ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='macourts-geocode')
+
+    async def one(index, address):
+        try:
+            geolocated = await _geolocate(address, cache, geocoder, semaphore, limiter, executor, in_flight)
+        except Exception as err:
+            return MatchResult(index, address, None, False, err)
+        try:
+            # Routing is a few milliseconds of CPU; it runs on the loop between geocoder replies
+            return MatchResult(index, address, courts.matching_courts_single_address(address, court_types), geolocated)
+        except Exception as err:
+            return MatchResult(index, address, None, geolocated, err)
+
+    tasks = [asyncio.ensure_future(one(index, address)) for index, address in enumerate(addresses)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+async def match_addresses_all(courts, addresses, **kwargs):
+    """Gather match_addresses() into a list of MatchResults in input order"""
+    results = [None] * len(addresses)
+    async for result in match_addresses(courts, addresses, **kwargs):
+        results[result.index] = result
+    return results
+
+def match_addresses_sync(courts, addresses, **kwargs):
+    """Blocking wrapper around match_addresses_all() for code that isn't running an event loop"""
+    return asyncio.run(match_addresses_all(courts, addresses, **kwargs))
@@ -0,0 +1,82 @@
+"""Small thread-safe least-recently-used cache for process-wide memoisation.
+
+Values are built outside the lock, so two threads missing the same key at once may both
+build it; the last one stored wins. Callers that hand cached values to code that may
+modify them must return copies.
+"""
+import os, threading, weakref
+from collections import OrderedDict
+
+__all__ = ['BoundedCache', 'reset_lock_after_fork']
+
+_locked_objects = weakref.WeakSet()
+
+def reset_lock_after_fork(obj):
+    """Give obj a new _lock in a forked child. A lock held by another thread at the fork would otherwise stay held forever"""
+    _locked_objects.add(obj)
+
+def _reset_after_fork():
+    for obj in list(_locked_objects):
+        obj._lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+class BoundedCache(object):
+    """Mapping of at most max_entries keys; the least recently used entry is dropped first.
+    With max_entries=None, entries are only dropped by evict()"""
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        reset_lock_after_fork(self)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if self.max_entries is not None:
+                self._trim(self.max_entries)
+
+    def get_or_build(self, key, build):
+        """Return the value for key, calling build() to make it on a miss"""
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = build()
+            self.set(key, value)
+        return value
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def evict(self, max_entries):
+        """Drop least recently used entries until at most max_entries are left. Returns how many were dropped"""
+        with self._lock:
+            return self._trim(max_entries)
+
+    def _trim(self, max_entries):
+        dropped = 0
+        while len(self._entries) > max_entries:
+            self._entries.popitem(last=False)
+            dropped += 1
+        return dropped
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+_missing = object()
@@ -0,0 +1,186 @@
+"""Process-wide, hot-reloadable snapshot of the court data files.
+
+A CourtCatalogue holds the parsed court JSON, the Boston ward GeoDataFrame (with its
+spatial index built) and the precomputed routing tables. A CatalogueManager owns the
+current snapshot. When the files on disk change, it builds a complete new snapshot on a
+background thread and then replaces the old one with a single reference assignment, so a
+reader sees either the old catalogue or the new one, never a half-built mix.
+
+Readers should call current() once and use that snapshot for the rest of the request.
+"""
+import hashlib, io, json, os, threading, time, weakref
+from types import MappingProxyType
+from .routing_tables import RoutingMatrix, ZipRoutingTable
+from .ward_grid import WardGrid
+
+__all__ = ['CourtCatalogue', 'CatalogueManager', 'build_catalogue', 'COURT_SOURCES', 'GEO_SOURCES', 'TABLE_SOURCES']
+
+COURT_SOURCES = ['bmc', 'district_courts', 'housing_courts', 'juvenile_courts', 'land_court', 'land_courts', 'probate_and_family_courts', 'superior_courts']
+GEO_SOURCES = ['boston_wards']
+TABLE_SOURCES = {'routing_matrix': RoutingMatrix, 'zip_routing': ZipRoutingTable, 'ward_grid': WardGrid}
+
+def _filenames():
+    return [name + '.json' for name in COURT_SOURCES] + [name + '.geojson' for name in GEO_SOURCES] + [name + '.json' for name in TABLE_SOURCES]
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _stat(path):
+    try:
+        result = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return (result.st_mtime_ns, result.st_size)
+
+class CourtCatalogue(object):
+    """Immutable snapshot of the court data. Court records are read-only mappings; the
+    GeoDataFrames and routing tables are shared between threads and must not be modified."""
+    def __init__(self, courts, geodata, tables, stats, hashes):
+        self._courts = MappingProxyType(dict(courts))
+        self._geodata = MappingProxyType(dict(geodata))
+        self._tables = MappingProxyType(dict(tables))
+        self.stats = MappingProxyType(dict(stats))
+        self.hashes = MappingProxyType(dict(hashes))
+        digest = hashlib.sha1()
+        for filename in sorted(self.hashes):
+            digest.update((filename + ':' + self.hashes[filename] + ';').encode('utf-8'))
+        self.version = digest.hexdigest()
+        self.loaded = time.time()
+
+    def court_records(self, name):
+        """Tuple of court records from <name>.json, or None if the file doesn't exist"""
+        return self._courts.get(name)
+
+    def geodata(self, name):
+        """GeoDataFrame from <name>.geojson, or None if the file doesn't exist"""
+        return self._geodata.get(name)
+
+    def table(self, name):
+        """RoutingMatrix, ZipRoutingTable or WardGrid from <name>.json, or None if it hasn't been built"""
+        return self._tables.get(name)
+
+    def with_stats(self, stats):
+        """Same data, with new file modification times. Used when files were touched but not changed"""
+        return CourtCatalogue(self._courts, self._geodata, self._tables, stats, self.hashes)
+
+def build_catalogue(paths):
+    """Read and parse every file in paths ({filename: path or None}) into a new CourtCatalogue"""
+    courts = dict()
+    geodata = dict()
+    tables = dict()
+    stats = dict()
+    hashes = dict()
+    for filename, path in paths.items():
+        stat = _stat(path)
+        if stat is None:
+            continue
+        with open(path, 'rb') as data_file:
+            data = data_file.read()
+        stats[filename] = stat
+        hashes[filename] = hashlib.sha1(data).hexdigest()
+        name, extension = os.path.splitext(filename)
+        if extension == '.geojson':
+            import geopandas as gpd
+            frame = gpd.read_file(io.BytesIO(data))
+            frame.sindex # build the spatial index now rather than on the first query
+            geodata[name] = frame
+        elif name in TABLE_SOURCES:
+            tables[name] = TABLE_SOURCES[name](json.loads(data.decode('utf-8')))
+        else:
+            courts[name] = _freeze(json.loads(data.decode('utf-8')))
+    return CourtCatalogue(courts, geodata, tables, stats, hashes)
+
+_managers = weakref.WeakSet()
+
+def _reset_after_fork():
+    for manager in list(_managers):
+        manager._after_fork()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+class CatalogueManager(object):
+    """Owns the current CourtCatalogue for one data directory.
+
+    resolve maps a filename (e.g. 'bmc.json') to a path, or None if it doesn't exist.
+    Every check_interval seconds, a call to current() starts a background check for changed
+    files; the caller gets the existing snapshot immediately. Files are compared by
+    modification time and size first, and by content hash only when those differ.
+    Set check_interval to None to reload only when reload() is called."""
+    def __init__(self, resolve, check_interval=30):
+        self.resolve = resolve
+        self.check_interval = check_interval
+        self.reloads = 0
+        self.last_error = None
+        self._current = None
+        self._last_check = 0
+        self._checking = False
+        self._build_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        _managers.add(self)
+
+    def _after_fork(self):
+        # A background check running in the parent at fork time doesn't exist in the child
+        self._checking = False
+        self._build_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+
+    def current(self):
+        """Return the current snapshot, loading it on first use"""
+        catalogue = self._current
+        if catalogue is None:
+            return self.reload()
+        if self.check_interval is not None and time.time() - self._last_check > self.check_interval:
+            self._check_in_background()
+        return catalogue
+
+    def paths(self):
+        return {filename: self.resolve(filename) for filename in _filenames()}
+
+    def reload(self, force=False):
+        """Rebuild the catalogue if any file changed (or always, with force=True) and swap it in.
+        Returns the snapshot that is current afterwards."""
+        with self._build_lock:
+            self._last_check = time.time()
+            current = self._current
+            paths = self.paths()
+            stats = {filename: _stat(path) for filename, path in paths.items()}
+            stats = {filename: stat for filename, stat in stats.items() if stat is not None}
+            if current is not None and not force:
+                if stats == dict(current.stats):
+                    return current
+                hashes = dict()
+                for filename in stats:
+                    with open(paths[filename], 'rb') as data_file:
+                        hashes[filename] = hashlib.sha1(data_file.read()).hexdigest()
+                if hashes == dict(current.hashes):
+                    self._current = current.with_stats(stats)
+                    return self._current
+            catalogue = build_catalogue(paths)
+            self._current = catalogue
+            self.reloads += 1
+            return catalogue
+
+    def _check_in_background(self):
+        with self._state_lock:
+            if self._checking:
+                return
+            self._checking = True
+            self._last_check = time.time()
+        thread = threading.Thread(target=self._background_check, name='macourts-catalogue-reload')
+        thread.daemon = True
+        thread.start()
+
+    def _background_check(self):
+        try:
+            self.reload()
+            self.last_error = None
+        except Exception as err:
+            # A file may be caught half-written; keep serving the old snapshot and try again next interval
+            self.last_error = err
+        finally:
+            self._checking = False
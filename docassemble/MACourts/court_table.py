@@ -0,0 +1,137 @@
+"""Columnar, read-only table of every court, for analytics over the whole catalogue.
+
+Each court field is one column: NumPy float arrays for coordinates, a boolean array for PO
+boxes, and integer codes into a sorted list of categories for department, county, city and
+division. A query such as "courts in Middlesex County with a PO box, within 20 km of a
+point" compares a few small arrays instead of walking MACourt objects. Results are
+CourtViews: row numbers into the table, plus distances for distance queries. A view is
+turned into MACourt objects only when hydrate() is called.
+
+Category filters match exactly. Each accepts one value or a list of values.
+"""
+import numpy as np
+from .spatial_index import haversine_km
+
+__all__ = ['CourtTable', 'CourtView']
+
+class _Categories(object):
+    def __init__(self, values):
+        self.categories, codes = np.unique(np.asarray([str(value) for value in values], dtype=object), return_inverse=True)
+        self.codes = codes.astype(np.int16)
+        self._code_of = {category: code for code, category in enumerate(self.categories)}
+
+    def mask(self, values):
+        if isinstance(values, str):
+            code = self._code_of.get(values)
+            return self.codes == code if code is not None else np.zeros(len(self.codes), dtype=bool)
+        # One lookup into a per-category table instead of comparing every row with every value
+        wanted = np.zeros(len(self.categories), dtype=bool)
+        wanted[[self._code_of[value] for value in values if value in self._code_of]] = True
+        return wanted[self.codes]
+
+    def decode(self, rows):
+        return self.categories[self.codes[rows]].tolist()
+
+class CourtTable(object):
+    """Columns built from (record, department, division) rows, where record is a court from the packaged JSON.
+    hydrate is a callable (record, department, division) -> MACourt, used by CourtView.hydrate()."""
+    def __init__(self, rows, hydrate=None):
+        rows = list(rows)
+        self.records = tuple(record for record, department, division in rows)
+        self.size = len(rows)
+        self.names = np.asarray([record['name'] for record in self.records], dtype=object)
+        self.latitudes = np.asarray([np.nan if record['location'].get('latitude') is None else record['location']['latitude'] for record in self.records], dtype=float)
+        self.longitudes = np.asarray([np.nan if record['location'].get('longitude') is None else record['location']['longitude'] for record in self.records], dtype=float)
+        self.has_po_box = np.asarray([bool(record.get('has_po_box')) for record in self.records], dtype=bool)
+        self.columns = {
+            'department': _Categories([department for record, department, division in rows]),
+            'county': _Categories([record['address'].get('county') or '' for record in self.records]),
+            'city': _Categories([record['address'].get('city') or '' for record in self.records]),
+            'division': _Categories([division or '' for record, department, division in rows]),
+        }
+        self._departments = [department for record, department, division in rows]
+        self._divisions = [division for record, department, division in rows]
+        self._hydrate = hydrate
+
+    def categories(self, column):
+        """Distinct values of a category column"""
+        return list(self.columns[column].categories)
+
+    def mask(self, department=None, county=None, city=None, division=None, has_po_box=None):
+        """Boolean array of the rows matching every given criterion"""
+        mask = None
+        for column, values in (('department', department), ('county', county), ('city', city), ('division', division)):
+            if values is not None:
+                column_mask = self.columns[column].mask(values)
+                mask = column_mask if mask is None else mask & column_mask
+        if has_po_box is not None:
+            column_mask = self.has_po_box if has_po_box else ~self.has_po_box
+            mask = column_mask if mask is None else mask & column_mask
+        return np.ones(self.size, dtype=bool) if mask is None else mask
+
+    def all(self):
+        return CourtView(self, np.arange(self.size))
+
+    def filter(self, **criteria):
+        """CourtView of the courts matching the criteria (see mask), in table order"""
+        return CourtView(self, np.flatnonzero(self.mask(**criteria)))
+
+    def distances(self, latitude, longitude):
+        """Great-circle distance in km from a point to every court (nan for courts without coordinates)"""
+        return haversine_km(latitude, longitude, self.latitudes, self.longitudes)
+
+    def within(self, latitude, longitude, km, **criteria):
+        """CourtView of the courts within km of a point and matching the criteria, nearest first"""
+        distances = self.distances(latitude, longitude)
+        rows = np.flatnonzero(self.mask(**criteria) & (distances <= km))
+        order = np.argsort(distances[rows], kind='stable')
+        return CourtView(self, rows[order], distances[rows[order]])
+
+    def nearest(self, latitude, longitude, k=1, **criteria):
+        """CourtView of the k courts nearest to a point and matching the criteria, nearest first"""
+        distances = self.distances(latitude, longitude)
+        rows = np.flatnonzero(self.mask(**criteria) & ~np.isnan(distances))
+        order = np.argsort(distances[rows], kind='stable')[:k]
+        return CourtView(self, rows[order], distances[rows[order]])
+
+class CourtView(object):
+    """Some rows of a CourtTable. Columns are read from the table on demand"""
+    def __init__(self, table, rows, distances=None):
+        self.table = table
+        self.rows = np.asarray(rows, dtype=int)
+        self.distances = distances
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.records())
+
+    def __repr__(self):
+        return 'CourtView(%r)' % self.names()
+
+    def names(self):
+        return self.table.names[self.rows].tolist()
+
+    def column(self, column):
+        """Values of a category column (department, county, city or division) for these rows"""
+        return self.table.columns[column].decode(self.rows)
+
+    def latitudes(self):
+        return self.table.latitudes[self.rows]
+
+    def longitudes(self):
+        return self.table.longitudes[self.rows]
+
+    def records(self):
+        """The courts' records from the packaged JSON (read-only mappings)"""
+        return [self.table.records[row] for row in self.rows]
+
+    def filter(self, **criteria):
+        """Narrow this view further; see CourtTable.mask. Keeps the order and distances"""
+        keep = self.table.mask(**criteria)[self.rows]
+        return CourtView(self.table, self.rows[keep], None if self.distances is None else self.distances[keep])
+
+    def hydrate(self):
+        """List of MACourt objects for these rows, in order"""
+        return [self.table._hydrate(self.table.records[row], self.table._departments[row], self.table._divisions[row]) for row in self.rows]
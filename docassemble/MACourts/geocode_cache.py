@@ -0,0 +1,250 @@
+"""Persistent, size-bounded cache of geocoding results.
+
+Addresses are keyed on a normalised one-line string so that the same address typed
+slightly differently (case, punctuation, "Street" vs "St") shares a cache entry.
+Results are stored as plain JSON payloads, so the cache has no dependency on
+docassemble and can be exercised with a fake geocoder.
+"""
+import json, os, re, sqlite3, threading, time
+from .bounded_cache import BoundedCache
+
+__all__ = ['GeocodeCache', 'SQLiteGeocodeBackend', 'MemoryGeocodeBackend', 'normalize_address_key', 'address_to_payload', 'apply_payload_to_address', 'default_geocoder']
+
+# Common USPS suffix and direction abbreviations. Applied word-by-word after lowercasing.
+ADDRESS_ABBREVIATIONS = {
+    'street': 'st',
+    'avenue': 'ave',
+    'road': 'rd',
+    'drive': 'dr',
+    'boulevard': 'blvd',
+    'lane': 'ln',
+    'court': 'ct',
+    'place': 'pl',
+    'square': 'sq',
+    'terrace': 'ter',
+    'parkway': 'pkwy',
+    'highway': 'hwy',
+    'circle': 'cir',
+    'apartment': 'apt',
+    'suite': 'ste',
+    'unit': 'unit',
+    'north': 'n',
+    'south': 's',
+    'east': 'e',
+    'west': 'w',
+    'massachusetts': 'ma',
+}
+
+# Attributes DAObject uses for its own bookkeeping; never part of a geocoding result
+_INTERNAL_ATTRIBUTES = set(['instanceName', 'has_nonrandom_instance_name', 'attrList', 'geolocated', 'geolocate_success', 'geolocate_response'])
+
+def normalize_address_key(address):
+    """Return the cache key for an Address-like object or a one-line address string"""
+    if isinstance(address, str):
+        text = address
+    else:
+        parts = [getattr(address, attr, '') for attr in ('address', 'unit', 'city', 'state', 'zip')]
+        text = ' '.join(str(part) for part in parts if part)
+    text = re.sub(r'[^a-z0-9 ]', ' ', text.lower())
+    words = [ADDRESS_ABBREVIATIONS.get(word, word) for word in text.split()]
+    return ' '.join(words)
+
+def _primitive_attributes(obj):
+    if obj is None:
+        return {}
+    return {key: value for key, value in vars(obj).items()
+            if key not in _INTERNAL_ATTRIBUTES and isinstance(value, (str, int, float, bool))}
+
+def address_to_payload(address):
+    """Extract a JSON-serializable geocoding result from an Address that has been geolocated"""
+    success = bool(getattr(address, 'geolocate_success', False))
+    payload = {'success': success}
+    if success:
+        payload['latitude'] = address.location.latitude
+        payload['longitude'] = address.location.longitude
+        payload['description'] = getattr(address.location, 'description', '')
+        payload['norm'] = _primitive_attributes(getattr(address, 'norm', None))
+        payload['norm_long'] = _primitive_attributes(getattr(address, 'norm_long', None))
+    return payload
+
+def apply_payload_to_address(address, payload):
+    """Populate location, norm and norm_long on an Address from a cached payload, as Address.geolocate() would"""
+    if payload.get('success'):
+        address.location.latitude = payload['latitude']
+        address.location.longitude = payload['longitude']
+        address.location.description = payload.get('description', '')
+        address.location.gathered = True
+        address.location.known = True
+        for attr in ('norm', 'norm_long'):
+            address.initializeAttribute(attr, address.__class__)
+            for key, value in payload.get(attr, {}).items():
+                setattr(getattr(address, attr), key, value)
+    address.geolocate_success = bool(payload.get('success'))
+    address.geolocated = True
+    return address.geolocate_success
+
+def default_geocoder(address):
+    """Geocode with docassemble's own Address.geolocate() and return the resulting payload"""
+    address.geolocate()
+    return address_to_payload(address)
+
+class MemoryGeocodeBackend(object):
+    """In-process LRU backend. Useful for tests and for workers without a writable disk"""
+    def __init__(self):
+        # GeocodeCache bounds the size through evict()
+        self._entries = BoundedCache(None)
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def set(self, key, payload, created):
+        self._entries.set(key, (payload, created))
+
+    def delete(self, key):
+        self._entries.delete(key)
+
+    def evict(self, max_entries):
+        return self._entries.evict(max_entries)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class SQLiteGeocodeBackend(object):
+    """Backend stored in a local SQLite file, shared by every worker on the machine.
+    Eviction is least-recently-used, based on the time each entry was last read."""
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+
+    def _connect(self):
+        # A connection must not cross a fork, so reconnect in each child process
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS geocode_cache (key TEXT PRIMARY KEY, payload TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS geocode_cache_accessed ON geocode_cache (accessed)')
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, key):
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute('SELECT payload, created FROM geocode_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            connection.execute('UPDATE geocode_cache SET accessed = ? WHERE key = ?', (time.time(), key))
+            return json.loads(row[0]), row[1]
+
+    def set(self, key, payload, created):
+        with self._lock:
+            self._connect().execute('INSERT OR REPLACE INTO geocode_cache (key, payload, created, accessed) VALUES (?, ?, ?, ?)', (key, json.dumps(payload), created, created))
+
+    def delete(self, key):
+        with self._lock:
+            self._connect().execute('DELETE FROM geocode_cache WHERE key = ?', (key,))
+
+    def evict(self, max_entries):
+        with self._lock:
+            cursor = self._connect().execute('DELETE FROM geocode_cache WHERE key IN (SELECT key FROM geocode_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)', (max_entries,))
+            return cursor.rowcount
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute('DELETE FROM geocode_cache')
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute('SELECT COUNT(*) FROM geocode_cache').fetchone()[0]
+
+class GeocodeCache(object):
+    """Size-bounded geocode cache with a time-to-live on each entry.
+
+    backend is any object with get/set/delete/evict/clear methods; defaults to an in-memory LRU.
+    geocoder is a callable that accepts an Address and returns a payload dictionary
+    (see address_to_payload); defaults to Address.geolocate(). Failed lookups are cached
+    for negative_ttl seconds so that a bad address isn't sent to the geocoder over and over."""
+    def __init__(self, backend=None, geocoder=None, ttl=90*24*60*60, negative_ttl=24*60*60, max_entries=50000):
+        self.backend = backend if backend is not None else MemoryGeocodeBackend()
+        self.geocoder = geocoder if geocoder is not None else default_geocoder
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.expired = 0
+            self.evicted = 0
+
+    def stats(self):
+        """Return hit/miss counts and the hit rate since the cache was created or reset"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evicted': self.evicted,
+                'lookups': lookups,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+            }
+
+    def get(self, key):
+        """Return the cached payload for a normalised key, or None if missing or expired"""
+        entry = self.backend.get(key)
+        if entry is not None:
+            payload, created = entry
+            ttl = self.ttl if payload.get('success') else self.negative_ttl
+            if time.time() - created <= ttl:
+                with self._lock:
+                    self.hits += 1
+                return payload
+            self.backend.delete(key)
+            with self._lock:
+                self.expired += 1
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, payload):
+        self.backend.set(key, payload, time.time())
+        with self._lock:
+            self._writes_since_evict += 1
+            # Evicting in batches keeps the cost of the size check off most writes
+            should_evict = self._writes_since_evict >= max(1, self.max_entries // 100)
+            if should_evict:
+                self._writes_since_evict = 0
+        if should_evict:
+            evicted = self.backend.evict(self.max_entries)
+            with self._lock:
+                self.evicted += evicted
+
+    def geolocate(self, address, geocoder=None):
+        """Geolocate an Address through the cache. Addresses that are already geolocated are left alone.
+        Returns True if the address was geolocated successfully."""
+        if getattr(address, 'geolocated', False):
+            return bool(getattr(address, 'geolocate_success', False))
+        key = normalize_address_key(address)
+        if not key:
+            return False
+        payload = self.get(key)
+        if payload is None:
+            payload = (geocoder or self.geocoder)(address)
+            self.set(key, payload)
+        return apply_payload_to_address(address, payload)
+
+    def clear(self):
+        self.backend.clear()
+        self.reset_stats()
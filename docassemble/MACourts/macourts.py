@@ -1,18 +1,132 @@
 from docassemble.base.core import DAObject, DAList, DADict
-from docassemble.base.util import path_and_mimetype, Address, LatitudeLongitude, DAStaticFile, text_type, PY2, markdown_to_html, prevent_dependency_satisfaction
+from docassemble.base.util import path_and_mimetype, Address, LatitudeLongitude, DAStaticFile, text_type, PY2, markdown_to_html, prevent_dependency_satisfaction, get_config, get_language
 from docassemble.base.legal import Court
 import io, json, sys, requests, bs4, re, os #, cbor
-from docassemble.webapp.playground import PlaygroundSection
 import usaddress
 from uszipcode import SearchEngine
 from collections.abc import Iterable
-import copy
+import copy, gc, hashlib, math, tempfile, time
+from .catalogue import CatalogueManager, COURT_SOURCES
+from .geocode_cache import GeocodeCache, SQLiteGeocodeBackend
+from .spatial_index import CourtLocationIndex
+from .bounded_cache import BoundedCache
+from .court_table import CourtTable
+from .ward_frames import assign_boston_wards as assign_boston_wards_to_frame
+from .shared_cache import SharedRoutingCache, redis_client_from_url
+from .ward_geometry import build_ward_detail_layers, detail_level_for_zoom, ward_layer_filename
+from .ward_grid import build_ward_grid
+from .routing_tables import build_routing_matrix, find_branch_conflicts, load_municipalities, load_zip_towns, routing_key, routing_source_hash, build_zip_routing_table, RoutingAddress, MATRIX_VERSION, ZIP_TABLE_VERSION
 
 # Needed for Boston Municipal Court
 import geopandas as gpd
 from shapely.geometry import Point
 
-__all__= ['get_courts_from_massgov_url','save_courts_to_file','MACourt','MACourtList','PY2','combined_locations']
+__all__= ['get_courts_from_massgov_url','save_courts_to_file','MACourt','MACourtList','PY2','combined_locations','get_geocode_cache','geocode_cache_stats','get_routing_matrix','save_routing_matrix_to_file','get_zip_routing_table','save_zip_routing_table_to_file','get_catalogue','reload_catalogues','warm_up','get_shared_routing_cache','get_ward_layer','save_ward_detail_layers_to_file','CourtMapLayer','all_courts_map_layer','get_court_table','assign_boston_wards','GroupedMatches','get_ward_grid','save_ward_grid_to_file','ward_grid_stats','playground_sources_path']
+
+ALL_COURT_SOURCES = ['housing_courts','bmc','district_courts','superior_courts','land_court','juvenile_courts','probate_and_family_courts']
+ALL_DEPARTMENTS = ['Housing Court','District Court','Boston Municipal Court','Juvenile Court','Land Court','Probate and Family Court','Superior Court']
+
+_geocode_cache = None
+
+def get_geocode_cache():
+    """Return the process-wide geocode cache, backed by a SQLite file shared by all workers on this machine.
+    Configure with the `macourts` directive in the docassemble configuration:
+    `geocode cache path`, `geocode cache ttl days` and `geocode cache size`."""
+    global _geocode_cache
+    if _geocode_cache is None:
+        config = get_config('macourts', {}) or {}
+        path = config.get('geocode cache path', os.path.join(tempfile.gettempdir(), 'macourts_geocode_cache.sqlite'))
+        _geocode_cache = GeocodeCache(backend=SQLiteGeocodeBackend(path),
+                                      ttl=float(config.get('geocode cache ttl days', 90))*24*60*60,
+                                      max_entries=int(config.get('geocode cache size', 50000)))
+    return _geocode_cache
+
+_location_indexes = BoundedCache(32)
+
+def get_court_location_index(courts):
+    """Return a CourtLocationIndex over the given MACourts. Indexes are built once per distinct set of courts and shared process-wide"""
+    # Courts without coordinates are kept in the index, which never returns them
+    signature = tuple((court.name, getattr(court, 'department', None), getattr(court.location, 'latitude', None), getattr(court.location, 'longitude', None))
+                      for court in courts)
+    return _location_indexes.get_or_build(signature, lambda: CourtLocationIndex([item[2] for item in signature], [item[3] for item in signature],
+                                                                                [item[1] for item in signature]))
+
+def _latitude_longitude(location):
+    """Accepts an Address, a LatitudeLongitude or a (latitude, longitude) pair.
+    Returns (None, None) unless both coordinates are known, finite numbers, e.g. for an address that hasn't been geolocated"""
+    if isinstance(location, (tuple, list)):
+        latitude, longitude = location[0], location[1]
+    else:
+        if hasattr(location, 'location'):
+            location = location.location
+        latitude, longitude = getattr(location, 'latitude', None), getattr(location, 'longitude', None)
+    try:
+        if math.isfinite(float(latitude)) and math.isfinite(float(longitude)):
+            return latitude, longitude
+    except (TypeError, ValueError):
+        pass
+    return None, None
+
+def geocode_cache_stats():
+    """Return hits, misses and hit rate of the process-wide geocode cache"""
+    return get_geocode_cache().stats()
+
+def playground_section(section):
+    """Return a PlaygroundSection. Imported on demand, so that routing doesn't need the docassemble web application"""
+    from docassemble.webapp.playground import PlaygroundSection
+    return PlaygroundSection(section)
+
+def playground_sources_path():
+    """Directory of the current user's Playground data sources, for use as a data_path"""
+    return playground_section('sources').get_area().directory
+
+def data_file_path(data_path, filename):
+    """Path of a data file, or None if it doesn't exist. data_path is a package reference such as
+    'docassemble.MACourts:data/sources/', or a directory on disk such as playground_sources_path(); files
+    missing from a directory are taken from the package"""
+    if os.path.isabs(data_path):
+        path = os.path.join(data_path, filename)
+        if os.path.isfile(path):
+            return path
+        data_path = 'docassemble.MACourts:data/sources/'
+    return path_and_mimetype(os.path.join(data_path, filename))[0]
+
+# The element that has the JSON data as of 6/19/2018
+DRUPAL_SETTINGS_SELECTOR = re.compile(r'''data-drupal-selector\s*=\s*["']drupal-settings-json["']''')
+SCRIPT_END = re.compile(r'</script\s*>', re.I)
+
+def drupal_settings_json_fast(html):
+    """Return the text of the drupal-settings-json script element by scanning for it directly, or None if the
+    page doesn't have it in the expected form. Much faster than parsing the whole page"""
+    attribute = DRUPAL_SETTINGS_SELECTOR.search(html)
+    if attribute is None:
+        return None
+    tag_start = html.rfind('<', 0, attribute.start())
+    if tag_start < 0 or html[tag_start:tag_start + 7].lower() != '<script' or '>' in html[tag_start:attribute.start()]:
+        return None
+    tag_end = html.find('>', attribute.end())
+    if tag_end < 0:
+        return None
+    match = SCRIPT_END.search(html, tag_end + 1)
+    if match is None:
+        return None
+    return html[tag_end + 1:match.start()]
+
+def drupal_settings_json_soup(html):
+    """Return the text of the drupal-settings-json element by parsing the page with BeautifulSoup"""
+    soup = bs4.BeautifulSoup(html, 'html.parser')
+    return soup.find_all( attrs={"data-drupal-selector":"drupal-settings-json"} )[0].text
+
+def get_drupal_settings(html):
+    """Return the Drupal settings JSON embedded in a Mass.gov page. Falls back on BeautifulSoup when the fast scan
+    can't find or decode the element"""
+    jstring = drupal_settings_json_fast(html)
+    if jstring is not None:
+        try:
+            return json.loads(jstring)
+        except ValueError:
+            pass
+    return json.loads(drupal_settings_json_soup(html))
 
 def get_courts_from_massgov_url(url, shim_ehc_middlesex=True, shim_nhc_woburn=True):
     searcher = SearchEngine(simple_zipcode=True)
@@ -20,9 +134,7 @@ def get_courts_from_massgov_url(url, shim_ehc_middlesex=True, shim_nhc_woburn=Tr
     Properties include name, phone, fax, address, description (usually includes cities or county served), latitude, longitude
     """
     page = requests.get(url)
-    soup = bs4.BeautifulSoup(page.text, 'html.parser')
-    jstring = soup.find_all( attrs={"data-drupal-selector":"drupal-settings-json"} )[0].text # this is the element that has the JSON data as of 6/19/2018
-    jdata = json.loads(jstring)
+    jdata = get_drupal_settings(page.text)
     markers = jdata['locations']['googleMap']['markers']
 
     courts = []
@@ -184,7 +296,9 @@ def get_courts_from_massgov_url(url, shim_ehc_middlesex=True, shim_nhc_woburn=Tr
     return courts
 
 def save_courts_to_file():
-    ''' Writes all courts to .json files in Playground data sources folder'''
+    ''' Writes all courts to .json files in Playground data sources folder, and returns that folder.
+    Routing reads the package's court files unless it is given data_path=playground_sources_path();
+    catalogues for that path see the new files at once'''
     courts = [
         [
             'juvenile_courts', 'https://www.mass.gov/orgs/juvenile-court/locations'
@@ -208,10 +322,12 @@ def save_courts_to_file():
             'land_court', 'https://www.mass.gov/orgs/land-court/locations'
         ]
     ]
-    sources = PlaygroundSection('sources')
+    sources = playground_section('sources')
     for court in courts:
         jdata = json.dumps(get_courts_from_massgov_url(court[1]))
         sources.write_file(court[0] + '.json', jdata, binary=True)
+    reload_catalogues()
+    return playground_sources_path()
 
     # for court in courts:
     #     #area = PlaygroundSection('sources').get_area()
@@ -222,8 +338,273 @@ def save_courts_to_file():
     #     f.close()
     #sources.finalize()
 
+def build_routing_tables(data_path='docassemble.MACourts:data/sources/'):
+    """Route every Massachusetts municipality and Boston ward through the routing methods.
+    Returns (matrix, report); see routing_tables.build_routing_matrix"""
+    courts = MACourtList('routing_courts')
+    courts.load_courts(courts=ALL_COURT_SOURCES, data_path=data_path)
+    municipalities = load_municipalities(data_file_path(data_path, 'ma_municipalities.json'))
+    wards = courts.load_boston_wards_from_file('boston_wards', data_path=data_path)
+    return build_routing_matrix(courts, municipalities, wards=wards, conflicts=find_branch_conflicts(__file__), source_hash=routing_source_hash(__file__))
+
+def save_routing_matrix_to_file():
+    ''' Writes the routing matrix and its conflict/gap report to .json files in Playground data sources folder'''
+    matrix, report = build_routing_tables()
+    sources = playground_section('sources')
+    sources.write_file('routing_matrix.json', json.dumps(matrix, separators=(',', ':')), binary=True)
+    sources.write_file('routing_report.json', json.dumps(report, indent=1, sort_keys=True), binary=True)
+    return report
+
+_routing_source_hash = None
+
+def _current_routing_source_hash():
+    global _routing_source_hash
+    if _routing_source_hash is None:
+        _routing_source_hash = routing_source_hash(__file__)
+    return _routing_source_hash
+
+def get_routing_matrix():
+    """Return the precomputed RoutingMatrix, or None if routing_matrix.json hasn't been built or is out of date
+    with the routing methods. Without it, routing falls back to the if/elif chains on MACourtList.
+    The matrix stores court names, which are matched against the courts in the list when routing, so it
+    stays valid when the court data changes."""
+    matrix = get_catalogue().table('routing_matrix')
+    if matrix is None or matrix.version != MATRIX_VERSION or matrix.source_hash != _current_routing_source_hash():
+        return None
+    return matrix
+
+def load_zip_towns_from_uszipcode():
+    """Return {zip code: [town, ...]} for every Massachusetts zip code in the uszipcode database"""
+    searcher = SearchEngine(simple_zipcode=True)
+    zip_towns = dict()
+    for zipinfo in searcher.by_state('MA', returns=0):
+        towns = [zipinfo.major_city] + list(zipinfo.common_city_list or [])
+        zip_towns[zipinfo.zipcode] = [town for town in towns if town]
+    return zip_towns
+
+def build_zip_routing_tables(zip_towns=None, data_path='docassemble.MACourts:data/sources/'):
+    """Build the zip code routing table from the routing matrix and a {zip code: [town, ...]} dataset.
+    By default, the dataset is the packaged ma_zip_towns.json (Postal Service city names for every Massachusetts
+    zip code); pass load_zip_towns_from_uszipcode() to use the uszipcode database instead.
+    Returns (table, report); see routing_tables.build_zip_routing_table"""
+    matrix = get_routing_matrix()
+    if matrix is None:
+        matrix = build_routing_tables(data_path=data_path)[0]
+    if zip_towns is None:
+        zip_towns = load_zip_towns(data_file_path(data_path, 'ma_zip_towns.json'))
+    municipalities = load_municipalities(data_file_path(data_path, 'ma_municipalities.json'))
+    return build_zip_routing_table(matrix, zip_towns, municipalities)
+
+def save_zip_routing_table_to_file(zip_towns=None):
+    ''' Writes the zip code routing table and its report to .json files in Playground data sources folder'''
+    table, report = build_zip_routing_tables(zip_towns=zip_towns)
+    sources = playground_section('sources')
+    sources.write_file('zip_routing.json', json.dumps(table, separators=(',', ':')), binary=True)
+    sources.write_file('zip_routing_report.json', json.dumps(report, indent=1, sort_keys=True), binary=True)
+    return report
+
+def get_zip_routing_table():
+    """Return the precomputed ZipRoutingTable, or None if zip_routing.json hasn't been built or is out of date"""
+    table = get_catalogue().table('zip_routing')
+    if table is None or table.version != ZIP_TABLE_VERSION or table.source_hash != _current_routing_source_hash():
+        return None
+    return table
+
+_catalogues = dict()
+
+def build_ward_detail_layers_from_file(data_path='docassemble.MACourts:data/sources/'):
+    """Simplified ward and BMC division layers at every detail level; see ward_geometry.build_ward_detail_layers"""
+    wards = gpd.read_file(data_file_path(data_path, 'boston_wards.geojson'))
+    return build_ward_detail_layers(wards)
+
+def save_ward_detail_layers_to_file():
+    ''' Writes the reduced-detail ward and BMC division layers to .geojson files in Playground data sources folder'''
+    layers, report = build_ward_detail_layers_from_file()
+    sources = playground_section('sources')
+    for filename, layer in layers.items():
+        sources.write_file(filename, json.dumps(layer, separators=(',', ':')), binary=True)
+    return report
+
+# The text of each layer file; a string can be shared safely, while the parsed GeoJSON could be modified by a caller
+_ward_layers = BoundedCache(32)
+
+def _read_text(path):
+    with io.open(path, encoding='utf-8') as text_file:
+        return text_file.read()
+
+def get_ward_layer(zoom, layer='boston_wards', data_path='docassemble.MACourts:data/sources/'):
+    """Return the GeoJSON (as a new dict on every call) of the Boston wards, or with layer='bmc_divisions' of the BMC
+    divisions, at the detail suited to a web map zoom level. For drawing only; routing uses the full-precision wards."""
+    filename = ward_layer_filename(layer, detail_level_for_zoom(zoom))
+    return json.loads(_ward_layers.get_or_build((data_path, filename), lambda: _read_text(data_file_path(data_path, filename))))
+
+def build_ward_grid_from_file(data_path='docassemble.MACourts:data/sources/'):
+    """Geohash grid of the Boston wards; see ward_grid.build_ward_grid"""
+    with open(data_file_path(data_path, 'boston_wards.geojson'), 'rb') as wards_file:
+        data = wards_file.read()
+    return build_ward_grid(gpd.read_file(io.BytesIO(data)), wards_hash=hashlib.sha1(data).hexdigest())
+
+def save_ward_grid_to_file():
+    ''' Writes the Boston ward grid to a .json file in Playground data sources folder'''
+    grid, report = build_ward_grid_from_file()
+    sources = playground_section('sources')
+    sources.write_file('ward_grid.json', json.dumps(grid, separators=(',', ':')), binary=True)
+    return report
+
+def get_ward_grid(data_path='docassemble.MACourts:data/sources/'):
+    """Return the precomputed WardGrid, or None if ward_grid.json hasn't been built or was built from other wards"""
+    catalogue = get_catalogue(data_path)
+    grid = catalogue.table('ward_grid')
+    if grid is None or grid.wards_hash != catalogue.hashes.get('boston_wards.geojson'):
+        return None
+    return grid
+
+def ward_grid_stats():
+    """Return how many Boston ward lookups the ward grid answered without geometry, or None without a grid"""
+    grid = get_ward_grid()
+    return None if grid is None else grid.stats()
+
+def assign_boston_wards(frame, latitude='latitude', longitude='longitude', city=None, nearest=True, data_path='docassemble.MACourts:data/sources/'):
+    """Add ward_number and bmc_courthouse columns to a copy of a pandas or GeoPandas frame of points, using the
+    packaged Boston wards. The frame-level equivalent of MACourtList.get_boston_ward_number; see
+    ward_frames.assign_boston_wards for the arguments"""
+    wards = get_catalogue(data_path).geodata('boston_wards')
+    if wards is None:
+        wards = gpd.read_file(data_file_path(data_path, 'boston_wards.geojson'))
+    return assign_boston_wards_to_frame(frame, wards, latitude=latitude, longitude=longitude, city=city, nearest=nearest)
+
+SOURCE_DEPARTMENTS = {
+    'housing_courts': 'Housing Court',
+    'bmc': 'Boston Municipal Court',
+    'district_courts': 'District Court',
+    'superior_courts': 'Superior Court',
+    'land_court': 'Land Court',
+    'juvenile_courts': 'Juvenile Court',
+    'probate_and_family_courts': 'Probate and Family Court',
+    # older name for land_court
+    'land_courts': 'Land Court',
+}
+
+_court_tables = BoundedCache(4)
+
+def get_court_table(data_path='docassemble.MACourts:data/sources/'):
+    """Return a CourtTable of every packaged court, for vectorised filters and distance queries. E.g.
+    get_court_table().filter(county='Middlesex County', has_po_box=True).hydrate()
+    Built once per catalogue version"""
+    catalogue = get_catalogue(data_path)
+    key = (data_path, catalogue.version)
+    table = _court_tables.get(key)
+    if table is None:
+        rows = list()
+        for source in ALL_COURT_SOURCES:
+            for item in catalogue.court_records(source) or ():
+                rows.append((item, SOURCE_DEPARTMENTS[source], parse_division_from_name(item['name'])))
+        table = CourtTable(rows, hydrate=lambda item, department, division: fill_court_from_record(MACourt(), item, department, division))
+        _court_tables.set(key, table)
+    return table
+
+_map_markers = BoundedCache(20000)
+
+def _address_fields(address):
+    # instanceName differs between copies of the same address and doesn't affect how it is formatted
+    return tuple(sorted((key, value) for key, value in vars(address).items()
+                        if key not in ('instanceName', 'has_nonrandom_instance_name') and isinstance(value, (str, int, float, bool))))
+
+def cached_map_info(obj, label):
+    """_map_info() markers for an object with an address and a location, labelled with label. The marker text
+    (including the formatted address block) is cached by everything it depends on, so redrawing a map of the same
+    static court data doesn't format every address again. Returns fresh copies, since map_of() modifies its markers."""
+    icon = getattr(obj, 'icon', None)
+    key = (label, obj.location.latitude, obj.location.longitude, repr(icon), get_language(), _address_fields(obj.address))
+    result = _map_markers.get(key)
+    if result is None:
+        result = {'latitude': obj.location.latitude, 'longitude': obj.location.longitude, 'info': label + "  [NEWLINE]  " + obj.address.block()}
+        if hasattr(obj, 'icon'):
+            result['icon'] = obj.icon
+        _map_markers.set(key, result)
+    return [dict(result)]
+
+_shared_routing_cache = None
+
+def _shared_routing_cache_version():
+    return get_catalogue().version[:16] + _current_routing_source_hash()[:16]
+
+def get_shared_routing_cache():
+    """Return the process-wide cache of ward lookups and matching_courts results. It is always an in-process LRU;
+    with `shared cache: True` under the `macourts` configuration directive, it is also shared between workers
+    through Redis (`shared cache redis url`, by default docassemble's own `redis` setting).
+    `shared cache ttl days` and `shared cache size` set the Redis expiry and the size of the in-process LRU."""
+    global _shared_routing_cache
+    if _shared_routing_cache is None:
+        config = get_config('macourts', {}) or {}
+        client = None
+        if config.get('shared cache'):
+            client = redis_client_from_url(config.get('shared cache redis url') or get_config('redis') or 'redis://localhost')
+        _shared_routing_cache = SharedRoutingCache(client=client, version=_shared_routing_cache_version,
+                                                   ttl=int(float(config.get('shared cache ttl days', 7))*24*60*60),
+                                                   local_size=int(config.get('shared cache size', 10000)))
+    return _shared_routing_cache
+
+def get_catalogue(data_path='docassemble.MACourts:data/sources/'):
+    """Return the current CourtCatalogue for a data directory. The catalogue is loaded once per process and
+    reloaded in the background when its files change; the `catalogue check interval` setting of the `macourts`
+    configuration directive controls how often (in seconds) files are checked. Only the files under data_path
+    are watched: the default catalogue doesn't see files saved to the Playground, which need
+    data_path=playground_sources_path()."""
+    manager = _catalogues.get(data_path)
+    if manager is None:
+        config = get_config('macourts', {}) or {}
+        interval = config.get('catalogue check interval', 30)
+        manager = _catalogues.setdefault(data_path, CatalogueManager(lambda filename: data_file_path(data_path, filename),
+                                                                     check_interval=None if interval is None else float(interval)))
+    return manager.current()
+
+def reload_catalogues(force=False):
+    """Check every loaded catalogue for changed files now, and swap in rebuilt catalogues"""
+    for manager in list(_catalogues.values()):
+        manager.reload(force=force)
+
+def warm_up(data_path='docassemble.MACourts:data/sources/', freeze=True):
+    """Load and index all of the package's static data in the current process.
+
+    Call this in a master process before it forks workers (for example from a uwsgi or celery
+    preload hook), so that the parsed court JSON, the Boston ward GeoDataFrame and its spatial
+    index, the routing tables and the court location index are shared by every worker through
+    copy-on-write instead of being rebuilt in each one. With freeze=True, everything allocated so
+    far is moved out of the garbage collector's reach, so that collections in the workers don't
+    write to (and so copy) the shared pages.
+    Returns the seconds spent on each step."""
+    timings = dict()
+    started = time.time()
+    catalogue = get_catalogue(data_path)
+    timings['catalogue'] = time.time() - started
+
+    started = time.time()
+    get_routing_matrix()
+    get_zip_routing_table()
+    courts = MACourtList('warm_up_courts')
+    courts.load_courts(courts=ALL_COURT_SOURCES, data_path=data_path)
+    get_court_location_index(courts.elements)
+    timings['indexes'] = time.time() - started
+
+    # One lookup of each kind pulls in the lazily imported parts of shapely and geopandas
+    started = time.time()
+    address = RoutingAddress('Boston', 'Suffolk County', 42.3603, -71.0580)
+    if catalogue.geodata('boston_wards') is not None:
+        courts.get_boston_ward_number(address)
+    courts.matching_courts_single_address(address, ALL_DEPARTMENTS)
+    courts.nearest_courts(address, k=1)
+    timings['first_lookup'] = time.time() - started
+
+    if freeze and hasattr(gc, 'freeze'):
+        started = time.time()
+        gc.collect()
+        gc.freeze()
+        timings['gc_freeze'] = time.time() - started
+    return timings
+
 def test_write():
-    area = PlaygroundSection('sources').get_area()
+    area = playground_section('sources').get_area()
     fpath = os.path.join(area.directory, "test" + '.json')
     jdata = "test"
     f = open(fpath, 'w')
@@ -253,15 +634,13 @@ class MACourt(Court):
         return self.__unicode__().encode('utf-8') if PY2 else self.name
 
     def _map_info(self):
-        the_info = str(self.name)
-        the_info += "  [NEWLINE]  " + self.address.block()
-        result = {'latitude': self.location.latitude, 'longitude': self.location.longitude, 'info': the_info}
-        if hasattr(self, 'icon'):
-            result['icon'] = self.icon
-        return [result]
+        return cached_map_info(self, str(self.name))
 
 class MACourtList(DAList):
-    """Represents a list of courts in Massachusetts. Package includes a cached list that is scraped from mass.gov"""
+    """Represents a list of courts in Massachusetts. Package includes a cached list that is scraped from mass.gov
+    Set geocode_addresses=True to have matching_courts geolocate addresses that haven't been geolocated yet,
+    through the persistent geocode cache. Set fallback_to_nearest=True to have matching_courts return the
+    nearest court of each requested type when jurisdiction routing finds nothing."""
     def init(self, *pargs, **kwargs):
         super(MACourtList, self).init(*pargs, **kwargs)
         self.auto_gather = False
@@ -296,7 +675,43 @@ class MACourtList(DAList):
         else:
             return self.matching_courts_single_address(address, court_types)
 
+    def matching_courts_grouped(self, addresses, court_types=None):
+        """Route a list of addresses, routing each distinct place only once. Addresses are grouped by the fields
+        routing depends on (town and county, compared case-insensitively, plus the neighborhood and BMC division),
+        so several parties at one address, or different units in one building, cost a single lookup.
+        Returns a GroupedMatches with the courts for each address and the union of all of them."""
+        court_types = ALL_DEPARTMENTS if court_types is None else court_types
+        if getattr(self, 'geocode_addresses', False):
+            for address in addresses:
+                self.geolocate_address(address)
+        results = list()
+        routed = dict()
+        for index, address in enumerate(addresses):
+            fields = self._routing_fields(address)
+            if fields is None:
+                key = ('address', index)
+            else:
+                city, county, neighborhood, division = fields
+                # Whether the address has a neighborhood at all matters for Boston, not just its value
+                key = (city.lower(), county.lower(), hasattr(getattr(address, 'norm', address), 'neighborhood'), (neighborhood or '').lower(), division)
+                if getattr(self, 'fallback_to_nearest', False):
+                    # The nearest court depends on the exact location, not just the town
+                    location = getattr(address, 'location', None)
+                    key += (getattr(location, 'latitude', None), getattr(location, 'longitude', None))
+            if key not in routed:
+                routed[key] = self.matching_courts_single_address(address, court_types)
+            found = routed[key]
+            # Each address gets its own list, so changing one address's courts doesn't change the others'
+            results.append((address, list(found) if isinstance(found, list) else found))
+        return GroupedMatches(results, len(routed))
+
+    def geolocate_address(self, address):
+        """Geolocate the address through the geocode cache if it hasn't been geolocated already"""
+        return get_geocode_cache().geolocate(address)
+
     def matching_courts_single_address(self, address, court_types=None):
+        if getattr(self, 'geocode_addresses', False):
+            self.geolocate_address(address)
         court_type_map = {
             'Housing Court': self.matching_housing_court,
             'District Court': self.matching_district_court,
@@ -307,12 +722,20 @@ class MACourtList(DAList):
             'Superior Court': self.matching_superior_court,
         }
 
+        matrix = get_routing_matrix()
+        key = self.routing_key(address, matrix=matrix)
+
         if isinstance(court_types, str):
-            return court_type_map[court_types](address)
+            res = self._matching_court(address, court_types, key, matrix, court_type_map)
+            if not res and getattr(self, 'fallback_to_nearest', False):
+                res = next(iter(self.nearest_courts(address, court_types=court_types)), None)
+            return res
         elif isinstance(court_types, Iterable):
             matches = set()
             for court_type in court_types:
-                res =  court_type_map[court_type](address)
+                res = self._matching_court(address, court_type, key, matrix, court_type_map)
+                if not res and getattr(self, 'fallback_to_nearest', False):
+                    res = self.nearest_courts(address, court_types=court_type)
                 if isinstance(res, Iterable):
                     matches.update(res)
                 elif not res is None:
@@ -332,6 +755,137 @@ class MACourtList(DAList):
         #     return None
         return list(matches)
 
+    def routing_key(self, address, matrix=None):
+        """Return the key of the address in the precomputed routing matrix, or None if the matrix can't answer for it.
+        Addresses outside the matrix (unknown town names, Boston addresses with a neighborhood) use the if/elif chains."""
+        if matrix is None:
+            matrix = get_routing_matrix()
+        if matrix is None:
+            return None
+        if hasattr(address, 'norm') and hasattr(address.norm, 'city') and hasattr(address.norm, 'county'):
+            address_to_compare = address.norm
+        else:
+            address_to_compare = address
+        city = getattr(address_to_compare, 'city', None)
+        county = getattr(address_to_compare, 'county', None)
+        if not isinstance(city, str) or not isinstance(county, str):
+            return None
+        # Juvenile Court routing for Boston also looks at the neighborhood, which the matrix doesn't cover
+        if city.lower() == 'boston' and hasattr(address_to_compare, 'neighborhood'):
+            return None
+        division = ''
+        if city.lower() == 'boston' or getattr(getattr(address, 'norm', None), 'city', None) == 'Boston':
+            try:
+                division = self.get_boston_ward_number(address)[1]
+            except:
+                division = ''
+        key = routing_key(city, county, division)
+        return key if key in matrix else None
+
+    def _matching_court(self, address, court_type, key, matrix, court_type_map):
+        if key is None:
+            return self._cached_chain_match(address, court_type, court_type_map)
+        names = matrix.court_names(key, court_type)
+        if isinstance(names, list):
+            return set(self.court_by_name(name) for name in names)
+        return self.court_by_name(names)
+
+    def _routing_fields(self, address):
+        """The address fields that routing depends on: [city, county, neighborhood, BMC division].
+        The division is blank unless the address is normalised to Boston, when it comes from the location.
+        Returns None if the address doesn't have them in the expected form"""
+        if hasattr(address, 'norm') and hasattr(address.norm, 'city') and hasattr(address.norm, 'county'):
+            address_to_compare = address.norm
+        else:
+            address_to_compare = address
+        city = getattr(address_to_compare, 'city', None)
+        county = getattr(address_to_compare, 'county', None)
+        neighborhood = getattr(address_to_compare, 'neighborhood', None)
+        if not isinstance(city, str) or not isinstance(county, str) or not isinstance(neighborhood, (str, type(None))):
+            return None
+        try:
+            division = self.get_boston_ward_number(address)[1]
+        except:
+            division = None
+        return [city, county, neighborhood, division]
+
+    def _cached_chain_match(self, address, court_type, court_type_map):
+        """Route with the if/elif chains, through the shared routing cache. Cached by the address fields the
+        chains read and by the names of the courts in this list, which is what the chains search"""
+        fields = self._routing_fields(address)
+        if fields is None:
+            return court_type_map[court_type](address)
+        city, county, neighborhood, division = fields
+        signature = hashlib.sha1('\n'.join(court.name for court in self.elements).encode('utf-8')).hexdigest()
+        cache_key = json.dumps([city, county, neighborhood, division, court_type, signature])
+        cache = get_shared_routing_cache()
+        cached = cache.get('courts', cache_key)
+        if cached is not None:
+            if cached['set']:
+                return set(self.court_by_name(name) for name in cached['names'])
+            return self.court_by_name(cached['names'][0])
+        result = court_type_map[court_type](address)
+        courts = result if isinstance(result, set) else [result]
+        names = [court.name.rstrip() if court is not None else None for court in courts]
+        cache.set('courts', cache_key, {'set': isinstance(result, set), 'names': names})
+        return result
+
+    def court_by_name(self, court_name):
+        """Return the first court whose name matches, ignoring case and trailing whitespace"""
+        if court_name is None:
+            return None
+        return next((court for court in self.elements if court.name.rstrip().lower() == court_name.lower()), None)
+
+    def matching_courts_by_zip(self, zip_code, court_types=None):
+        """Return the courts that may serve a Massachusetts zip code, without geocoding. A zip code that spans several
+        towns or court jurisdictions returns every candidate court. Optionally limit to one or more types of courts.
+        Returns an empty list for unknown zip codes. Raises IOError if the zip routing table is missing or out of date."""
+        table = get_zip_routing_table()
+        if table is None:
+            raise IOError('zip_routing.json is missing or out of date with the routing methods; rebuild it with save_zip_routing_table_to_file()')
+        if zip_code not in table:
+            return []
+        if court_types is None:
+            court_types = table.departments
+        elif isinstance(court_types, str):
+            court_types = [court_types]
+        courts = list()
+        for court_type in court_types:
+            for court_name in table.court_names(zip_code, court_type):
+                court = self.court_by_name(court_name)
+                if court is not None and court not in courts:
+                    courts.append(court)
+        return courts
+
+    def nearest_courts(self, location, k=1, court_types=None, max_distance=None, return_distance=False):
+        """Return the k courts closest to location (an Address, LatitudeLongitude or (latitude, longitude) pair), nearest first.
+        Optionally limit to one or more court departments and to courts within max_distance kilometers.
+        With return_distance=True, returns a list of (court, distance in km) pairs instead.
+        Returns an empty list if the location isn't known, e.g. for an address that hasn't been geolocated."""
+        latitude, longitude = _latitude_longitude(location)
+        if latitude is None or longitude is None:
+            return []
+        indices, distances = get_court_location_index(self.elements).query(latitude, longitude, k=k, departments=court_types, max_distance_km=max_distance)
+        if return_distance:
+            return [(self.elements[index], float(distance)) for index, distance in zip(indices, distances)]
+        return [self.elements[index] for index in indices]
+
+    def nearest_courts_batch(self, locations, k=1, court_types=None, max_distance=None, return_distance=False):
+        """Vectorised nearest_courts for many locations. Returns one list per location, in the same order"""
+        points = [_latitude_longitude(location) for location in locations]
+        points = [(None, None) if latitude is None or longitude is None else (latitude, longitude) for latitude, longitude in points]
+        if not points:
+            return []
+        latitudes = [float('nan') if point[0] is None else point[0] for point in points]
+        longitudes = [float('nan') if point[1] is None else point[1] for point in points]
+        indices, distances = get_court_location_index(self.elements).query_batch(latitudes, longitudes, k=k, departments=court_types, max_distance_km=max_distance)
+        results = list()
+        for row_indices, row_distances in zip(indices, distances):
+            # rows for points without coordinates come back as nan distances and must be dropped
+            row = [(self.elements[index], float(distance)) for index, distance in zip(row_indices, row_distances) if index >= 0 and distance == distance]
+            results.append(row if return_distance else [court for court, distance in row])
+        return results
+
     def load_courts(self, courts=['housing_courts','bmc','district_courts','superior_courts'], data_path='docassemble.MACourts:data/sources/'):
         """Load a set of courts into the MACourtList. Courts should be a list of names of JSON files in the data/sources directory.
         Will fall back on loading courts directly from MassGov if the cached file doesn't exist. Available courts: district_courts, housing_courts,bmc,superior_courts,land_court,juvenile_courts,probate_and_family_courts"""
@@ -357,87 +911,32 @@ class MACourtList(DAList):
 
         courts = get_courts_from_massgov_url(urls[filename])
 
-        # 'housing_courts','bmc','district_courts','superior_courts'
-        if court_name == 'housing_courts':
-            court_department = 'Housing Court'
-        elif court_name == 'bmc':
-            court_department = 'Boston Municipal Court'
-        elif court_name == 'district_courts':
-            court_department = 'District Court'
-        elif court_name == 'superior_courts':
-            court_department = 'Superior Court'
-        elif court_name == 'juvenile_courts':
-            court_department = 'Juvenile Court'
-        elif court_name in ['land_courts', 'land_court']:
-            court_department = 'Land Court'
-        elif court_name == 'probate_and_family_courts':
-            court_department = 'Probate and Family Court'
+        court_department = SOURCE_DEPARTMENTS[court_name]
 
         for item in courts:
             # translate the dictionary data into an MACourt
-            court = self.appendObject()
-            court.name = item['name']
-            court.department = court_department
-            court.division = parse_division_from_name(item['name'])
-            court.phone = item['phone']
-            court.fax = item['fax']
-            court.location.latitude = item['location']['latitude']
-            court.location.longitude = item['location']['longitude']
-            court.has_po_box = item.get('has_po_box')
-            court.description = item.get('description')
-
-            court.address.address = item['address']['address']
-            court.address.city = item['address']['city']
-            court.address.state = item['address']['state']
-            court.address.zip = item['address']['zip']
-            court.address.county = item['address']['county']
-            court.address.orig_address = item['address'].get('orig_address')
+            fill_court_from_record(self.appendObject(), item, court_department)
 
     def load_courts_from_file(self, court_name, data_path='docassemble.MACourts:data/sources/'):
         """Add the list of courts at the specified JSON file into the current list"""
 
         json_path = court_name
 
-        # 'housing_courts','bmc','district_courts','superior_courts'
-        if court_name == 'housing_courts':
-            court_department = 'Housing Court'
-        elif court_name == 'bmc':
-            court_department = 'Boston Municipal Court'
-        elif court_name == 'district_courts':
-            court_department = 'District Court'
-        elif court_name == 'superior_courts':
-            court_department = 'Superior Court'
-        elif court_name == 'juvenile_courts':
-            court_department = 'Juvenile Court'
-        elif court_name in ['land_courts', 'land_court']:
-            court_department = 'Land Court'
-        elif court_name == 'probate_and_family_courts':
-            court_department = 'Probate and Family Court'
-
-        path = path_and_mimetype(os.path.join(data_path,json_path+'.json'))[0]
-
-        with open(path) as courts_json:
-            courts = json.load(courts_json)
+        court_department = SOURCE_DEPARTMENTS[court_name]
+
+        if json_path in COURT_SOURCES:
+            courts = get_catalogue(data_path).court_records(json_path)
+            if courts is None:
+                raise IOError('No court file ' + json_path + '.json in ' + data_path)
+        else:
+            path = data_file_path(data_path, json_path+'.json')
+
+            with open(path) as courts_json:
+                courts = json.load(courts_json)
 
         for item in courts:
             # translate the dictionary data into an MACourtList
-            court = self.appendObject()
-            court.name = item['name']
-            court.department = court_department
-            court.division = parse_division_from_name(item['name'])
-            court.phone = item['phone']
-            court.fax = item['fax']
-            court.location.latitude = item['location']['latitude']
-            court.location.longitude = item['location']['longitude']
-            court.has_po_box = item.get('has_po_box')
-            court.description = item.get('description')
-
-            court.address.address = item['address']['address']
-            court.address.city = item['address']['city']
-            court.address.state = item['address']['state']
-            court.address.zip = item['address']['zip']
-            court.address.county = item['address']['county']
-            court.address.orig_address = item['address'].get('orig_address')
+            fill_court_from_record(self.appendObject(), item, court_department)
 
     def matching_juvenile_court(self, address):
         """Returns either single matching MACourt object or a set of MACourts"""
@@ -458,9 +957,10 @@ class MACourtList(DAList):
         if (not hasattr(address_to_compare, 'county')) or (address_to_compare.county.lower().strip() == ''):
             return ''
         # Special case for two areas of Boston -- concurrent with BMC jurisdiction. Need to match these first
-        if str(self.matching_bmc(address)) == "West Roxbury Division, Boston Municipal Court":
+        # Compare the division's name, so the answer doesn't depend on which courts are in the list
+        if self.matching_bmc_name(address) == "West Roxbury Division, Boston Municipal Court":
             return "West Roxbury Juvenile Court"
-        elif str(self.matching_bmc(address)) == "Dorchester Division, Boston Municipal Court":
+        elif self.matching_bmc_name(address) == "Dorchester Division, Boston Municipal Court":
             return "Dorchester Juvenile Court"
         elif address_to_compare.city.lower() in ["attleboro", "mansfield", "north attleboro", "norton"]:
 	        local_juvenile_court = "Attleboro Juvenile Court"
@@ -856,16 +1356,28 @@ class MACourtList(DAList):
         return local_housing_court
 
     def matching_bmc(self, address):
+        court_name = self.matching_bmc_name(address)
+        if court_name is None:
+            return None
+        return next ((court for court in self.elements if court.name.rstrip().lower() == court_name.lower()), None)
+
+    def matching_bmc_name(self, address):
+        """Returns the name of the Boston Municipal Court division serving the address's ward, or None without a ward"""
         try:
-            court_name = self.get_boston_ward_number(address)[1] + ' Division, Boston Municipal Court'
+            division = self.get_boston_ward_number(address)[1]
         except:
             return None
-        return next ((court for court in self.elements if court.name.rstrip().lower() == court_name.lower()), None)
+        # get_boston_ward_number returns ('', '') outside Boston
+        if not division:
+            return None
+        return division + ' Division, Boston Municipal Court'
 
     def load_boston_wards_from_file(self, json_path, data_path='docassemble.MACourts:data/sources/'):
-        """load geojson file for boston wards"""
-        path = path_and_mimetype(os.path.join(data_path,json_path+'.geojson'))[0]
-        wards = gpd.read_file(path)
+        """load geojson file for boston wards. The packaged wards are parsed once per process and shared, so treat them as read-only"""
+        wards = get_catalogue(data_path).geodata(json_path)
+        if wards is None:
+            path = data_file_path(data_path, json_path+'.geojson')
+            wards = gpd.read_file(path)
         
         return wards
 
@@ -889,7 +1401,23 @@ class MACourtList(DAList):
         Dependencies:
         1.Geopandas for loading the geojson file
         2.Shapely for constructing Point object
+
+        Results are kept in the shared routing cache, keyed by coordinates.
         """
+        location = getattr(address, 'location', None)
+        if getattr(getattr(address, 'norm', None), 'city', None) == 'Boston' and getattr(location, 'latitude', None) is not None and getattr(location, 'longitude', None) is not None:
+            cache = get_shared_routing_cache()
+            cache_key = '%.6f,%.6f' % (location.latitude, location.longitude)
+            cached = cache.get('ward', cache_key)
+            if cached is not None:
+                return tuple(cached)
+            result = self._find_boston_ward(address)
+            cache.set('ward', cache_key, list(result))
+            return result
+        return self._find_boston_ward(address)
+
+    def _find_boston_ward(self, address):
+        """Uncached ward lookup for get_boston_ward_number"""
         
         #load geojson Boston Ward map
         boston_wards = self.load_boston_wards_from_file(json_path = "boston_wards")
@@ -900,6 +1428,13 @@ class MACourtList(DAList):
 
         #if location is in Boston, lookup ward
         elif address.norm.city == 'Boston':
+            #answer from the precomputed grid if the point's cell is inside one ward
+            grid = get_ward_grid()
+            if grid is not None:
+                found = grid.lookup(address.location.latitude, address.location.longitude)
+                if found is not None:
+                    return found
+
             #assign point object
             p1 = Point(address.location.longitude, address.location.latitude)
 
@@ -928,6 +1463,66 @@ class MACourtList(DAList):
         else:
             return '',''
 
+def fill_court_from_record(court, item, court_department, division=None):
+    """Set the attributes of an MACourt from one court in the packaged JSON"""
+    court.name = item['name']
+    court.department = court_department
+    court.division = parse_division_from_name(item['name']) if division is None else division
+    court.phone = item['phone']
+    court.fax = item['fax']
+    court.location.latitude = item['location']['latitude']
+    court.location.longitude = item['location']['longitude']
+    court.has_po_box = item.get('has_po_box')
+    court.description = item.get('description')
+
+    court.address.address = item['address']['address']
+    court.address.city = item['address']['city']
+    court.address.state = item['address']['state']
+    court.address.zip = item['address']['zip']
+    court.address.county = item['address']['county']
+    court.address.orig_address = item['address'].get('orig_address')
+    return court
+
+class GroupedMatches(object):
+    """Result of MACourtList.matching_courts_grouped.
+    results is a list of (address, courts) pairs in input order, where courts is what matching_courts_single_address
+    returns for that address. courts is the union of every address's courts, without duplicates or Nones, in the order
+    they were first found. routed is the number of distinct places that were actually routed."""
+    def __init__(self, results, routed):
+        self.results = results
+        self.routed = routed
+        self.courts = list()
+        seen = set()
+        for address, found in results:
+            for court in _as_court_list(found):
+                if court is not None and id(court) not in seen:
+                    seen.add(id(court))
+                    self.courts.append(court)
+
+    def courts_for(self, address):
+        """Courts for one of the addresses that was routed (compared by identity)"""
+        for item, found in self.results:
+            if item is address:
+                return found
+        raise KeyError(address)
+
+    def by_address(self):
+        """List of (address, list of courts) pairs, one per input address"""
+        return [(address, _as_court_list(found)) for address, found in self.results]
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+def _as_court_list(found):
+    if found is None:
+        return []
+    if isinstance(found, (list, set, tuple)):
+        return list(found)
+    return [found]
+
 def parse_division_from_name(court_name):
     rules = {
         "District Court": r'(.*)( District Court)',
@@ -958,12 +1553,7 @@ class MAPlace(DAObject):
     def _map_info(self):
         if not hasattr(self,'description'):
             self.description = str(self)
-        the_info = self.description
-        the_info += "  [NEWLINE]  " + self.address.block()
-        result = {'latitude': self.location.latitude, 'longitude': self.location.longitude, 'info': the_info}
-        if hasattr(self, 'icon'):
-            result['icon'] = self.icon
-        return [result]
+        return cached_map_info(self, self.description)
 
 @prevent_dependency_satisfaction
 def combined_locations(locations):
@@ -975,18 +1565,57 @@ def combined_locations(locations):
     """
 
     places = list()
+    # Places by rounded position, the same test as match(), so grouping is one dictionary lookup per location
+    places_by_position = dict()
 
     for location in locations:
         if isinstance(location, DAObject):
-            if not has_match(places,location):
-                places.append(MAPlace(location=location.location, address=copy.deepcopy(location.address), description = str(location)))
-            else:
-                for place in places:
-                    if match(place,location):
-                        if hasattr(place, 'description') and str(location) not in place.description:
-                            place.description += "  [NEWLINE]  " + str(location)
+            position = _rounded_position(location)
+            place = places_by_position.get(position)
+            if place is None:
+                place = MAPlace(location=location.location, address=copy.deepcopy(location.address), description = str(location))
+                places_by_position[position] = place
+                places.append(place)
+            elif hasattr(place, 'description') and str(location) not in place.description:
+                place.description += "  [NEWLINE]  " + str(location)
     return places
 
+def _rounded_position(item):
+    return (round(item.location.latitude,3), round(item.location.longitude,3))
+
+_map_layers = BoundedCache(64)
+
+class CourtMapLayer(DAObject):
+    """Markers for every court of the given departments, combined by location, for map_of().
+    The markers are built once per catalogue version and shared, so drawing the statewide map costs a dictionary
+    lookup. Use all_courts_map_layer() to get one."""
+    def init(self, *pargs, **kwargs):
+        super(CourtMapLayer, self).init(*pargs, **kwargs)
+        if not hasattr(self, 'court_types'):
+            self.court_types = None
+        if not hasattr(self, 'data_path'):
+            self.data_path = 'docassemble.MACourts:data/sources/'
+
+    def markers(self):
+        court_types = tuple(self.court_types) if self.court_types else tuple(ALL_DEPARTMENTS)
+        key = (self.data_path, get_catalogue(self.data_path).version, court_types, get_language())
+        markers = _map_layers.get(key)
+        if markers is None:
+            courts = MACourtList('map_layer_courts')
+            courts.load_courts(courts=ALL_COURT_SOURCES, data_path=self.data_path)
+            courts = [court for court in courts.elements if court.department in court_types]
+            markers = tuple(marker for place in combined_locations(courts) for marker in place._map_info())
+            _map_layers.set(key, markers)
+        return markers
+
+    def _map_info(self):
+        # map_of() rewrites the info and icon of the markers it is given, so hand it copies
+        return [dict(marker) for marker in self.markers()]
+
+def all_courts_map_layer(court_types=None, data_path='docassemble.MACourts:data/sources/'):
+    """Return a CourtMapLayer of every court in Massachusetts, or of the given departments. E.g. map_of(all_courts_map_layer())"""
+    return CourtMapLayer(court_types=list(court_types) if court_types else None, data_path=data_path)
+
 def has_match(locations, other):
     for item in locations:
         if match(item,other):
@@ -995,7 +1624,7 @@ def has_match(locations, other):
 
 def match(item, other):
     if not item is None and not other is None:
-        return round(item.location.latitude,3) == round(other.location.latitude,3) and round(item.location.longitude,3) == round(other.location.longitude,3)
+        return _rounded_position(item) == _rounded_position(other)
 
 if __name__ == '__main__':
     import pprint
@@ -0,0 +1,557 @@
+"""Precomputed court routing tables.
+
+Court routing depends only on the municipality, the county and, inside Boston, the
+Boston Municipal Court division that the address's ward rolls up to. The build step
+evaluates every Massachusetts municipality and every Boston ward through the
+MACourtList routing methods and stores the answers in a compact matrix, so the runtime
+can route with one dictionary lookup instead of walking the if/elif chains.
+
+The build also produces a report of towns that appear in more than one branch of a
+routing chain (only the first branch can ever match) and of towns no court serves.
+
+A second table maps each Massachusetts zip code to the courts that may serve it, derived
+from the routing matrix and a zip -> town dataset, for forms that only collect a zip code.
+"""
+import ast, hashlib, io, json
+
+__all__ = ['DEPARTMENTS', 'MATRIX_VERSION', 'ZIP_TABLE_VERSION', 'RoutingMatrix', 'RoutingAddress', 'routing_key', 'load_municipalities', 'load_zip_towns', 'municipality_name', 'build_routing_matrix', 'find_branch_conflicts', 'routing_source_hash', 'ZipRoutingTable', 'build_zip_routing_table', 'normalize_zip']
+
+DEPARTMENTS = [
+    'Boston Municipal Court',
+    'District Court',
+    'Housing Court',
+    'Juvenile Court',
+    'Land Court',
+    'Probate and Family Court',
+    'Superior Court',
+]
+
+# MACourtList method returning the court(s), and the method returning the court name(s) where there is one
+ROUTING_METHODS = {
+    'Boston Municipal Court': ('matching_bmc', 'matching_bmc_name'),
+    'District Court': ('matching_district_court', 'matching_district_court_name'),
+    'Housing Court': ('matching_housing_court', 'matching_housing_court_name'),
+    'Juvenile Court': ('matching_juvenile_court', 'matching_juvenile_court_name'),
+    'Land Court': ('matching_land_court', None),
+    'Probate and Family Court': ('matching_probate_and_family_court', 'matching_probate_and_family_court_name'),
+    'Superior Court': ('matching_superior_court', 'matching_superior_court_name'),
+}
+
+# Version 2 stores what the *_name methods return, rather than the names of the courts they matched at build time
+MATRIX_VERSION = 2
+ZIP_TABLE_VERSION = 2
+
+# Methods whose source determines the routing answers
+ROUTING_SOURCE_METHODS = set([method for methods in ROUTING_METHODS.values() for method in methods if method] + ['get_boston_ward_number', '_find_boston_ward'])
+
+def routing_key(city, county, division=''):
+    """Key of one row of the routing matrix. division is the BMC division for Boston addresses, otherwise blank"""
+    return '|'.join([city.lower(), county.lower(), (division or '').lower()])
+
+# Spellings used by the Postal Service (and so by zip code datasets) for municipalities and Boston neighborhoods
+TOWN_ALIASES = {
+    'attleboro falls': 'north attleborough',
+    'boxboro': 'boxborough',
+    'foxboro': 'foxborough',
+    'manchester': 'manchester-by-the-sea',
+    'manchester by the sea': 'manchester-by-the-sea',
+    'marlboro': 'marlborough',
+    'middleboro': 'middleborough',
+    'mt washington': 'mount washington',
+    'mt. washington': 'mount washington',
+    'north attleboro': 'north attleborough',
+    'northboro': 'northborough',
+    'southboro': 'southborough',
+    'tyngsboro': 'tyngsborough',
+    'westboro': 'westborough',
+    'allston': 'boston',
+    'brighton': 'boston',
+    'charlestown': 'boston',
+    'dorchester': 'boston',
+    'dorchester center': 'boston',
+    'east boston': 'boston',
+    'hyde park': 'boston',
+    'jamaica plain': 'boston',
+    'mattapan': 'boston',
+    'mission hill': 'boston',
+    'readville': 'boston',
+    'roslindale': 'boston',
+    'roxbury': 'boston',
+    'roxbury crossing': 'boston',
+    'south boston': 'boston',
+    'west roxbury': 'boston',
+    # Villages with their own post office, under the municipality they are part of
+    'accord': 'hingham',
+    'arlington heights': 'arlington',
+    'ashley falls': 'sheffield',
+    'assonet': 'freetown',
+    'auburndale': 'newton',
+    'babson park': 'wellesley',
+    'baldwinville': 'templeton',
+    'bass river': 'yarmouth',
+    'bondsville': 'palmer',
+    'boston college': 'newton',
+    'bradford': 'haverhill',
+    'brant rock': 'marshfield',
+    'brookline village': 'brookline',
+    'bryantville': 'pembroke',
+    'buzzards bay': 'bourne',
+    'byfield': 'newbury',
+    'cataumet': 'bourne',
+    'centerville': 'barnstable',
+    'charlton city': 'charlton',
+    'charlton depot': 'charlton',
+    'chartley': 'norton',
+    'cherry valley': 'leicester',
+    'chestnut hill': 'newton',
+    'cotuit': 'barnstable',
+    'cummaquid': 'barnstable',
+    'cushman': 'amherst',
+    'cuttyhunk': 'gosnold',
+    'dennis port': 'dennis',
+    'dennisport': 'dennis',
+    'drury': 'florida',
+    'dudley hill': 'dudley',
+    'elmwood': 'east bridgewater',
+    'fayville': 'southborough',
+    'feeding hills': 'agawam',
+    'fiskdale': 'sturbridge',
+    'florence': 'northampton',
+    'forestdale': 'sandwich',
+    'gay head': 'aquinnah',
+    'gilbertville': 'hardwick',
+    'glendale': 'stockbridge',
+    'green harbor': 'marshfield',
+    'greenbush': 'scituate',
+    'grove hall': 'boston',
+    'harvard square': 'cambridge',
+    'harwich port': 'harwich',
+    'hatchville': 'falmouth',
+    'hathorne': 'danvers',
+    'haydenville': 'williamsburg',
+    'housatonic': 'great barrington',
+    'humarock': 'scituate',
+    'hyannis': 'barnstable',
+    'hyannis port': 'barnstable',
+    'hyannisport': 'barnstable',
+    'indian orchard': 'springfield',
+    'jefferson': 'holden',
+    'lake pleasant': 'montague',
+    'leeds': 'northampton',
+    'lenox dale': 'lenox',
+    'linwood': 'northbridge',
+    'manchaug': 'sutton',
+    'manomet': 'plymouth',
+    'marshfield hills': 'marshfield',
+    'marstons mills': 'barnstable',
+    'menemsha': 'chilmark',
+    'mill river': 'new marlborough',
+    'millers falls': 'montague',
+    'milton village': 'milton',
+    'minot': 'scituate',
+    'monponsett': 'halifax',
+    'monroe bridge': 'monroe',
+    'monument beach': 'bourne',
+    'mount hermon': 'gill',
+    'needham heights': 'needham',
+    'new marlboro': 'new marlborough',
+    'new town': 'newton',
+    'newton center': 'newton',
+    'newton centre': 'newton',
+    'newton highlands': 'newton',
+    'newton lower falls': 'newton',
+    'newton upper falls': 'newton',
+    'newtonville': 'newton',
+    'nonantum': 'newton',
+    'nonquitt': 'dartmouth',
+    'nutting lake': 'billerica',
+    'ocean bluff': 'marshfield',
+    'onset': 'wareham',
+    'osterville': 'barnstable',
+    'pinehurst': 'billerica',
+    'pocasset': 'bourne',
+    'prides crossing': 'beverly',
+    'raynham center': 'raynham',
+    'rochdale': 'leicester',
+    'sagamore': 'bourne',
+    'sagamore beach': 'bourne',
+    'salisbury beach': 'salisbury',
+    'shattuckville': 'colrain',
+    'shelburne falls': 'shelburne',
+    'sheldonville': 'wrentham',
+    'shirley center': 'shirley',
+    'siasconset': 'nantucket',
+    'silver beach': 'falmouth',
+    'simons rock': 'great barrington',
+    'southfield': 'new marlborough',
+    'squantum': 'quincy',
+    'still river': 'harvard',
+    'stonehill college': 'easton',
+    'teaticket': 'falmouth',
+    'thorndike': 'palmer',
+    'three rivers': 'palmer',
+    'tufts university': 'medford',
+    'turners falls': 'montague',
+    'uphams corner': 'boston',
+    'vineyard haven': 'tisbury',
+    'waban': 'newton',
+    'waquoit': 'falmouth',
+    'ward hill': 'haverhill',
+    'waverley': 'belmont',
+    'wellesley hills': 'wellesley',
+    'wendell depot': 'wendell',
+    'west chop': 'tisbury',
+    'westover afb': 'chicopee',
+    'westport point': 'westport',
+    'wheelwright': 'hardwick',
+    'white horse beach': 'plymouth',
+    'whitinsville': 'northbridge',
+    'wilkinsonville': 'sutton',
+    'willimansett': 'chicopee',
+    'winchendon springs': 'winchendon',
+    'winter hill': 'somerville',
+    'wollaston': 'quincy',
+    'woods hole': 'falmouth',
+    'woodville': 'hopkinton',
+    'woronoco': 'russell',
+    'yarmouth port': 'yarmouth',
+}
+
+# Postal abbreviations of words in place names
+POSTAL_WORDS = {'n': 'north', 's': 'south', 'e': 'east', 'w': 'west', 'ea': 'east', 'fls': 'falls', 'ctr': 'center', 'hvn': 'haven', 'mls': 'mills', 'bch': 'beach',
+                'hts': 'heights', 'hls': 'hills', 'vlg': 'village', 'pt': 'point', 'xing': 'crossing', 'spgs': 'springs', 'dpt': 'depot', 'clg': 'college',
+                'gt': 'great', 'hgts': 'heights', 'hlds': 'highlands', 'mt': 'mount', 'sq': 'square', 'univ': 'university'}
+DIRECTIONS = ('north ', 'south ', 'east ', 'west ')
+
+def municipality_name(town, counties):
+    """Lowercase municipality for a postal place name, or None. counties holds the lowercase municipalities.
+    Tries TOWN_ALIASES, then the name with postal abbreviations spelled out, then (for villages such as
+    North Grafton) the name without its leading direction"""
+    name = town.strip().lower()
+    name = TOWN_ALIASES.get(name, name)
+    if name in counties:
+        return name
+    name = ' '.join(POSTAL_WORDS.get(word, word) for word in name.split())
+    name = TOWN_ALIASES.get(name, name)
+    if name in counties:
+        return name
+    if name.startswith(DIRECTIONS):
+        name = name.split(' ', 1)[1]
+        name = TOWN_ALIASES.get(name, name)
+        if name in counties:
+            return name
+    return None
+
+def normalize_zip(zip_code):
+    """Return the five-digit form of a zip code given as a string (ZIP+4 allowed) or integer, or '' if it isn't one"""
+    if zip_code is None:
+        return ''
+    if isinstance(zip_code, int):
+        zip_code = str(zip_code).zfill(5)
+    zip_code = str(zip_code).strip().split('-')[0]
+    return zip_code if len(zip_code) == 5 and zip_code.isdigit() else ''
+
+def load_municipalities(path):
+    """Load the {county: [municipality, ...]} JSON file"""
+    with io.open(path, encoding='utf-8') as municipalities_json:
+        return json.load(municipalities_json)
+
+def load_zip_towns(path):
+    """Load the {zip code: [town, ...]} JSON file"""
+    with io.open(path, encoding='utf-8') as zip_towns_json:
+        return json.load(zip_towns_json)
+
+class _Location(object):
+    def __init__(self, latitude, longitude):
+        self.latitude = latitude
+        self.longitude = longitude
+
+class RoutingAddress(object):
+    """Minimal stand-in for a geolocated Address, carrying only what the routing methods read"""
+    def __init__(self, city, county, latitude=None, longitude=None):
+        self.city = city
+        self.county = county
+        self.norm = self
+        if latitude is not None and longitude is not None:
+            self.location = _Location(latitude, longitude)
+
+class RoutingMatrix(object):
+    """Read-only routing matrix, as written by build_routing_matrix"""
+    def __init__(self, data):
+        self.version = data.get('version')
+        self.source_hash = data.get('source_hash')
+        self.departments = data['departments']
+        self.courts = data['courts']
+        self.routes = data['routes']
+        self._department_index = {department: index for index, department in enumerate(self.departments)}
+
+    @classmethod
+    def load(cls, path):
+        with io.open(path, encoding='utf-8') as matrix_json:
+            return cls(json.load(matrix_json))
+
+    def __contains__(self, key):
+        return key in self.routes
+
+    def __len__(self):
+        return len(self.routes)
+
+    def court_names(self, key, department):
+        """Names of the courts serving a routing key in one department: a single name, a list
+        (several courts share the jurisdiction) or None. These are what the routing method's *_name
+        method returned, so they may name courts that aren't in a given court list; match them with
+        MACourtList.court_by_name. Raises KeyError for keys not in the matrix."""
+        cell = self.routes[key][self._department_index[department]]
+        if isinstance(cell, list):
+            return [None if item is None else self.courts[item] for item in cell]
+        return None if cell is None else self.courts[cell]
+
+def _court_names(result):
+    if result is None:
+        return None
+    if isinstance(result, (set, list, tuple)):
+        return sorted((None if court is None else court.name for court in result), key=lambda name: (name is None, name))
+    return result.name
+
+def _encode(cell, court_index):
+    if isinstance(cell, list):
+        return [None if name is None else court_index[name] for name in cell]
+    return None if cell is None else court_index[cell]
+
+def routing_source_hash(source_path, class_name='MACourtList'):
+    """Hash of the source of the routing methods. Stored in the matrix so that a matrix built
+    from an older version of the routing chains is never served.
+    Hashes the methods' source lines (with line endings and trailing spaces normalised) rather than
+    their syntax tree, whose dump differs between Python versions."""
+    with io.open(source_path, encoding='utf-8') as source_file:
+        source = source_file.read()
+    lines = source.splitlines()
+    digest = hashlib.sha1()
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.ClassDef) and node.name == class_name:
+            for function in node.body:
+                if isinstance(function, ast.FunctionDef) and function.name in ROUTING_SOURCE_METHODS:
+                    first = min([function.lineno] + [decorator.lineno for decorator in function.decorator_list])
+                    text = '\n'.join(line.rstrip() for line in lines[first - 1:function.end_lineno])
+                    digest.update(text.encode('utf-8') + b'\n')
+    return digest.hexdigest()
+
+def build_routing_matrix(court_list, municipalities, wards=None, conflicts=None, source_hash=None):
+    """Route every municipality, and every Boston ward, through court_list's routing methods.
+
+    court_list is an MACourtList with all court departments loaded. municipalities is a
+    {county: [municipality, ...]} dictionary. wards is the Boston wards GeoDataFrame; each ward is
+    routed from a point inside it. conflicts is the output of find_branch_conflicts, copied into the report.
+    source_hash is the routing_source_hash of the code being evaluated.
+    Each cell holds what the department's *_name method returns for the address. Land Court has no
+    name method; matching_land_court never finds a court, so its cells are always None.
+    Returns (matrix, report), both JSON-serializable."""
+    rows = dict()
+    sources = dict()
+    report = {
+        'unmatched': {department: [] for department in DEPARTMENTS},
+        'unresolved_names': {department: {} for department in DEPARTMENTS},
+        'boston_wards': [],
+        'boston_division_conflicts': [],
+        'branch_conflicts': conflicts or {},
+    }
+
+    def evaluate(address, label):
+        row = list()
+        for department in DEPARTMENTS:
+            method, name_method = ROUTING_METHODS[department]
+            cell = _court_names(getattr(court_list, method)(address))
+            # Store the names the routing chain asked for, not the courts they matched in court_list:
+            # routing matches them against the list it is given, like the chains do
+            names = getattr(court_list, name_method)(address) if name_method else None
+            row.append(names if name_method else cell)
+            # Only Boston is served by the Boston Municipal Court, so other towns aren't gaps
+            if department == 'Boston Municipal Court' and address.city != 'Boston':
+                continue
+            if not cell or cell == [None]:
+                report['unmatched'][department].append(label)
+            if name_method:
+                for name in (names if isinstance(names, list) else [names]):
+                    if name and not any(court.name.rstrip().lower() == name.lower() for court in court_list.elements):
+                        report['unresolved_names'][department].setdefault(name, []).append(label)
+        return row
+
+    for county in sorted(municipalities):
+        for town in municipalities[county]:
+            rows[routing_key(town, county)] = evaluate(RoutingAddress(town, county), town)
+            sources[routing_key(town, county)] = town
+
+    if wards is not None:
+        for index in range(len(wards)):
+            ward = wards.iloc[index]
+            point = ward.geometry.representative_point()
+            address = RoutingAddress('Boston', 'Suffolk County', point.y, point.x)
+            division = court_list.get_boston_ward_number(address)[1]
+            label = 'Boston ward %s (%s)' % (ward.Ward_Num, division)
+            key = routing_key('Boston', 'Suffolk County', division)
+            row = evaluate(address, label)
+            report['boston_wards'].append({'ward': ward.Ward_Num, 'division': division})
+            if key in rows and rows[key] != row:
+                report['boston_division_conflicts'].append({'key': key, 'first': sources[key], 'second': label})
+                continue
+            rows[key] = row
+            sources[key] = label
+
+    for department in DEPARTMENTS:
+        report['unmatched'][department] = sorted(set(report['unmatched'][department]))
+
+    names = set()
+    for row in rows.values():
+        for cell in row:
+            if isinstance(cell, list):
+                names.update(name for name in cell if name is not None)
+            elif cell is not None:
+                names.add(cell)
+    courts = sorted(names)
+    court_index = {name: index for index, name in enumerate(courts)}
+    matrix = {
+        'version': MATRIX_VERSION,
+        'source_hash': source_hash,
+        'departments': DEPARTMENTS,
+        'courts': courts,
+        'routes': {key: [_encode(cell, court_index) for cell in row] for key, row in sorted(rows.items())},
+    }
+    return matrix, report
+
+def _literal(node):
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        return ast.unparse(node) if hasattr(ast, 'unparse') else ast.dump(node)
+
+def _branch_result(branch):
+    for statement in branch.body:
+        if isinstance(statement, (ast.Assign, ast.Return)) and statement.value is not None:
+            return _literal(statement.value)
+    return None
+
+def find_branch_conflicts(source_path, class_name='MACourtList'):
+    """Find towns listed in more than one branch of the same `*_name` routing method.
+    Only the first branch that lists a town can ever match it, so later entries are dead code
+    or, worse, a jurisdiction that silently never gets routed to.
+    Returns {method name: {town: [result of each branch listing the town, in order]}}"""
+    with io.open(source_path, encoding='utf-8') as source_file:
+        tree = ast.parse(source_file.read())
+    conflicts = dict()
+    for node in tree.body:
+        if not (isinstance(node, ast.ClassDef) and node.name == class_name):
+            continue
+        for function in node.body:
+            if not (isinstance(function, ast.FunctionDef) and function.name.startswith('matching_') and function.name.endswith('_name')):
+                continue
+            towns = dict()
+            branches = [branch for branch in ast.walk(function) if isinstance(branch, ast.If)]
+            branches.sort(key=lambda branch: branch.lineno)
+            for branch in branches:
+                result = _branch_result(branch)
+                for compare in ast.walk(branch.test):
+                    if not isinstance(compare, ast.Compare) or not any(isinstance(op, ast.In) for op in compare.ops):
+                        continue
+                    if not any(isinstance(item, ast.Attribute) and item.attr == 'city' for item in ast.walk(compare.left)):
+                        continue
+                    for comparator in compare.comparators:
+                        if isinstance(comparator, ast.List):
+                            for element in comparator.elts:
+                                town = _literal(element)
+                                if result not in towns.setdefault(town, []):
+                                    towns[town].append(result)
+            function_conflicts = {town: results for town, results in sorted(towns.items()) if len(results) > 1}
+            if function_conflicts:
+                conflicts[function.name] = function_conflicts
+    return conflicts
+
+class ZipRoutingTable(object):
+    """Read-only zip code routing table, as written by build_zip_routing_table"""
+    def __init__(self, data):
+        self.version = data.get('version')
+        self.source_hash = data.get('source_hash')
+        self.departments = data['departments']
+        self.courts = data['courts']
+        self.zips = data['zips']
+        self.towns = data.get('towns', {})
+        self._department_index = {department: index for index, department in enumerate(self.departments)}
+
+    @classmethod
+    def load(cls, path):
+        with io.open(path, encoding='utf-8') as table_json:
+            return cls(json.load(table_json))
+
+    def __contains__(self, zip_code):
+        return normalize_zip(zip_code) in self.zips
+
+    def __len__(self):
+        return len(self.zips)
+
+    def court_names(self, zip_code, department):
+        """Names of every court in one department that may serve the zip code. Raises KeyError for unknown zip codes"""
+        return [self.courts[index] for index in self.zips[normalize_zip(zip_code)][self._department_index[department]]]
+
+def build_zip_routing_table(matrix, zip_towns, municipalities):
+    """Combine the routing matrix with a zip -> town dataset.
+
+    zip_towns is {zip code: [town, ...]}, listing every town the zip code covers; postal spellings, Boston neighborhoods
+    and villages are mapped to municipalities with municipality_name(). A zip code in Boston
+    gets the courts of every BMC division, since a zip code alone can't say which ward it is in.
+    Returns (table, report), both JSON-serializable."""
+    matrix = matrix if isinstance(matrix, RoutingMatrix) else RoutingMatrix(matrix)
+    counties = dict()
+    for county, towns in municipalities.items():
+        for town in towns:
+            counties[town.lower()] = county
+    boston_keys = sorted(key for key in matrix.routes if key.startswith('boston|suffolk county|'))
+    court_index = dict()
+    courts = list()
+    zips = dict()
+    zip_municipalities = dict()
+    report = {'unmatched_zips': {}, 'unmatched_towns': {}, 'multiple_towns': {}}
+    for zip_code in sorted(zip_towns):
+        normalized = normalize_zip(zip_code)
+        if not normalized:
+            continue
+        towns = list()
+        for town in zip_towns[zip_code]:
+            name = municipality_name(town, counties)
+            if name:
+                if name not in towns:
+                    towns.append(name)
+            else:
+                report['unmatched_towns'].setdefault(town, []).append(normalized)
+        if not towns:
+            report['unmatched_zips'][normalized] = list(zip_towns[zip_code])
+            continue
+        if len(towns) > 1:
+            report['multiple_towns'][normalized] = towns
+        keys = list()
+        for town in towns:
+            keys.extend(boston_keys if town == 'boston' else [routing_key(town, counties[town])])
+        row = list()
+        for department in matrix.departments:
+            names = set()
+            for key in keys:
+                if key not in matrix:
+                    continue
+                cell = matrix.court_names(key, department)
+                names.update(name for name in (cell if isinstance(cell, list) else [cell]) if name)
+            indices = list()
+            for name in sorted(names):
+                if name not in court_index:
+                    court_index[name] = len(courts)
+                    courts.append(name)
+                indices.append(court_index[name])
+            row.append(indices)
+        zips[normalized] = row
+        zip_municipalities[normalized] = towns
+    table = {
+        'version': ZIP_TABLE_VERSION,
+        'source_hash': matrix.source_hash,
+        'departments': matrix.departments,
+        'courts': courts,
+        'zips': zips,
+        'towns': zip_municipalities,
+    }
+    return table, report
@@ -0,0 +1,241 @@
+"""Standalone HTTP/JSON court routing service.
+
+Lets systems outside docassemble (case management, SMS intake) route addresses to courts
+without embedding an interview. The court catalogue, Boston ward index and routing tables
+are loaded once at startup and kept warm; when the catalogue is reloaded the service picks
+up the new courts on the next request.
+
+Run with:
+
+    python -m docassemble.MACourts.service --host 127.0.0.1 --port 8080
+
+or serve `docassemble.MACourts.service:application` from any WSGI server.
+
+Endpoints (all responses are JSON, and carry a Server-Timing header with the time spent routing):
+
+    GET  /health
+    POST /route         {"city": ..., "county": ..., "latitude": ..., "longitude": ..., "court_types": [...]}
+    POST /route/batch   {"addresses": [{...}, ...], "court_types": [...]}
+    GET  /zip/<zip>?court_types=Housing+Court
+    GET  /nearest?latitude=..&longitude=..&k=3&court_types=District+Court
+"""
+import argparse, json, math, sys, threading, time, traceback
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+from urllib.parse import parse_qs
+from .macourts import MACourtList, ALL_COURT_SOURCES, ALL_DEPARTMENTS, get_catalogue, warm_up
+from .routing_tables import RoutingAddress
+
+__all__ = ['application', 'RoutingService', 'serve']
+
+MAX_BATCH_SIZE = 1000
+MAX_BODY_BYTES = 4 * 1024 * 1024
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super(HTTPError, self).__init__(message)
+        self.status = status
+
+def court_to_dict(court):
+    """JSON-serializable summary of an MACourt"""
+    return {
+        'name': court.name,
+        'department': court.department,
+        'division': court.division,
+        'phone': court.phone,
+        'fax': court.fax,
+        'address': {
+            'address': court.address.address,
+            'city': court.address.city,
+            'state': court.address.state,
+            'zip': court.address.zip,
+            'county': court.address.county,
+            'orig_address': getattr(court.address, 'orig_address', None),
+        },
+        'latitude': court.location.latitude,
+        'longitude': court.location.longitude,
+    }
+
+def _courts_list(result):
+    if result is None:
+        return []
+    if isinstance(result, (list, set, tuple)):
+        return sorted((court for court in result if court is not None), key=lambda court: court.name)
+    return [result]
+
+def _court_types(value):
+    if value is None:
+        return ALL_DEPARTMENTS
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not value:
+        raise HTTPError('400 Bad Request', 'court_types must be a court department or a list of them')
+    for court_type in value:
+        if court_type not in ALL_DEPARTMENTS:
+            raise HTTPError('400 Bad Request', 'Unknown court type: ' + str(court_type))
+    return value
+
+def _coordinate(value, name, limit):
+    """A latitude (limit 90) or longitude (limit 180) as a finite float"""
+    try:
+        if isinstance(value, bool):
+            raise TypeError
+        value = float(value)
+    except (TypeError, ValueError):
+        raise HTTPError('400 Bad Request', name + ' must be a number')
+    if not math.isfinite(value) or abs(value) > limit:
+        raise HTTPError('400 Bad Request', '%s must be between -%d and %d' % (name, limit, limit))
+    return value
+
+def _routing_address(item):
+    if not isinstance(item, dict):
+        raise HTTPError('400 Bad Request', 'Each address must be a JSON object')
+    city = item.get('city')
+    county = item.get('county')
+    if not isinstance(city, str) or not isinstance(county, str):
+        raise HTTPError('400 Bad Request', 'Each address needs a city and a county')
+    latitude = item.get('latitude')
+    longitude = item.get('longitude')
+    latitude = None if latitude is None else _coordinate(latitude, 'latitude', 90)
+    longitude = None if longitude is None else _coordinate(longitude, 'longitude', 180)
+    neighborhood = item.get('neighborhood')
+    if neighborhood is not None and not isinstance(neighborhood, str):
+        raise HTTPError('400 Bad Request', 'neighborhood must be a string')
+    # Boston Municipal Court routing compares the normalized city name exactly
+    address = RoutingAddress(city.strip().title(), county.strip().title(), latitude, longitude)
+    if neighborhood:
+        address.neighborhood = neighborhood
+    return address
+
+class RoutingService(object):
+    """WSGI application wrapping MACourtList routing"""
+    def __init__(self, data_path='docassemble.MACourts:data/sources/'):
+        self.data_path = data_path
+        self._lock = threading.Lock()
+        self._version = None
+        self._courts = None
+
+    def courts(self):
+        """MACourtList with every court department, rebuilt when the catalogue is reloaded"""
+        version = get_catalogue(self.data_path).version
+        courts = self._courts
+        if courts is None or self._version != version:
+            with self._lock:
+                if self._courts is None or self._version != version:
+                    courts = MACourtList('service_courts')
+                    courts.load_courts(courts=ALL_COURT_SOURCES, data_path=self.data_path)
+                    self._courts, self._version = courts, version
+                courts = self._courts
+        return courts
+
+    def route(self, item, court_types):
+        courts = self.courts()
+        address = _routing_address(item)
+        return [court_to_dict(court) for court in _courts_list(courts.matching_courts_single_address(address, court_types))]
+
+    def handle(self, method, path, query, body):
+        if path == '/health':
+            catalogue = get_catalogue(self.data_path)
+            return {'status': 'ok', 'catalogue_version': catalogue.version, 'courts': len(self.courts().elements)}
+        if path == '/route':
+            if method != 'POST':
+                raise HTTPError('405 Method Not Allowed', 'Use POST')
+            data = body()
+            return {'courts': self.route(data, _court_types(data.get('court_types') if isinstance(data, dict) else None))}
+        if path == '/route/batch':
+            if method != 'POST':
+                raise HTTPError('405 Method Not Allowed', 'Use POST')
+            data = body()
+            addresses = data.get('addresses') if isinstance(data, dict) else None
+            if not isinstance(addresses, list):
+                raise HTTPError('400 Bad Request', 'addresses must be a list')
+            if len(addresses) > MAX_BATCH_SIZE:
+                raise HTTPError('413 Payload Too Large', 'At most %d addresses per batch' % MAX_BATCH_SIZE)
+            court_types = _court_types(data.get('court_types'))
+            return {'results': [{'courts': self.route(item, court_types)} for item in addresses]}
+        if path.startswith('/zip/'):
+            court_types = _court_types(query.get('court_types'))
+            try:
+                courts = self.courts().matching_courts_by_zip(path[len('/zip/'):], court_types=court_types)
+            except IOError as err:
+                raise HTTPError('503 Service Unavailable', str(err))
+            return {'courts': [court_to_dict(court) for court in courts]}
+        if path == '/nearest':
+            if 'latitude' not in query or 'longitude' not in query:
+                raise HTTPError('400 Bad Request', 'latitude and longitude are required')
+            latitude = _coordinate(query['latitude'][0], 'latitude', 90)
+            longitude = _coordinate(query['longitude'][0], 'longitude', 180)
+            courts = self.courts()
+            try:
+                k = int(query.get('k', ['1'])[0])
+            except ValueError:
+                k = 0
+            if not 1 <= k <= len(courts.elements):
+                raise HTTPError('400 Bad Request', 'k must be an integer from 1 to %d' % len(courts.elements))
+            court_types = _court_types(query.get('court_types'))
+            nearest = courts.nearest_courts((latitude, longitude), k=k, court_types=court_types, return_distance=True)
+            return {'courts': [dict(court_to_dict(court), distance_km=distance) for court, distance in nearest]}
+        raise HTTPError('404 Not Found', 'No such endpoint')
+
+    def __call__(self, environ, start_response):
+        started = time.time()
+        method = environ.get('REQUEST_METHOD', 'GET')
+        path = environ.get('PATH_INFO', '/')
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+
+        def body():
+            try:
+                length = int(environ.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                length = 0
+            if length > MAX_BODY_BYTES:
+                raise HTTPError('413 Payload Too Large', 'Request body is too large')
+            try:
+                return json.loads(environ['wsgi.input'].read(length).decode('utf-8') or 'null')
+            except ValueError:
+                raise HTTPError('400 Bad Request', 'Request body must be JSON')
+
+        try:
+            status, result = '200 OK', self.handle(method, path, query, body)
+        except HTTPError as err:
+            status, result = err.status, {'error': str(err)}
+        except Exception:
+            traceback.print_exc(file=environ.get('wsgi.errors', sys.stderr))
+            status, result = '500 Internal Server Error', {'error': 'Internal server error'}
+        output = json.dumps(result).encode('utf-8')
+        elapsed = 1000.0 * (time.time() - started)
+        start_response(status, [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(output))),
+            ('Server-Timing', 'route;dur=%.3f' % elapsed),
+        ])
+        return [output]
+
+application = RoutingService()
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+def serve(host='127.0.0.1', port=8080, app=None, quiet=False):
+    """Warm the caches and serve the routing service until interrupted"""
+    app = app or application
+    warm_up(data_path=app.data_path, freeze=False)
+    app.courts()
+    server = make_server(host, port, app, server_class=_ThreadingWSGIServer, handler_class=_QuietHandler if quiet else WSGIRequestHandler)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Massachusetts court routing service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--quiet', action='store_true', help="don't log each request")
+    args = parser.parse_args()
+    serve(args.host, args.port, quiet=args.quiet)
@@ -0,0 +1,118 @@
+"""Two-tier cache for routing results shared between docassemble workers.
+
+Lookups check an in-process LRU first, then Redis; values found in Redis are copied into
+the LRU. Keys carry a version string (the court catalogue version plus the hash of the
+routing methods), so when the courts or the routing code change, old entries are simply
+never read again and expire through their TTL.
+
+Redis is optional. Without a client, or while Redis is unreachable, the cache works as a
+plain in-process LRU: a failed Redis call is counted, Redis is skipped for
+`retry_interval` seconds, and then it is tried again. The client may be a redis.Redis or
+anything with the same get/set(ex=) methods, such as fakeredis.
+"""
+import json, threading, time
+from .bounded_cache import BoundedCache, reset_lock_after_fork
+
+__all__ = ['SharedRoutingCache', 'redis_client_from_url']
+
+def redis_client_from_url(url, timeout=0.1):
+    """redis.Redis for url with short timeouts, so an unreachable server can't stall an interview.
+    Returns None if the redis package isn't installed."""
+    try:
+        import redis
+    except ImportError:
+        return None
+    return redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+class SharedRoutingCache(object):
+    """Cache of JSON-serializable values, grouped by kind (e.g. 'ward', 'courts').
+
+    version is a string or a callable returning one; it is read on every lookup, so a
+    catalogue reload takes effect immediately. ttl is the Redis expiry in seconds."""
+    def __init__(self, client=None, version='', namespace='macourts', ttl=7*24*60*60, local_size=10000, retry_interval=30):
+        self.client = client
+        self.version = version
+        self.namespace = namespace
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self._local = BoundedCache(local_size)
+        # Guards the counters and the Redis retry time; the in-process tier has its own lock
+        self._lock = threading.Lock()
+        reset_lock_after_fork(self)
+        self._redis_down_until = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.local_hits = 0
+            self.redis_hits = 0
+            self.misses = 0
+            self.redis_errors = 0
+
+    def stats(self):
+        """Return hit counts per tier, Redis errors and whether Redis is currently in use"""
+        with self._lock:
+            lookups = self.local_hits + self.redis_hits + self.misses
+            stats = {
+                'local_hits': self.local_hits,
+                'redis_hits': self.redis_hits,
+                'misses': self.misses,
+                'lookups': lookups,
+                'hit_rate': float(self.local_hits + self.redis_hits) / lookups if lookups else 0.0,
+                'redis_errors': self.redis_errors,
+            }
+        stats['redis_available'] = self._redis_available()
+        stats['local_entries'] = len(self._local)
+        return stats
+
+    def _version(self):
+        return self.version() if callable(self.version) else self.version
+
+    def _key(self, kind, key):
+        return '%s:%s:%s:%s' % (self.namespace, self._version(), kind, key)
+
+    def _redis_available(self):
+        return self.client is not None and time.time() >= self._redis_down_until
+
+    def _redis_failed(self):
+        with self._lock:
+            self.redis_errors += 1
+            self._redis_down_until = time.time() + self.retry_interval
+
+    def get(self, kind, key, default=None):
+        """Return the cached value, or default if neither tier has it"""
+        full_key = self._key(kind, key)
+        value = self._local.get(full_key, _missing)
+        if value is not _missing:
+            with self._lock:
+                self.local_hits += 1
+            return value
+        if self._redis_available():
+            try:
+                data = self.client.get(full_key)
+            except Exception:
+                self._redis_failed()
+                data = None
+            if data is not None:
+                value = json.loads(data)
+                self._local.set(full_key, value)
+                with self._lock:
+                    self.redis_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def set(self, kind, key, value):
+        full_key = self._key(kind, key)
+        self._local.set(full_key, value)
+        if self._redis_available():
+            try:
+                self.client.set(full_key, json.dumps(value, separators=(',', ':')), ex=self.ttl)
+            except Exception:
+                self._redis_failed()
+
+    def clear_local(self):
+        self._local.clear()
+
+_missing = object()
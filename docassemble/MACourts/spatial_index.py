@@ -0,0 +1,87 @@
+"""Great-circle nearest-neighbour queries over court locations.
+
+Locations are stored as unit vectors on the sphere. The dot product of two unit vectors
+is monotonic in their great-circle distance, so a k-nearest query is a single matrix
+product followed by a partial sort. With the ~150 courthouses in Massachusetts this
+vectorised scan is faster than walking a BallTree or KD-tree, and it has no dependency
+beyond numpy.
+"""
+import numpy as np
+
+__all__ = ['CourtLocationIndex', 'haversine_km', 'EARTH_RADIUS_KM']
+
+EARTH_RADIUS_KM = 6371.0088
+
+def _unit_vectors(latitudes, longitudes):
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+def _dot_to_km(dots):
+    # chord length between unit vectors is sqrt(2 - 2*dot); arcsin form is stable for short distances
+    chord = np.sqrt(np.clip(2.0 - 2.0 * dots, 0.0, 4.0))
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2.0, 0.0, 1.0))
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometers. Accepts scalars or arrays"""
+    lat1, lon1, lat2, lon2 = [np.radians(np.asarray(value, dtype=float)) for value in (lat1, lon1, lat2, lon2)]
+    a = np.sin((lat2 - lat1) / 2.0)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0)**2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+class CourtLocationIndex(object):
+    """Index over a fixed set of court coordinates. Build once, then query many times.
+    departments is an optional parallel list used to restrict queries to some court types.
+    Courts without coordinates are kept in the index but never returned."""
+    def __init__(self, latitudes, longitudes, departments=None):
+        latitudes = np.asarray([np.nan if value is None else value for value in latitudes], dtype=float)
+        longitudes = np.asarray([np.nan if value is None else value for value in longitudes], dtype=float)
+        self.size = len(latitudes)
+        if departments is None:
+            departments = [''] * self.size
+        self.departments = np.asarray(departments, dtype=object)
+        self.valid = ~(np.isnan(latitudes) | np.isnan(longitudes))
+        self.vectors = _unit_vectors(np.where(self.valid, latitudes, 0.0), np.where(self.valid, longitudes, 0.0))
+
+    def _mask(self, departments):
+        if departments is None:
+            return self.valid
+        if isinstance(departments, str):
+            departments = [departments]
+        return self.valid & np.isin(self.departments, list(departments))
+
+    def query(self, latitude, longitude, k=1, departments=None, max_distance_km=None):
+        """Return (indices, distances_km) of the k closest courts to one point, nearest first.
+        A point without finite coordinates has no nearest courts"""
+        indices, distances = self.query_batch([latitude], [longitude], k=k, departments=departments, max_distance_km=max_distance_km)
+        keep = (indices[0] >= 0) & np.isfinite(distances[0])
+        return indices[0][keep], distances[0][keep]
+
+    def query_batch(self, latitudes, longitudes, k=1, departments=None, max_distance_km=None):
+        """Return (indices, distances_km) arrays of shape (len(latitudes), k) for many query points.
+        Slots with no eligible court (fewer than k matches, or beyond max_distance_km) have index -1 and distance inf."""
+        points = _unit_vectors(latitudes, longitudes).reshape(-1, 3)
+        mask = self._mask(departments)
+        candidates = np.flatnonzero(mask)
+        count = len(points)
+        indices = np.full((count, k), -1, dtype=int)
+        distances = np.full((count, k), np.inf)
+        if not len(candidates) or not count or k < 1:
+            return indices, distances
+        dots = points.dot(self.vectors[candidates].T)
+        take = min(k, len(candidates))
+        if take < len(candidates):
+            nearest = np.argpartition(-dots, take - 1, axis=1)[:, :take]
+        else:
+            nearest = np.tile(np.arange(len(candidates)), (count, 1))
+        nearest_dots = np.take_along_axis(dots, nearest, axis=1)
+        order = np.argsort(-nearest_dots, axis=1)
+        nearest = np.take_along_axis(nearest, order, axis=1)
+        nearest_km = _dot_to_km(np.take_along_axis(nearest_dots, order, axis=1))
+        indices[:, :take] = candidates[nearest]
+        distances[:, :take] = nearest_km
+        if max_distance_km is not None:
+            too_far = distances > max_distance_km
+            indices[too_far] = -1
+            distances[too_far] = np.inf
+        return indices, distances
@@ -0,0 +1,95 @@
+"""Boston ward and BMC courthouse for a whole column of points at once.
+
+assign_boston_wards() answers the same question as MACourtList.get_boston_ward_number, for
+a pandas or GeoPandas frame instead of one Address. The rules are the same:
+- A point inside a ward gets that ward. If it is inside more than one, it gets the first
+  in file order.
+- A point inside no ward gets the nearest ward, measured in degrees like the per-address
+  path.
+- Rows without coordinates, or whose city column isn't Boston, get empty strings.
+
+The point-in-polygon test is a single spatial join against the wards' spatial index. The
+points it leaves unmatched are looked up in an index of the ward boundaries' edges.
+"""
+import numpy as np
+import geopandas as gpd
+import shapely
+
+__all__ = ['assign_boston_wards']
+
+def _first_match(joined):
+    # Ties (a point on a shared border, or equally near two wards) go to the ward that comes first, as in get_boston_ward_number
+    joined = joined.dropna(subset=['index_right'])
+    joined = joined.sort_values('index_right', kind='stable')
+    return joined[~joined.index.duplicated(keep='first')]
+
+_segment_indexes = list()
+
+def _segment_index(geometries):
+    """STRtree over every edge of every ward's boundary, and the ward each edge belongs to.
+    Kept for the last few ward geometry arrays, such as the catalogue's"""
+    for cached_geometries, tree, segment_wards in _segment_indexes:
+        if cached_geometries is geometries:
+            return tree, segment_wards
+    lines, line_wards = shapely.get_parts(shapely.boundary(np.asarray(geometries, dtype=object)), return_index=True)
+    coordinates, coordinate_lines = shapely.get_coordinates(lines, return_index=True)
+    # an edge joins two consecutive vertices of the same ring
+    same_line = coordinate_lines[:-1] == coordinate_lines[1:]
+    segments = shapely.linestrings(np.stack([coordinates[:-1][same_line], coordinates[1:][same_line]], axis=1))
+    segment_wards = line_wards[coordinate_lines[:-1][same_line]]
+    tree = shapely.STRtree(segments)
+    del _segment_indexes[:-3]
+    _segment_indexes.append((geometries, tree, segment_wards))
+    return tree, segment_wards
+
+def _nearest_wards(points, geometries):
+    """Index of the nearest ward to each point outside every ward, first in file order on ties.
+    Outside a polygon, the distance to it is the distance to its nearest edge, so searching a tree of
+    short edges gives the same answer as comparing whole wards, much faster."""
+    tree, segment_wards = _segment_index(geometries)
+    point_indices, segment_indices = tree.query_nearest(points, all_matches=True)
+    nearest = np.full(len(points), np.iinfo(np.int64).max)
+    np.minimum.at(nearest, point_indices, segment_wards[segment_indices])
+    return nearest
+
+def assign_boston_wards(frame, wards, latitude='latitude', longitude='longitude', city=None, nearest=True,
+                        ward_column='ward_number', courthouse_column='bmc_courthouse'):
+    """Return a copy of frame with ward number and BMC courthouse columns added.
+
+    Points come from the frame's geometry if it is a GeoDataFrame with point geometry, reprojected
+    to the wards' CRS if the frame has another one (such as Massachusetts state plane), otherwise
+    from the latitude and longitude columns. Give city to only assign wards to rows whose city
+    column is 'Boston'. With nearest=False, points outside every ward get empty strings instead
+    of the nearest ward."""
+    result = frame.copy()
+    if isinstance(frame, gpd.GeoDataFrame) and latitude not in frame.columns:
+        points = gpd.GeoSeries(frame.geometry.values, index=frame.index, crs=frame.crs or wards.crs)
+        if points.crs != wards.crs:
+            points = points.to_crs(wards.crs)
+    else:
+        points = gpd.GeoSeries(gpd.points_from_xy(frame[longitude], frame[latitude]), index=frame.index, crs=wards.crs)
+    eligible = ~(points.is_empty | points.isna() | np.isnan(points.x) | np.isnan(points.y))
+    if city is not None:
+        eligible &= (frame[city] == 'Boston').values
+    points = gpd.GeoDataFrame(geometry=points[eligible])
+    # Join on row position, so frames with a duplicated index work too
+    positions = np.flatnonzero(eligible.values)
+    points.index = positions
+    ward_data = wards[['Ward_Num', 'courthouse', 'geometry']].reset_index(drop=True)
+
+    found = _first_match(gpd.sjoin(points, ward_data, how='left', predicate='within'))
+    rows = found.index.values
+    ward_indices = found['index_right'].values.astype(int)
+    if nearest:
+        missing = points.index.difference(found.index)
+        if len(missing):
+            rows = np.concatenate([rows, missing.values])
+            ward_indices = np.concatenate([ward_indices, _nearest_wards(points.geometry.loc[missing].values, wards.geometry.values)])
+
+    wards_by_row = np.full(len(frame), '', dtype=object)
+    courthouses_by_row = np.full(len(frame), '', dtype=object)
+    wards_by_row[rows] = ward_data['Ward_Num'].values[ward_indices]
+    courthouses_by_row[rows] = ward_data['courthouse'].values[ward_indices]
+    result[ward_column] = wards_by_row
+    result[courthouse_column] = courthouses_by_row
+    return result
@@ -0,0 +1,104 @@
+"""Reduced-detail Boston ward and BMC division outlines for maps.
+
+boston_wards.geojson keeps every surveyed vertex at full double precision, which routing
+needs but a map overlay doesn't. build_ward_detail_layers() produces, for each detail level,
+the wards and the wards dissolved into Boston Municipal Court divisions, simplified at the
+level's tolerance and with coordinates rounded to the level's number of decimal places.
+
+The wards are treated as a coverage: shapely's coverage_simplify (GEOS 3.12+) simplifies
+each shared border once, so neighbouring wards still meet without gaps or overlaps. On
+older GEOS it falls back to simplifying each polygon separately with preserve_topology,
+which keeps every polygon valid but can leave slivers along shared borders.
+
+Routing never uses these layers; get_boston_ward_number always reads the full-precision
+file.
+"""
+import json
+import numpy as np
+import shapely
+from shapely.geometry import mapping
+
+__all__ = ['DETAIL_LEVELS', 'ZOOM_LEVELS', 'build_ward_detail_layers', 'detail_level_for_zoom', 'ward_layer_filename']
+
+# name: (simplification tolerance in degrees, decimal places kept). 0.00001 degrees is about 1 m in Boston
+DETAIL_LEVELS = {
+    'high': (0.00002, 6),
+    'medium': (0.0001, 5),
+    'low': (0.0005, 4),
+}
+
+# (minimum web map zoom level, detail level), most detailed first
+ZOOM_LEVELS = [(15, 'high'), (13, 'medium'), (0, 'low')]
+
+LAYERS = ['boston_wards', 'bmc_divisions']
+
+def detail_level_for_zoom(zoom):
+    """Name of the detail level to draw at a web map zoom level (0 = whole world, 18 = street)"""
+    for minimum, level in ZOOM_LEVELS:
+        if zoom >= minimum:
+            return level
+    return ZOOM_LEVELS[-1][1]
+
+def ward_layer_filename(layer, level):
+    """Data source file name of one layer at one detail level, e.g. bmc_divisions_low.geojson"""
+    return '%s_%s.geojson' % (layer, level)
+
+def _clean(geometries):
+    # Snap the borders that almost, but not exactly, coincide so they are simplified (and merged) as one
+    if hasattr(shapely, 'coverage_clean'):
+        return shapely.coverage_clean(geometries)
+    return geometries
+
+def _simplify(geometries, tolerance):
+    if hasattr(shapely, 'coverage_simplify'):
+        return shapely.coverage_simplify(geometries, tolerance)
+    return shapely.simplify(geometries, tolerance, preserve_topology=True)
+
+def _union(geometries):
+    if hasattr(shapely, 'coverage_union_all') and hasattr(shapely, 'coverage_clean'):
+        return shapely.coverage_union_all(geometries)
+    return shapely.union_all(geometries)
+
+def _round_coordinates(value, decimals):
+    if isinstance(value, (list, tuple)):
+        if value and isinstance(value[0], float):
+            return [round(coordinate, decimals) for coordinate in value]
+        return [_round_coordinates(item, decimals) for item in value]
+    return value
+
+def _feature_collection(geometries, properties, decimals):
+    features = list()
+    for geometry, feature_properties in zip(geometries, properties):
+        geojson = mapping(geometry)
+        features.append({
+            'type': 'Feature',
+            'properties': feature_properties,
+            'geometry': {'type': geojson['type'], 'coordinates': _round_coordinates(geojson['coordinates'], decimals)},
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+def build_ward_detail_layers(wards):
+    """Build every layer at every detail level from the full-precision ward GeoDataFrame.
+    Returns {filename: GeoJSON dict} and a report of vertex counts per file."""
+    geometries = _clean(np.asarray(wards.geometry.values, dtype=object))
+    courthouses = list(wards['courthouse'])
+    divisions = sorted(set(courthouses))
+    division_geometries = np.array([_union([geometry for geometry, courthouse in zip(geometries, courthouses) if courthouse == division])
+                                    for division in divisions], dtype=object)
+    sources = {
+        'boston_wards': (geometries, [{'Ward_Num': ward, 'courthouse': courthouse} for ward, courthouse in zip(wards['Ward_Num'], courthouses)]),
+        'bmc_divisions': (division_geometries, [{'courthouse': division, 'court': division + ' Division, Boston Municipal Court'} for division in divisions]),
+    }
+    layers = dict()
+    report = {'full_precision_vertices': int(shapely.get_num_coordinates(np.asarray(wards.geometry.values, dtype=object)).sum())}
+    for layer in LAYERS:
+        layer_geometries, properties = sources[layer]
+        for level, (tolerance, decimals) in DETAIL_LEVELS.items():
+            # Snap to the grid before simplifying: simplification only drops vertices, so the result stays on the
+            # grid and the coverage stays free of the overlaps that snapping after simplifying can create
+            simplified = _simplify(_clean(shapely.set_precision(layer_geometries, 10 ** -decimals)), tolerance)
+            filename = ward_layer_filename(layer, level)
+            layers[filename] = _feature_collection(simplified, properties, decimals)
+            report[filename] = {'vertices': int(shapely.get_num_coordinates(simplified).sum()),
+                                'bytes': len(json.dumps(layers[filename], separators=(',', ':')))}
+    return layers, report
@@ -0,0 +1,202 @@
+"""Precomputed geohash grid for finding a point's Boston ward without any geometry.
+
+build_ward_grid() covers the wards' bounding box with geohash cells and subdivides every
+cell that straddles a ward boundary, down to a maximum precision. A cell that lies wholly
+in the interior of one ward, and touches no other ward, is stored with that ward. Cells that
+still straddle a boundary at the maximum precision, and cells outside every ward, are left
+out: points in them need the exact test (or the nearest-ward rule) in
+MACourtList.get_boston_ward_number.
+
+WardGrid.lookup() finds the point's cell at each stored precision with integer arithmetic
+and a dictionary lookup, so it costs the same wherever the point is. A stored answer is
+always the one the exact test gives: the cell, widened by a small margin against rounding,
+is inside the ward's interior, so the point is within that ward and within no other.
+
+The grid is only valid for the ward file it was built from, so it records that file's hash.
+"""
+import numpy as np
+import shapely
+
+__all__ = ['WardGrid', 'build_ward_grid', 'geohash_cell', 'GRID_VERSION']
+
+GRID_VERSION = 1
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_BASE32_VALUES = {character: value for value, character in enumerate(BASE32)}
+
+# Degrees by which a cell is widened before testing it, so that a point put in a neighbouring
+# cell by floating point rounding is still covered. About 0.1 mm.
+MARGIN = 1e-9
+
+def _bits(precision):
+    """Longitude and latitude bits of a geohash with this many characters"""
+    return (5 * precision + 1) // 2, 5 * precision // 2
+
+def _cell_xy(latitude, longitude, precision):
+    longitude_bits, latitude_bits = _bits(precision)
+    return int((longitude + 180.0) / 360.0 * (1 << longitude_bits)), int((latitude + 90.0) / 180.0 * (1 << latitude_bits))
+
+def _cell_bounds(x, y, precision):
+    """(min longitude, min latitude, max longitude, max latitude) of cells; x and y may be arrays"""
+    longitude_bits, latitude_bits = _bits(precision)
+    width = 360.0 / (1 << longitude_bits)
+    height = 180.0 / (1 << latitude_bits)
+    return x * width - 180.0, y * height - 90.0, (x + 1) * width - 180.0, (y + 1) * height - 90.0
+
+def _encode(x, y, precision):
+    longitude_bits, latitude_bits = _bits(precision)
+    value = 0
+    for bit in range(5 * precision):
+        # geohash bits alternate, starting with longitude
+        if bit % 2 == 0:
+            longitude_bits -= 1
+            value = (value << 1) | ((x >> longitude_bits) & 1)
+        else:
+            latitude_bits -= 1
+            value = (value << 1) | ((y >> latitude_bits) & 1)
+    return ''.join(BASE32[(value >> (5 * (precision - 1 - index))) & 31] for index in range(precision))
+
+def _split_character(value, longitude_first):
+    """Longitude and latitude bits of one base32 character"""
+    x = y = 0
+    for bit in range(5):
+        if (bit % 2 == 0) == longitude_first:
+            x = (x << 1) | ((value >> (4 - bit)) & 1)
+        else:
+            y = (y << 1) | ((value >> (4 - bit)) & 1)
+    return x, y
+
+# Characters at even positions hold 3 longitude and 2 latitude bits, those at odd positions 2 and 3
+_CHARACTER_BITS = [
+    {character: _split_character(value, True) + (3, 2) for character, value in _BASE32_VALUES.items()},
+    {character: _split_character(value, False) + (2, 3) for character, value in _BASE32_VALUES.items()},
+]
+
+def _decode(geohash):
+    x = y = 0
+    for index, character in enumerate(geohash):
+        character_x, character_y, longitude_bits, latitude_bits = _CHARACTER_BITS[index % 2][character]
+        x = (x << longitude_bits) | character_x
+        y = (y << latitude_bits) | character_y
+    return x, y, len(geohash)
+
+def geohash_cell(latitude, longitude, precision):
+    """Geohash of the cell containing a point"""
+    x, y = _cell_xy(latitude, longitude, precision)
+    return _encode(x, y, precision)
+
+def _children(x, y, precision):
+    """Cell coordinates of the 32 cells one character more precise, for arrays of cells"""
+    longitude_bits, latitude_bits = _bits(precision)
+    more_longitude, more_latitude = [after - before for after, before in zip(_bits(precision + 1), (longitude_bits, latitude_bits))]
+    dx, dy = [offsets.ravel() for offsets in np.meshgrid(np.arange(1 << more_longitude), np.arange(1 << more_latitude))]
+    return ((x[:, None] << more_longitude) + dx).ravel(), ((y[:, None] << more_latitude) + dy).ravel()
+
+def _value(value):
+    return None if value is None else str(value)
+
+def build_ward_grid(wards, wards_hash=None, min_precision=5, max_precision=8):
+    """Build the grid for a GeoDataFrame of wards (with Ward_Num and courthouse columns).
+    wards_hash identifies the ward file, for WardGrid.wards_hash. Returns (grid, report): grid is a
+    JSON-serialisable dictionary for WardGrid, and report counts the stored and unresolved cells.
+    Precision 8 cells are about 38 m by 19 m in Boston."""
+    geometries = np.asarray(wards.geometry.values, dtype=object)
+    shapely.prepare(geometries)
+    tree = shapely.STRtree(geometries)
+    minx, miny, maxx, maxy = shapely.total_bounds(geometries)
+    x0, y0 = _cell_xy(miny, minx, min_precision)
+    x1, y1 = _cell_xy(maxy, maxx, min_precision)
+    x, y = [coordinates.ravel().astype(np.int64) for coordinates in np.meshgrid(np.arange(x0, x1 + 1), np.arange(y0, y1 + 1))]
+    cells = dict()
+    report = {'cells_by_precision': {}, 'unresolved_cells': 0, 'min_precision': min_precision, 'max_precision': max_precision}
+    precision = min_precision
+    while len(x):
+        left, bottom, right, top = _cell_bounds(x, y, precision)
+        boxes = shapely.box(left - MARGIN, bottom - MARGIN, right + MARGIN, top + MARGIN)
+        box_indices, ward_indices = tree.query(boxes, predicate='intersects')
+        touching = np.bincount(box_indices, minlength=len(boxes))
+        # a cell touching exactly one ward is stored if it is inside that ward's interior
+        single = np.flatnonzero(touching == 1)
+        single_wards = np.zeros(len(boxes), dtype=np.int64)
+        single_wards[box_indices] = ward_indices
+        inside = np.zeros(len(boxes), dtype=bool)
+        inside[single] = shapely.contains_properly(geometries[single_wards[single]], boxes[single])
+        for index in np.flatnonzero(inside):
+            cells[_encode(int(x[index]), int(y[index]), precision)] = int(single_wards[index])
+        report['cells_by_precision'][precision] = int(inside.sum())
+        split = (touching > 0) & ~inside
+        if precision == max_precision:
+            report['unresolved_cells'] = int(split.sum())
+            break
+        x, y = _children(x[split], y[split], precision)
+        precision += 1
+    report['stored_cells'] = len(cells)
+    grid = {
+        'version': GRID_VERSION,
+        'wards_hash': wards_hash,
+        'min_precision': min_precision,
+        'max_precision': max_precision,
+        # Some wards have no number; lookups return None for them, as the exact test does
+        'wards': [[_value(ward_number), _value(courthouse)] for ward_number, courthouse in zip(wards['Ward_Num'], wards['courthouse'])],
+        'cells': dict(sorted(cells.items())),
+    }
+    return grid, report
+
+class WardGrid(object):
+    """Read-only ward grid, as written by build_ward_grid. Counts how many lookups it answered"""
+    def __init__(self, data):
+        self.version = data.get('version')
+        self.wards_hash = data.get('wards_hash')
+        self.min_precision = data['min_precision']
+        self.max_precision = data['max_precision']
+        self.wards = [tuple(ward) for ward in data['wards']]
+        # {precision: {(x, y): ward index}}
+        self._cells = {precision: dict() for precision in range(self.min_precision, self.max_precision + 1)}
+        for geohash, ward in data['cells'].items():
+            x, y, precision = _decode(geohash)
+            self._cells[precision][(x, y)] = ward
+        longitude_bits, latitude_bits = _bits(self.max_precision)
+        self._shifts = [(precision, self._cells[precision], longitude_bits - _bits(precision)[0], latitude_bits - _bits(precision)[1])
+                        for precision in sorted(self._cells) if self._cells[precision]]
+        self.reset_stats()
+
+    def __len__(self):
+        return sum(len(cells) for cells in self._cells.values())
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """Return how many lookups were answered from the grid, and how many needed the geometry"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'lookups': lookups,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+            'cells': len(self),
+        }
+
+    def ward_index(self, latitude, longitude):
+        """Row of the wards frame whose ward contains the point, or None if the point's cell straddles a
+        boundary or lies outside every ward"""
+        try:
+            x, y = _cell_xy(latitude, longitude, self.max_precision)
+        except (TypeError, ValueError, OverflowError):
+            return None
+        # the cell at a lower precision is the same integer with the extra bits dropped
+        for precision, cells, longitude_shift, latitude_shift in self._shifts:
+            ward = cells.get((x >> longitude_shift, y >> latitude_shift))
+            if ward is not None:
+                return ward
+        return None
+
+    def lookup(self, latitude, longitude):
+        """(ward number, courthouse) of the ward containing the point, or None if the exact test is needed"""
+        ward = self.ward_index(latitude, longitude)
+        if ward is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.wards[ward]
@@ -53,7 +53,7 @@ setup(name='docassemble.MACourts',
       url='https://docassemble.org',
       packages=find_packages(),
       namespace_packages=['docassemble'],
-      install_requires=['Shapely', 'geopandas', 'usaddress', 'uszipcode'],
+      install_requires=['Shapely', 'geopandas', 'numpy', 'usaddress', 'uszipcode'],
       zip_safe=False,
       package_data=find_package_data(where='docassemble/MACourts/', package='docassemble.MACourts'),
      )
@@ -0,0 +1,91 @@
+"""match_addresses with a stub geocoder that takes a set time to answer each address"""
+import asyncio, time
+import pytest
+
+from docassemble.MACourts.async_matching import match_addresses, match_addresses_all, match_addresses_sync
+
+class StubCourts(object):
+    """Routes every geolocated address to a 'court' named after it"""
+    def matching_courts_single_address(self, address, court_types):
+        return [address.address]
+
+class StubGeocoder(object):
+    """geocode() is a coroutine geocoder with injected latency. Records when each request started and the most requests in progress at once"""
+    def __init__(self, latency=0.02, failing=()):
+        self.latency = latency
+        self.failing = failing
+        self.calls = list()
+        self.starts = list()
+        self.in_progress = 0
+        self.most_in_progress = 0
+
+    async def geocode(self, address):
+        self.calls.append(address.address)
+        self.starts.append(time.monotonic())
+        self.in_progress += 1
+        self.most_in_progress = max(self.most_in_progress, self.in_progress)
+        try:
+            latency = self.latency(address) if callable(self.latency) else self.latency
+            await asyncio.sleep(latency)
+            if address.address in self.failing:
+                raise RuntimeError('geocoder failed for ' + address.address)
+            return {'success': True, 'latitude': 42.35, 'longitude': -71.06, 'norm': {}, 'norm_long': {}}
+        finally:
+            self.in_progress -= 1
+
+def addresses(make_address, count):
+    return [make_address('%d Main Street' % number) for number in range(count)]
+
+def test_concurrency_bound(make_address):
+    geocoder = StubGeocoder()
+    results = match_addresses_sync(StubCourts(), addresses(make_address, 20), geocoder=geocoder.geocode, concurrency=3, cache=False)
+    assert geocoder.most_in_progress == 3
+    assert all(result.geolocated and result.error is None for result in results)
+
+def test_rate_limit_spaces_out_starts(make_address):
+    geocoder = StubGeocoder(latency=0)
+    match_addresses_sync(StubCourts(), addresses(make_address, 6), geocoder=geocoder.geocode, concurrency=6, rate=20, cache=False)
+    gaps = [later - earlier for earlier, later in zip(geocoder.starts, geocoder.starts[1:])]
+    assert len(gaps) == 5
+    # 20 per second is one start every 50 ms; allow for timer granularity
+    assert min(gaps) >= 0.045
+
+def test_duplicate_addresses_share_one_request(make_address):
+    geocoder = StubGeocoder()
+    duplicates = [make_address('1 Main Street') for i in range(5)] + [make_address('1 MAIN ST')]
+    results = match_addresses_sync(StubCourts(), duplicates, geocoder=geocoder.geocode, cache=False)
+    assert geocoder.calls == ['1 Main Street']
+    assert all(result.geolocated for result in results)
+    assert all(address.location.latitude == 42.35 for address in duplicates)
+
+def test_results_stream_in_completion_order(make_address):
+    items = addresses(make_address, 5)
+    # the last address answers first
+    geocoder = StubGeocoder(latency=lambda address: 0.01 * (5 - int(address.address.split()[0])))
+
+    async def collect():
+        return [result.index async for result in match_addresses(StubCourts(), items, geocoder=geocoder.geocode, cache=False)]
+
+    assert asyncio.run(collect()) == [4, 3, 2, 1, 0]
+    for address in items:
+        address.geolocated = False
+    results = asyncio.run(match_addresses_all(StubCourts(), items, geocoder=geocoder.geocode, cache=False))
+    assert [result.index for result in results] == [0, 1, 2, 3, 4]
+    assert [result.courts for result in results] == [[address.address] for address in items]
+
+def test_geocoder_error_is_reported(make_address):
+    items = addresses(make_address, 3)
+    results = match_addresses_sync(StubCourts(), items, geocoder=StubGeocoder(failing=('1 Main Street',)).geocode, cache=False)
+    assert isinstance(results[1].error, RuntimeError)
+    assert (results[1].courts, results[1].geolocated) == (None, False)
+    assert [result.error for result in (results[0], results[2])] == [None, None]
+
+def test_plain_function_geocoder_runs_in_threads(make_address):
+    calls = list()
+    def geocoder(address):
+        calls.append(address.address)
+        time.sleep(0.01)
+        return {'success': False}
+    results = match_addresses_sync(StubCourts(), addresses(make_address, 4), geocoder=geocoder, cache=False)
+    assert sorted(calls) == sorted(result.address.address for result in results)
+    assert [result.geolocated for result in results] == [False] * 4
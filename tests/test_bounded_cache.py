@@ -0,0 +1,43 @@
+"""BoundedCache eviction, and process-wide caches that must not hand out shared mutable values"""
+import pytest
+
+from docassemble.MACourts.bounded_cache import BoundedCache
+
+def test_least_recently_used_entry_is_dropped():
+    cache = BoundedCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert len(cache) == 2
+    assert 'b' not in cache
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+
+def test_get_or_build_builds_once():
+    cache = BoundedCache(4)
+    built = list()
+    for i in range(3):
+        assert cache.get_or_build('key', lambda: built.append(1) or None) is None
+    assert built == [1]
+
+def test_ward_layer_is_a_copy():
+    pytest.importorskip('docassemble.base.util')
+    from docassemble.MACourts import macourts
+    layer = macourts.get_ward_layer(12)
+    layer['features'][0]['properties']['changed'] = True
+    del layer['features'][1:]
+    fresh = macourts.get_ward_layer(12)
+    assert len(fresh['features']) > 1
+    assert 'changed' not in fresh['features'][0]['properties']
+
+def test_unbounded_cache_is_trimmed_by_evict():
+    cache = BoundedCache(None)
+    for i in range(10):
+        cache.set(i, i)
+    cache.get(0)
+    cache.delete(5)
+    cache.delete('missing')
+    assert len(cache) == 9
+    assert cache.evict(3) == 6
+    assert [key for key in range(10) if key in cache] == [0, 8, 9]
+    assert cache.evict(3) == 0
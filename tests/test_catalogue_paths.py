@@ -0,0 +1,30 @@
+"""A catalogue for a directory on disk, such as the Playground's sources, sees files written there"""
+import json, os, shutil
+import pytest
+
+pytest.importorskip('docassemble.base.util')
+
+from docassemble.MACourts import macourts
+
+def court_names(data_path):
+    courts = macourts.MACourtList('courts')
+    courts.load_courts(courts=['housing_courts'], data_path=data_path)
+    return [court.name for court in courts]
+
+def test_directory_catalogue_reloads(tmp_path):
+    data_path = str(tmp_path)
+    package_file = macourts.data_file_path('docassemble.MACourts:data/sources/', 'housing_courts.json')
+    shutil.copy(package_file, os.path.join(data_path, 'housing_courts.json'))
+    names = court_names(data_path)
+    assert names == court_names('docassemble.MACourts:data/sources/')
+    # files missing from the directory come from the package
+    assert macourts.get_catalogue(data_path).geodata('boston_wards') is not None
+
+    with open(package_file) as courts_file:
+        records = json.load(courts_file)
+    records[0]['name'] = 'Renamed Housing Court'
+    with open(os.path.join(data_path, 'housing_courts.json'), 'w') as courts_file:
+        json.dump(records, courts_file)
+    macourts.reload_catalogues()
+    assert 'Renamed Housing Court' in court_names(data_path)
+    assert 'Renamed Housing Court' not in court_names('docassemble.MACourts:data/sources/')
@@ -0,0 +1,82 @@
+"""CourtTable queries must find the same courts, in the same order, as plain loops over MACourt objects"""
+import math, random
+import pytest
+
+pytest.importorskip('docassemble.base.util')
+
+from docassemble.MACourts import macourts
+from docassemble.MACourts.spatial_index import haversine_km
+
+FIELDS = ['name', 'department', 'division', 'phone', 'fax', 'has_po_box', 'description']
+ADDRESS_FIELDS = ['address', 'city', 'state', 'zip', 'county', 'orig_address']
+
+def points(count=25, seed=0):
+    rng = random.Random(seed)
+    return [(rng.uniform(41.5, 42.8), rng.uniform(-73.3, -70.0)) for i in range(count)]
+
+def distance(court, latitude, longitude):
+    court_latitude, court_longitude = getattr(court.location, 'latitude', None), getattr(court.location, 'longitude', None)
+    if court_latitude is None or court_longitude is None:
+        return math.nan
+    return float(haversine_km(latitude, longitude, court_latitude, court_longitude))
+
+def by_distance(courts, latitude, longitude):
+    found = [(distance(court, latitude, longitude), court) for court in courts]
+    return sorted([item for item in found if not math.isnan(item[0])], key=lambda item: item[0])
+
+@pytest.fixture
+def table(all_courts):
+    table = macourts.get_court_table()
+    assert table.all().names() == [court.name for court in all_courts.elements]
+    return table
+
+@pytest.mark.parametrize('criteria, keep', [
+    (dict(county='Hampden County', has_po_box=True), lambda court: court.address.county == 'Hampden County' and court.has_po_box),
+    (dict(has_po_box=False), lambda court: not court.has_po_box),
+    (dict(department=['District Court', 'Housing Court'], county=['Worcester County', 'Hampden County']),
+     lambda court: court.department in ('District Court', 'Housing Court') and court.address.county in ('Worcester County', 'Hampden County')),
+    (dict(city=['Dorchester', 'Roxbury'], department='Boston Municipal Court'),
+     lambda court: court.address.city in ('Dorchester', 'Roxbury') and court.department == 'Boston Municipal Court'),
+    (dict(division='Dorchester'), lambda court: court.division == 'Dorchester'),
+    (dict(county='Nowhere County'), lambda court: False),
+    (dict(county=['Nowhere County', 'Suffolk County']), lambda court: court.address.county == 'Suffolk County'),
+])
+def test_filter(table, all_courts, criteria, keep):
+    expected = [court.name for court in all_courts.elements if keep(court)]
+    assert expected or criteria['county'] == 'Nowhere County'
+    assert table.filter(**criteria).names() == expected
+    assert table.all().filter(**criteria).names() == expected
+
+@pytest.mark.parametrize('km', [5.0, 20.0, 60.0])
+def test_within(table, all_courts, km):
+    for latitude, longitude in points():
+        found = [(distance, court) for distance, court in by_distance(all_courts.elements, latitude, longitude) if distance <= km]
+        view = table.within(latitude, longitude, km)
+        assert view.names() == [court.name for distance, court in found]
+        assert view.distances.tolist() == pytest.approx([distance for distance, court in found])
+        housing = [court.name for distance, court in found if court.department == 'Housing Court']
+        assert table.within(latitude, longitude, km, department='Housing Court').names() == housing
+        assert view.filter(department='Housing Court').names() == housing
+
+@pytest.mark.parametrize('k', [1, 5])
+def test_nearest(table, all_courts, k):
+    district = all_courts.filter_courts(['District Court'])
+    for latitude, longitude in points(seed=1):
+        found = by_distance(all_courts.elements, latitude, longitude)[:k]
+        view = table.nearest(latitude, longitude, k=k)
+        assert view.names() == [court.name for distance, court in found]
+        assert view.distances.tolist() == pytest.approx([distance for distance, court in found])
+        assert table.nearest(latitude, longitude, k=k, department='District Court').names() == [court.name for distance, court in by_distance(district, latitude, longitude)[:k]]
+
+def test_hydrate(table, all_courts):
+    view = table.filter(county='Middlesex County')
+    expected = [court for court in all_courts.elements if court.address.county == 'Middlesex County']
+    hydrated = view.hydrate()
+    assert len(hydrated) == len(expected) > 0
+    for court, loaded in zip(hydrated, expected):
+        assert isinstance(court, macourts.MACourt)
+        assert [getattr(court, field) for field in FIELDS] == [getattr(loaded, field) for field in FIELDS]
+        assert [getattr(court.address, field) for field in ADDRESS_FIELDS] == [getattr(loaded.address, field) for field in ADDRESS_FIELDS]
+        assert (court.location.latitude, court.location.longitude) == (loaded.location.latitude, loaded.location.longitude)
+    assert view.column('department') == [court.department for court in expected]
+    assert view.column('city') == [court.address.city for court in expected]
@@ -0,0 +1,60 @@
+"""The fast Drupal settings scan must give the same courts as parsing Mass.gov location pages with BeautifulSoup.
+
+The pages in fixtures/massgov are trimmed offline stand-ins for the seven court location pages, written by
+benchmarks/bench_drupal_settings.py --synthesize: Mass.gov-like markup, including scripts with escaped
+closing tags, around a settings element rebuilt from the packaged court files."""
+import os
+import pytest
+
+pytest.importorskip('docassemble.base.util')
+
+from docassemble.MACourts import macourts
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'massgov')
+
+PAGES = {
+    'https://www.mass.gov/orgs/district-court/locations': 'district_courts',
+    'https://www.mass.gov/orgs/housing-court/locations': 'housing_courts',
+    'https://www.mass.gov/orgs/boston-municipal-court/locations': 'bmc',
+    'https://www.mass.gov/orgs/superior-court/locations': 'superior_courts',
+    'https://www.mass.gov/orgs/land-court/locations': 'land_court',
+    'https://www.mass.gov/orgs/juvenile-court/locations': 'juvenile_courts',
+    'https://www.mass.gov/orgs/probate-and-family-court/locations': 'probate_and_family_courts',
+}
+
+class FakeResponse(object):
+    def __init__(self, text):
+        self.text = text
+
+class FakeZipcode(object):
+    def __init__(self, zip_code):
+        self.county = 'County of ' + str(zip_code)
+
+class FakeSearchEngine(object):
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def by_zipcode(self, zip_code):
+        return FakeZipcode(zip_code)
+
+def serve_page(url):
+    with open(os.path.join(FIXTURES, PAGES[url] + '.html'), encoding='utf-8') as page:
+        return FakeResponse(page.read())
+
+@pytest.fixture
+def offline(monkeypatch):
+    monkeypatch.setattr(macourts.requests, 'get', serve_page)
+    monkeypatch.setattr(macourts, 'SearchEngine', FakeSearchEngine)
+    return monkeypatch
+
+@pytest.mark.parametrize('url', sorted(PAGES))
+def test_fast_scan_matches_soup(offline, url):
+    with open(os.path.join(FIXTURES, PAGES[url] + '.html'), encoding='utf-8') as page:
+        html = page.read()
+    assert macourts.drupal_settings_json_fast(html) is not None
+    assert macourts.drupal_settings_json_fast(html) == macourts.drupal_settings_json_soup(html)
+    fast = macourts.get_courts_from_massgov_url(url)
+    offline.setattr(macourts, 'drupal_settings_json_fast', lambda html: None)
+    soup = macourts.get_courts_from_massgov_url(url)
+    assert fast
+    assert fast == soup
@@ -0,0 +1,88 @@
+"""GeocodeCache expiry and eviction, with a fake geocoder and a fake clock"""
+import pytest
+
+from docassemble.MACourts import geocode_cache
+from docassemble.MACourts.geocode_cache import GeocodeCache, MemoryGeocodeBackend, SQLiteGeocodeBackend
+
+class FakeGeocoder(object):
+    def __init__(self):
+        self.calls = list()
+
+    def __call__(self, address):
+        self.calls.append(address.address)
+        if 'nowhere' in address.address.lower():
+            return {'success': False}
+        return {'success': True, 'latitude': 42.35, 'longitude': -71.06, 'description': address.address, 'norm': {'city': address.city}, 'norm_long': {}}
+
+@pytest.fixture
+def clock(monkeypatch, fake_clock):
+    monkeypatch.setattr(geocode_cache, 'time', fake_clock)
+    return fake_clock
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryGeocodeBackend()
+    return SQLiteGeocodeBackend(str(tmp_path / 'geocode.sqlite'))
+
+def test_same_address_spelled_differently_is_geocoded_once(clock, backend, make_address):
+    geocoder = FakeGeocoder()
+    cache = GeocodeCache(backend=backend, geocoder=geocoder)
+    first, second = make_address('1 Main Street'), make_address('1 MAIN ST.')
+    assert cache.geolocate(first)
+    assert cache.geolocate(second)
+    assert geocoder.calls == ['1 Main Street']
+    assert (second.location.latitude, second.location.longitude, second.norm.city) == (42.35, -71.06, 'Boston')
+    assert cache.stats()['hits'] == 1
+
+def test_entries_expire_after_ttl(clock, backend, make_address):
+    geocoder = FakeGeocoder()
+    cache = GeocodeCache(backend=backend, geocoder=geocoder, ttl=100, negative_ttl=10)
+    cache.geolocate(make_address('1 Main Street'))
+    clock.now += 100
+    cache.geolocate(make_address('1 Main Street'))
+    assert len(geocoder.calls) == 1
+    clock.now += 1
+    cache.geolocate(make_address('1 Main Street'))
+    assert len(geocoder.calls) == 2
+    assert cache.stats()['expired'] == 1
+
+def test_failures_use_the_negative_ttl(clock, backend, make_address):
+    geocoder = FakeGeocoder()
+    cache = GeocodeCache(backend=backend, geocoder=geocoder, ttl=100, negative_ttl=10)
+    assert not cache.geolocate(make_address('1 Nowhere Lane'))
+    clock.now += 10
+    assert not cache.geolocate(make_address('1 Nowhere Lane'))
+    assert len(geocoder.calls) == 1
+    clock.now += 1
+    cache.geolocate(make_address('1 Nowhere Lane'))
+    assert len(geocoder.calls) == 2
+
+def test_least_recently_used_entries_are_evicted(clock, backend, make_address):
+    geocoder = FakeGeocoder()
+    cache = GeocodeCache(backend=backend, geocoder=geocoder, max_entries=3)
+    for number in range(3):
+        clock.now += 1
+        cache.geolocate(make_address('%d Main Street' % number))
+    # reading the oldest entry makes it the most recently used
+    clock.now += 1
+    cache.geolocate(make_address('0 Main Street'))
+    clock.now += 1
+    cache.geolocate(make_address('3 Main Street'))
+    assert len(backend) == 3
+    assert cache.stats()['evicted'] == 1
+    del geocoder.calls[:]
+    for number in (0, 2, 3):
+        cache.geolocate(make_address('%d Main Street' % number))
+    assert geocoder.calls == []
+    cache.geolocate(make_address('1 Main Street'))
+    assert geocoder.calls == ['1 Main Street']
+
+def test_geolocated_addresses_are_left_alone(clock, make_address):
+    geocoder = FakeGeocoder()
+    cache = GeocodeCache(geocoder=geocoder)
+    address = make_address('1 Main Street')
+    address.geolocated = True
+    address.geolocate_success = False
+    assert not cache.geolocate(address)
+    assert geocoder.calls == []
@@ -0,0 +1,65 @@
+"""matching_courts_grouped must give every address the same courts as routing it on its own"""
+import pytest
+
+pytest.importorskip('docassemble.base.util')
+
+from docassemble.MACourts import macourts
+from docassemble.MACourts.routing_tables import RoutingAddress
+
+def names(found):
+    return sorted(str(court) for court in macourts.GroupedMatches([(None, found)], 1).courts)
+
+def assert_same_as_single(courts, addresses, court_types=macourts.ALL_DEPARTMENTS):
+    result = courts.matching_courts_grouped(addresses, court_types)
+    assert [address for address, found in result] == addresses
+    for address, found in result:
+        assert names(found) == names(courts.matching_courts_single_address(address, court_types))
+    union = set(str(court) for address in addresses for court in macourts._as_court_list(courts.matching_courts_single_address(address, court_types)) if court is not None)
+    assert sorted(str(court) for court in result.courts) == sorted(union)
+    return result
+
+def in_neighborhood(address, neighborhood):
+    address.neighborhood = neighborhood
+    return address
+
+def test_mixed_case_towns_are_routed_once(all_courts):
+    addresses = [RoutingAddress(town, 'Middlesex County') for town in ('Cambridge', 'CAMBRIDGE', 'cambridge')]
+    addresses += [RoutingAddress('Worcester', 'worcester county'), RoutingAddress('Worcester', 'Worcester County')]
+    result = assert_same_as_single(all_courts, addresses)
+    assert result.routed == 2
+
+def test_boston_with_and_without_neighborhood(all_courts):
+    addresses = [RoutingAddress('Boston', 'Suffolk County', 42.30, -71.07),
+                 RoutingAddress('Boston', 'Suffolk County', 42.30, -71.07),
+                 in_neighborhood(RoutingAddress('Boston', 'Suffolk County', 42.30, -71.07), 'Dorchester'),
+                 in_neighborhood(RoutingAddress('Boston', 'Suffolk County', 42.30, -71.07), 'DORCHESTER'),
+                 in_neighborhood(RoutingAddress('Boston', 'Suffolk County', 42.36, -71.06), 'Beacon Hill'),
+                 in_neighborhood(RoutingAddress('Boston', 'Suffolk County', 42.36, -71.06), 'Charlestown'),
+                 RoutingAddress('Boston', 'Suffolk County', 42.25, -71.12)]
+    result = assert_same_as_single(all_courts, addresses)
+    assert result.routed == 5
+
+def test_single_court_type(all_courts):
+    addresses = [RoutingAddress('Salem', 'Essex County'), RoutingAddress('SALEM', 'Essex County'), RoutingAddress('Nowhere', 'Nowhere County')]
+    result = assert_same_as_single(all_courts, addresses, 'Housing Court')
+    assert result.courts_for(addresses[0]) is result.courts_for(addresses[1])
+    assert result.courts_for(addresses[2]) is None
+
+def test_fallback_to_nearest_uses_each_location():
+    courts = macourts.MACourtList('courts', fallback_to_nearest=True)
+    courts.load_courts(courts=macourts.ALL_COURT_SOURCES)
+    addresses = [RoutingAddress('Nowhere', 'Nowhere County', 42.37, -71.11), RoutingAddress('NOWHERE', 'Nowhere County', 42.10, -72.59),
+                 RoutingAddress('Nowhere', 'Nowhere County', 42.37, -71.11), RoutingAddress('Nowhere', 'Nowhere County')]
+    result = assert_same_as_single(courts, addresses, ['District Court'])
+    assert result.routed == 3
+    by_address = [names(found) for address, found in result]
+    assert by_address[0] != by_address[1] and by_address[0] == by_address[2]
+    assert by_address[3] == []
+
+def test_addresses_get_their_own_lists(all_courts):
+    addresses = [RoutingAddress('Cambridge', 'Middlesex County'), RoutingAddress('Cambridge', 'Middlesex County')]
+    result = all_courts.matching_courts_grouped(addresses)
+    first, second = result.courts_for(addresses[0]), result.courts_for(addresses[1])
+    assert first is not second and first == second
+    first.clear()
+    assert names(second) == names(all_courts.matching_courts_single_address(addresses[1], macourts.ALL_DEPARTMENTS))
@@ -0,0 +1,97 @@
+"""Cached map markers must be the markers the uncached code made, and must be rebuilt when the catalogue or language changes"""
+import copy
+import pytest
+
+pytest.importorskip('docassemble.base.util')
+
+from docassemble.base.core import DAObject
+from docassemble.MACourts import macourts
+
+def uncached_map_info(obj, label):
+    # MACourt._map_info and MAPlace._map_info before markers were cached
+    result = {'latitude': obj.location.latitude, 'longitude': obj.location.longitude, 'info': label + "  [NEWLINE]  " + obj.address.block()}
+    if hasattr(obj, 'icon'):
+        result['icon'] = obj.icon
+    return [result]
+
+def uncached_combined_locations(locations):
+    # combined_locations before grouping by rounded position: a scan of every place for each location
+    places = list()
+    for location in locations:
+        if isinstance(location, DAObject):
+            if not macourts.has_match(places, location):
+                places.append(macourts.MAPlace(location=location.location, address=copy.deepcopy(location.address), description=str(location)))
+            else:
+                for place in places:
+                    if macourts.match(place, location):
+                        if hasattr(place, 'description') and str(location) not in place.description:
+                            place.description += "  [NEWLINE]  " + str(location)
+    return places
+
+def uncached_markers(courts):
+    return [marker for place in uncached_combined_locations(courts) for marker in uncached_map_info(place, place.description)]
+
+@pytest.fixture
+def count_builds(monkeypatch):
+    calls = list()
+    def counting_combined_locations(locations):
+        calls.append(1)
+        return uncached_combined_locations(locations)
+    monkeypatch.setattr(macourts, 'combined_locations', counting_combined_locations)
+    return calls
+
+def test_court_markers_match_uncached(all_courts):
+    for court in all_courts.elements:
+        assert court._map_info() == uncached_map_info(court, str(court.name))
+    court = all_courts.elements[0]
+    court.icon = {'color': 'red'}
+    assert court._map_info() == uncached_map_info(court, str(court.name))
+    # a marker changed by map_of() doesn't change the cached one
+    court._map_info()[0]['info'] = 'changed'
+    court.address.city = 'Elsewhere'
+    assert court._map_info() == uncached_map_info(court, str(court.name))
+
+def test_combined_locations_match_uncached(all_courts):
+    places = macourts.combined_locations(all_courts.elements)
+    expected = uncached_combined_locations(all_courts.elements)
+    assert [(place.description, place.location.latitude, place.location.longitude) for place in places] == \
+           [(place.description, place.location.latitude, place.location.longitude) for place in expected]
+    assert [marker for place in places for marker in place._map_info()] == uncached_markers(all_courts.elements)
+
+@pytest.mark.parametrize('court_types', [None, ['Housing Court'], ['District Court', 'Boston Municipal Court']])
+def test_layer_matches_uncached(all_courts, court_types):
+    courts = [court for court in all_courts.elements if court_types is None or court.department in court_types]
+    layer = macourts.all_courts_map_layer(court_types)
+    assert layer._map_info() == uncached_markers(courts)
+    layer._map_info()[0]['info'] = 'changed'
+    assert layer._map_info() == uncached_markers(courts)
+
+def test_layer_rebuilt_for_new_catalogue_version(all_courts, count_builds, monkeypatch):
+    court_types = ['Land Court']
+    macourts.all_courts_map_layer(court_types)._map_info()
+    macourts.all_courts_map_layer(court_types)._map_info()
+    builds = len(count_builds)
+    assert builds <= 1
+    monkeypatch.setattr(macourts.get_catalogue(), 'version', 'a different catalogue')
+    markers = macourts.all_courts_map_layer(court_types)._map_info()
+    assert len(count_builds) == builds + 1
+    assert markers == uncached_markers([court for court in all_courts.elements if court.department in court_types])
+
+def test_markers_follow_language(all_courts, count_builds, monkeypatch):
+    language = ['en']
+    monkeypatch.setattr(macourts, 'get_language', lambda: language[0])
+    monkeypatch.setattr(macourts.Address, 'block', lambda self, *pargs, **kwargs: '%s (%s)' % (self.city, language[0]))
+    court = all_courts.elements[0]
+    court_types = ['Juvenile Court']
+    english = court._map_info()
+    english_layer = macourts.all_courts_map_layer(court_types)._map_info()
+    builds = len(count_builds)
+    language[0] = 'es'
+    assert court._map_info() == uncached_map_info(court, str(court.name)) != english
+    spanish_layer = macourts.all_courts_map_layer(court_types)._map_info()
+    assert len(count_builds) == builds + 1
+    assert spanish_layer == uncached_markers([court for court in all_courts.elements if court.department in court_types]) != english_layer
+    language[0] = 'en'
+    assert court._map_info() == english
+    assert macourts.all_courts_map_layer(court_types)._map_info() == english_layer
+    assert len(count_builds) == builds + 1
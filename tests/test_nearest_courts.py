@@ -0,0 +1,62 @@
+"""Nearest-court queries, and the nearest-court fallback for addresses routing can't place"""
+import random
+import numpy as np
+import pytest
+
+from docassemble.MACourts.spatial_index import CourtLocationIndex, haversine_km
+
+def make_index(count=40, seed=0):
+    rng = random.Random(seed)
+    latitudes = [rng.uniform(41.5, 42.8) for i in range(count)]
+    longitudes = [rng.uniform(-73.3, -70.0) for i in range(count)]
+    # one court without coordinates, which is never returned
+    latitudes[3] = longitudes[3] = None
+    departments = ['District Court' if i % 2 else 'Housing Court' for i in range(count)]
+    return CourtLocationIndex(latitudes, longitudes, departments), latitudes, longitudes, departments
+
+def test_query_matches_brute_force():
+    index, latitudes, longitudes, departments = make_index()
+    rng = random.Random(1)
+    for i in range(50):
+        latitude, longitude = rng.uniform(41.5, 42.8), rng.uniform(-73.3, -70.0)
+        indices, distances = index.query(latitude, longitude, k=5, departments='District Court')
+        expected = sorted((float(haversine_km(latitude, longitude, latitudes[j], longitudes[j])), j) for j in range(len(latitudes))
+                          if latitudes[j] is not None and departments[j] == 'District Court')[:5]
+        assert list(indices) == [j for distance, j in expected]
+        assert np.allclose(distances, [distance for distance, j in expected])
+
+@pytest.mark.parametrize('latitude, longitude', [(float('nan'), -71.0), (42.3, float('nan')), (float('inf'), -71.0)])
+def test_query_without_finite_point(latitude, longitude):
+    index = make_index()[0]
+    indices, distances = index.query(latitude, longitude, k=3)
+    assert len(indices) == 0 and len(distances) == 0
+
+def test_fallback_to_nearest_without_location():
+    pytest.importorskip('docassemble.base.util')
+    from docassemble.base.util import Address
+    from docassemble.MACourts import macourts
+    courts = macourts.MACourtList('courts', fallback_to_nearest=True)
+    courts.load_courts(courts=macourts.ALL_COURT_SOURCES)
+    address = Address()
+    address.city = 'Nowhere'
+    address.county = 'Nowhere County'
+    assert courts.matching_courts_single_address(address, ['District Court']) == []
+    assert courts.matching_courts_single_address(address, 'District Court') is None
+    assert courts.nearest_courts((float('nan'), -71.0)) == []
+    address.location.latitude, address.location.longitude = 42.37, -71.11
+    assert [court.department for court in courts.matching_courts_single_address(address, ['District Court'])] == ['District Court']
+
+def test_court_without_coordinates_is_skipped():
+    pytest.importorskip('docassemble.base.util')
+    from docassemble.MACourts import macourts
+    from docassemble.MACourts.routing_tables import RoutingAddress
+    courts = macourts.MACourtList('courts', fallback_to_nearest=True)
+    courts.load_courts(courts=['district_courts'])
+    court = courts.appendObject()
+    court.name = 'Unplaced District Court'
+    court.department = 'District Court'
+    nearest = courts.nearest_courts((42.37, -71.11), k=len(courts.elements))
+    assert len(nearest) == len(courts.elements) - 1
+    assert court not in nearest
+    found = courts.matching_courts_single_address(RoutingAddress('Nowhere', 'Nowhere County', 42.37, -71.11), ['District Court'])
+    assert [item.department for item in found] == ['District Court']
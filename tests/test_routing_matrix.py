@@ -0,0 +1,43 @@
+"""The precomputed routing matrix must give the same courts as the if/elif chains, for any court list"""
+import json, os
+import pytest
+
+pytest.importorskip('docassemble.base.util')
+
+from docassemble.MACourts import macourts
+from docassemble.MACourts.routing_tables import RoutingAddress
+
+MUNICIPALITIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'docassemble', 'MACourts', 'data', 'sources', 'ma_municipalities.json')
+
+def route(courts, addresses):
+    return [sorted(str(court) for court in courts.matching_courts_single_address(address, macourts.ALL_DEPARTMENTS)) for address in addresses]
+
+def route_both_ways(courts, addresses, monkeypatch):
+    assert macourts.get_routing_matrix() is not None
+    with_matrix = route(courts, addresses)
+    monkeypatch.setattr(macourts, 'get_routing_matrix', lambda: None)
+    return with_matrix, route(courts, addresses)
+
+def test_court_added_after_build(all_courts, monkeypatch):
+    courts = all_courts
+    court = courts.appendObject()
+    court.name = 'Fall River Probate and Family Court'
+    court.department = 'Probate and Family Court'
+    with_matrix, with_chains = route_both_ways(courts, [RoutingAddress('Fall River', 'Bristol County')], monkeypatch)
+    assert 'Fall River Probate and Family Court' in with_chains[0]
+    assert with_matrix == with_chains
+
+def test_courts_missing_from_list(all_courts, monkeypatch):
+    courts = all_courts
+    courts.elements = courts.elements[::2]
+    with open(MUNICIPALITIES) as municipalities_file:
+        addresses = [RoutingAddress(town, county) for county, towns in json.load(municipalities_file).items() for town in towns]
+    addresses += [RoutingAddress('Boston', 'Suffolk County', 42.35 + 0.01 * i, -71.06) for i in range(-4, 4)]
+    with_matrix, with_chains = route_both_ways(courts, addresses, monkeypatch)
+    assert with_matrix == with_chains
+
+def test_no_bmc_division_outside_boston(all_courts):
+    courts = all_courts
+    assert courts.matching_bmc_name(RoutingAddress('Cambridge', 'Middlesex County')) is None
+    for table in (macourts.get_routing_matrix(), macourts.get_zip_routing_table()):
+        assert not [name for name in table.courts if name.startswith(' Division')]
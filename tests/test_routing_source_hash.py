@@ -0,0 +1,39 @@
+"""The routing source hash must depend only on the routing methods' source text, not on the Python version"""
+import hashlib, json, os
+
+from docassemble.MACourts.routing_tables import routing_source_hash, MATRIX_VERSION, ZIP_TABLE_VERSION
+
+PACKAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'docassemble', 'MACourts')
+
+DISTRICT = '''    def matching_district_court_name(self, address):
+        if address.city.lower() in ["cambridge"]:
+            return "Cambridge District Court"
+        return \'\''''
+
+BMC = '''    @staticmethod
+    def matching_bmc_name(address):
+        return None'''
+
+SOURCE = '''class MACourtList(object):
+%s
+
+    def unrelated(self):
+        return 1
+
+%s
+''' % (DISTRICT.replace('["cambridge"]:', '["cambridge"]:   '), BMC)
+
+def test_hash_is_the_methods_source_text(tmp_path):
+    expected = hashlib.sha1((DISTRICT + '\n' + BMC + '\n').encode('utf-8')).hexdigest()
+    for name, newline in [('unix.py', '\n'), ('windows.py', '\r\n')]:
+        path = tmp_path / name
+        with open(str(path), 'w', newline='') as source_file:
+            source_file.write(SOURCE.replace('\n', newline))
+        assert routing_source_hash(str(path)) == expected
+
+def test_packaged_tables_match_the_routing_methods():
+    current = routing_source_hash(os.path.join(PACKAGE, 'macourts.py'))
+    for filename, version in [('routing_matrix.json', MATRIX_VERSION), ('zip_routing.json', ZIP_TABLE_VERSION)]:
+        with open(os.path.join(PACKAGE, 'data', 'sources', filename)) as table_file:
+            table = json.load(table_file)
+        assert (table['version'], table['source_hash']) == (version, current), filename + ' is out of date; rebuild it'
@@ -0,0 +1,60 @@
+"""Bad input to the routing service must get a JSON 4xx, and unexpected errors a JSON 500"""
+import io, json
+import pytest
+
+pytest.importorskip('docassemble.base.util')
+
+from docassemble.MACourts import service
+
+@pytest.fixture(scope='module')
+def app():
+    return service.RoutingService()
+
+def call(app, path, query='', body=None):
+    environ = {'REQUEST_METHOD': 'GET' if body is None else 'POST', 'PATH_INFO': path, 'QUERY_STRING': query, 'wsgi.errors': io.StringIO()}
+    if body is not None:
+        data = json.dumps(body).encode('utf-8')
+        environ.update({'CONTENT_LENGTH': str(len(data)), 'wsgi.input': io.BytesIO(data)})
+    started = list()
+    output = b''.join(app(environ, lambda status, headers: started.append((status, dict(headers)))))
+    status, headers = started[0]
+    assert headers['Content-Type'] == 'application/json'
+    return int(status.split()[0]), json.loads(output.decode('utf-8'))
+
+@pytest.mark.parametrize('query', [
+    'latitude=42.36&longitude=-71.06&k=-2',
+    'latitude=42.36&longitude=-71.06&k=0',
+    'latitude=42.36&longitude=-71.06&k=1000000000',
+    'latitude=42.36&longitude=-71.06&k=two',
+    'latitude=nan&longitude=-71.06',
+    'latitude=42.36&longitude=inf',
+    'latitude=91&longitude=-71.06',
+    'longitude=-71.06',
+])
+def test_nearest_rejects_bad_query(app, query):
+    status, result = call(app, '/nearest', query)
+    assert status == 400
+    assert 'error' in result
+
+def test_nearest(app):
+    status, result = call(app, '/nearest', 'latitude=42.36&longitude=-71.06&k=3')
+    assert status == 200
+    assert len(result['courts']) == 3
+
+@pytest.mark.parametrize('address', [
+    {'city': 'Boston', 'county': 'Suffolk County', 'neighborhood': 5},
+    {'city': 'Boston', 'county': 'Suffolk County', 'latitude': 'nan', 'longitude': -71.06},
+    {'city': 'Boston', 'county': 'Suffolk County', 'latitude': True, 'longitude': -71.06},
+])
+def test_route_rejects_bad_address(app, address):
+    status, result = call(app, '/route', body=dict(address, court_types=['Juvenile Court']))
+    assert status == 400
+    assert 'error' in result
+
+def test_unexpected_error_is_json(app, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError('boom')
+    monkeypatch.setattr(app, 'route', fail)
+    status, result = call(app, '/route', body={'city': 'Cambridge', 'county': 'Middlesex County'})
+    assert status == 500
+    assert result == {'error': 'Internal server error'}
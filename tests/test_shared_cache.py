@@ -0,0 +1,92 @@
+"""SharedRoutingCache with a shared fakeredis server, and with a Redis that can't be reached"""
+import threading
+import pytest
+
+from docassemble.MACourts import bounded_cache, shared_cache
+from docassemble.MACourts.shared_cache import SharedRoutingCache, redis_client_from_url
+
+fakeredis = pytest.importorskip('fakeredis')
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+def test_second_worker_reads_from_redis(server):
+    first = SharedRoutingCache(client=fakeredis.FakeRedis(server=server), version='v1')
+    second = SharedRoutingCache(client=fakeredis.FakeRedis(server=server), version='v1')
+    first.set('ward', '42.35,-71.06', ['3', 'Central'])
+    assert second.get('ward', '42.35,-71.06') == ['3', 'Central']
+    assert second.get('ward', '42.35,-71.06') == ['3', 'Central']
+    stats = second.stats()
+    assert (stats['redis_hits'], stats['local_hits'], stats['misses']) == (1, 1, 0)
+
+def test_new_version_ignores_old_entries(server):
+    version = ['v1']
+    cache = SharedRoutingCache(client=fakeredis.FakeRedis(server=server), version=lambda: version[0])
+    cache.set('courts', 'boston', ['Central Division'])
+    version[0] = 'v2'
+    assert cache.get('courts', 'boston', default='missing') == 'missing'
+    assert SharedRoutingCache(client=fakeredis.FakeRedis(server=server), version='v1').get('courts', 'boston') == ['Central Division']
+
+def test_entries_expire_in_redis(server):
+    client = fakeredis.FakeRedis(server=server)
+    cache = SharedRoutingCache(client=client, version='v1', ttl=60)
+    cache.set('ward', 'key', 1)
+    assert 0 < client.ttl('macourts:v1:ward:key') <= 60
+
+def test_local_tier_is_bounded():
+    cache = SharedRoutingCache(version='v1', local_size=2)
+    for key in 'abc':
+        cache.set('ward', key, key)
+    assert cache.stats()['local_entries'] == 2
+    assert cache.get('ward', 'a') is None
+    assert cache.get('ward', 'c') == 'c'
+
+def test_dead_redis_falls_back_to_local_cache(monkeypatch, fake_clock):
+    pytest.importorskip('redis')
+    clock = fake_clock
+    monkeypatch.setattr(shared_cache, 'time', clock)
+    cache = SharedRoutingCache(client=redis_client_from_url('redis://127.0.0.1:1'), version='v1', retry_interval=30)
+    assert cache.get('ward', 'key', default='missing') == 'missing'
+    stats = cache.stats()
+    assert (stats['redis_errors'], stats['redis_available']) == (1, False)
+    # while Redis is marked down, it isn't tried again, and the in-process tier still works
+    cache.set('ward', 'key', 'value')
+    assert cache.get('ward', 'key') == 'value'
+    assert cache.get('ward', 'other') is None
+    assert cache.stats()['redis_errors'] == 1
+    clock.now += 31
+    assert cache.stats()['redis_available']
+    assert cache.get('ward', 'other') is None
+    assert cache.stats()['redis_errors'] == 2
+
+def test_none_is_cached_locally():
+    cache = SharedRoutingCache(version='v1')
+    cache.set('ward', 'key', None)
+    assert cache.get('ward', 'key', default='missing') is None
+    assert cache.stats()['local_hits'] == 1
+
+def test_counters_from_many_threads():
+    cache = SharedRoutingCache(version='v1', local_size=50)
+    for key in range(50):
+        cache.set('ward', key, key)
+    def look_up():
+        for key in range(100):
+            cache.get('ward', key)
+    threads = [threading.Thread(target=look_up) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert (stats['local_hits'], stats['misses'], stats['lookups']) == (400, 400, 800)
+
+def test_locks_are_replaced_after_fork():
+    cache = SharedRoutingCache(version='v1')
+    # as if another thread held both locks when the process forked
+    cache._lock.acquire()
+    cache._local._lock.acquire()
+    bounded_cache._reset_after_fork()
+    cache.set('ward', 'key', 'value')
+    assert cache.get('ward', 'key') == 'value'
+    assert cache.stats()['local_hits'] == 1
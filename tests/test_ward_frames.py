@@ -0,0 +1,57 @@
+"""assign_boston_wards must give every row the ward get_boston_ward_number gives its address"""
+import pytest
+
+pytest.importorskip('docassemble.base.util')
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from docassemble.MACourts import macourts
+from docassemble.MACourts.routing_tables import RoutingAddress
+
+@pytest.fixture(scope='module')
+def courts():
+    courts = macourts.MACourtList('courts')
+    courts.load_courts(courts=['bmc'])
+    return courts
+
+@pytest.fixture(scope='module')
+def frame():
+    rng = np.random.default_rng(0)
+    # a margin around Boston, so some points are outside every ward and get the nearest one
+    size = 400
+    return pd.DataFrame({
+        'latitude': rng.uniform(42.22, 42.41, size),
+        'longitude': rng.uniform(-71.20, -70.98, size),
+        'city': rng.choice(['Boston', 'Cambridge'], size),
+    })
+
+def expected_wards(courts, frame, cities):
+    return [tuple(str(value) for value in courts.get_boston_ward_number(RoutingAddress(city, 'Suffolk County', row.latitude, row.longitude)))
+            for row, city in zip(frame.itertuples(), cities)]
+
+def assigned_wards(assigned):
+    return [(str(ward), str(courthouse)) for ward, courthouse in zip(assigned['ward_number'], assigned['bmc_courthouse'])]
+
+def test_matches_per_address_lookup(courts, frame):
+    assigned = macourts.assign_boston_wards(frame)
+    assert assigned_wards(assigned) == expected_wards(courts, frame, ['Boston'] * len(frame))
+
+def test_city_column(courts, frame):
+    assigned = macourts.assign_boston_wards(frame, city='city')
+    assert assigned_wards(assigned) == expected_wards(courts, frame, frame['city'])
+    assert set(assigned_wards(assigned[frame['city'] == 'Cambridge'])) == set([('', '')])
+
+def test_without_nearest_ward(courts, frame):
+    wards = courts.load_boston_wards_from_file('boston_wards')
+    assigned = macourts.assign_boston_wards(frame, nearest=False)
+    points = gpd.points_from_xy(frame['longitude'], frame['latitude'])
+    outside = ~np.array([wards.geometry.contains(point).any() for point in points])
+    assert outside.any() and not outside.all()
+    assert set(assigned_wards(assigned[outside])) == set([('', '')])
+    assert assigned_wards(assigned[~outside]) == [pair for pair, out in zip(expected_wards(courts, frame, ['Boston'] * len(frame)), outside) if not out]
+
+def test_projected_geometry_is_reprojected(frame):
+    points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(frame['longitude'], frame['latitude']), crs='EPSG:4326')
+    state_plane = points.to_crs('EPSG:2249')
+    assert assigned_wards(macourts.assign_boston_wards(state_plane)) == assigned_wards(macourts.assign_boston_wards(frame))
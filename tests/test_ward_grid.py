@@ -0,0 +1,73 @@
+"""The packaged ward grid must give the same ward as the exact polygon test wherever it answers"""
+import hashlib, io, json, os, random
+import pytest
+
+gpd = pytest.importorskip('geopandas')
+
+import numpy as np
+import shapely
+from docassemble.MACourts.ward_grid import WardGrid, build_ward_grid, geohash_cell
+
+SOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'docassemble', 'MACourts', 'data', 'sources')
+
+@pytest.fixture(scope='module')
+def wards():
+    with open(os.path.join(SOURCES, 'boston_wards.geojson'), 'rb') as wards_file:
+        data = wards_file.read()
+    return gpd.read_file(io.BytesIO(data)), hashlib.sha1(data).hexdigest()
+
+@pytest.fixture(scope='module')
+def grid():
+    with open(os.path.join(SOURCES, 'ward_grid.json')) as grid_file:
+        return WardGrid(json.load(grid_file))
+
+def random_points(geometries, count, rng):
+    """Points anywhere in the wards' bounding box, and points within about 10 m of a ward boundary"""
+    minx, miny, maxx, maxy = shapely.total_bounds(geometries)
+    points = [(rng.uniform(miny, maxy), rng.uniform(minx, maxx)) for i in range(count)]
+    vertices = shapely.get_coordinates(shapely.boundary(geometries))
+    for i in range(count):
+        longitude, latitude = vertices[rng.randrange(len(vertices))]
+        points.append((latitude + rng.uniform(-1e-4, 1e-4), longitude + rng.uniform(-1e-4, 1e-4)))
+    return points
+
+def assert_matches_exact_test(grid, frame, points):
+    geometries = np.asarray(frame.geometry.values, dtype=object)
+    answered = 0
+    for latitude, longitude in points:
+        ward = grid.ward_index(latitude, longitude)
+        if ward is None:
+            continue
+        answered += 1
+        containing = np.flatnonzero(shapely.contains_xy(geometries, longitude, latitude))
+        assert list(containing) == [ward]
+        assert grid.lookup(latitude, longitude) == (grid.wards[ward][0], grid.wards[ward][1])
+    return answered
+
+def test_packaged_grid_is_current(wards, grid):
+    frame, wards_hash = wards
+    assert grid.wards_hash == wards_hash
+    assert len(grid.wards) == len(frame)
+
+def test_packaged_grid_matches_exact_test(wards, grid):
+    frame, wards_hash = wards
+    geometries = np.asarray(frame.geometry.values, dtype=object)
+    points = random_points(geometries, 3000, random.Random(0))
+    assert assert_matches_exact_test(grid, frame, points) > len(points) // 10
+
+def test_freshly_built_grid_matches_exact_test(wards):
+    frame, wards_hash = wards
+    frame = frame.iloc[:5]
+    data, report = build_ward_grid(frame, wards_hash, min_precision=5, max_precision=7)
+    grid = WardGrid(json.loads(json.dumps(data)))
+    assert len(grid) == report['stored_cells']
+    geometries = np.asarray(frame.geometry.values, dtype=object)
+    assert_matches_exact_test(grid, frame, random_points(geometries, 1000, random.Random(1)))
+
+@pytest.mark.parametrize('latitude, longitude', [(float('nan'), -71.06), (42.36, float('inf')), (None, -71.06), (0.0, 0.0)])
+def test_unusable_points_need_the_exact_test(grid, latitude, longitude):
+    assert grid.ward_index(latitude, longitude) is None
+
+def test_geohash_cell():
+    # the example from the geohash specification
+    assert geohash_cell(57.64911, 10.40744, 11) == 'u4pruydqqvj'
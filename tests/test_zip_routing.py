@@ -0,0 +1,37 @@
+"""The packaged zip code routing table must cover every Massachusetts zip code and agree with the routing chains"""
+import pytest
+
+pytest.importorskip('docassemble.base.util')
+
+from docassemble.MACourts import macourts
+from docassemble.MACourts.routing_tables import municipality_name
+
+def test_every_zip_is_routed():
+    table = macourts.get_zip_routing_table()
+    assert table is not None
+    zip_towns = macourts.load_zip_towns(macourts.path_and_mimetype('docassemble.MACourts:data/sources/ma_zip_towns.json')[0])
+    assert set(zip_towns) == set(table.zips)
+
+@pytest.mark.parametrize('town, municipality', [
+    ('Cambridge', 'cambridge'),
+    ('E Bridgewater', 'east bridgewater'),
+    ('North Grafton', 'grafton'),
+    ('North Adams', 'north adams'),
+    ('Hyannis', 'barnstable'),
+    ('Jamaica Plain', 'boston'),
+    ('Nowhere', None),
+])
+def test_municipality_name(town, municipality):
+    counties = {name: 'County' for name in ['cambridge', 'east bridgewater', 'bridgewater', 'grafton', 'north adams', 'adams', 'barnstable', 'boston']}
+    assert municipality_name(town, counties) == municipality
+
+def test_zip_matches_town_routing(all_courts):
+    courts = all_courts
+    by_zip = sorted(str(court) for court in courts.matching_courts_by_zip('02139', court_types=['District Court', 'Probate and Family Court']))
+    assert by_zip == ['Cambridge District Court', 'Middlesex Probate and Family Court']
+
+def test_missing_table_raises(all_courts, monkeypatch):
+    courts = all_courts
+    monkeypatch.setattr(macourts, 'get_zip_routing_table', lambda: None)
+    with pytest.raises(IOError):
+        courts.matching_courts_by_zip('02139')